@@ -23,6 +23,8 @@ Sample usage:
 """                          # 🤗 (HuggingFace logo)
 
 # Standard modules
+from functools import lru_cache
+import re
 import unicodedata
 
 # Intalled module
@@ -50,6 +52,52 @@ STRIP_EMOTICONS = system.getenv_bool(
 AUGMENT_EMOTICONS = system.getenv_bool(
     "AUGMENT_EMOTICONS", False,
     description="Make emoticon augmentation default instead of rename/removal")
+CHAR_BY_CHAR = system.getenv_bool(
+    "CHAR_BY_CHAR", False,
+    description="Use original character-by-character conversion instead of translation table")
+
+#-------------------------------------------------------------------------------
+
+# Regex for runs of characters that might be symbols, which is split out of the input so that
+# the translation is only done over those runs (n.b., U+00A6 is the first symbol).
+NON_ASCII_RUN_REGEX = re.compile(r"([^\x00-\xA5]+)")
+RUN_DELIM = "\x00"
+
+
+@lru_cache(maxsize=None)
+def get_symbol_label(ch):
+    """Returns bracketed lowercase Unicode name for CH"""
+    # EX: get_symbol_label("😴") => "[sleeping face]"
+    return f"[{unicodedata.name(ch).lower()}]"
+
+
+class SymbolTranslationTable(dict):
+    """str.translate table mapping Other_Symbol (So) characters to conversion text, which is filled in
+    upon first lookup of each character (i.e., other characters map to themselves)"""
+
+    def __init__(self, replace, replacement, augment):
+        """Initializer: see ConvertEmoticons.convert for REPLACE, REPLACEMENT and AUGMENT"""
+        super().__init__()
+        self.replace = replace
+        self.replacement = replacement
+        self.augment = augment
+
+    def __missing__(self, code):
+        """Returns conversion text for character CODE, caching the result"""
+        ch = chr(code)
+        new_ch = ch
+        if unicodedata.category(ch) == ConvertEmoticons.OTHER_SYMBOL:
+            new_ch = (f"{ch} " if self.augment else "")
+            new_ch += get_symbol_label(ch) if self.replace else self.replacement
+        self[code] = new_ch
+        return new_ch
+
+
+@lru_cache(maxsize=None)
+def get_translation_table(replace, replacement, augment):
+    """Returns SymbolTranslationTable for REPLACE, REPLACEMENT and AUGMENT (shared across calls)"""
+    return SymbolTranslationTable(replace, replacement, augment)
+
 
 #-------------------------------------------------------------------------------
 
@@ -105,17 +153,32 @@ class ConvertEmoticons:
         in_text = text
         text = (text or "")
         #
-        chars = []
-        for ch in text:
-            new_ch = ch
-            if unicodedata.category(ch) == self.OTHER_SYMBOL:
-                new_ch = (f"{ch} " if augment else "")
-                new_ch += f"[{unicodedata.name(ch).lower()}]" if replace else replacement
-            chars.append(new_ch)
-        text = "".join(chars)
+        if CHAR_BY_CHAR:
+            chars = []
+            for ch in text:
+                new_ch = ch
+                if unicodedata.category(ch) == self.OTHER_SYMBOL:
+                    new_ch = (f"{ch} " if augment else "")
+                    new_ch += f"[{unicodedata.name(ch).lower()}]" if replace else replacement
+                chars.append(new_ch)
+            text = "".join(chars)
+        # note: ASCII has no symbols, so the scan can be skipped
+        elif not text.isascii():
+            # Translate the non-ASCII runs together (n.b., delimiter is ASCII)
+            # note: there might not be any runs (e.g., "£5"); and, the entire text is
+            # translated if the delimiter occurs in the replacement.
+            table = get_translation_table(replace, replacement, augment)
+            pieces = NON_ASCII_RUN_REGEX.split(text)
+            if len(pieces) == 1:
+                pass
+            elif RUN_DELIM in replacement:
+                text = text.translate(table)
+            else:
+                pieces[1::2] = RUN_DELIM.join(pieces[1::2]).translate(table).split(RUN_DELIM)
+                text = "".join(pieces)
         #
         level = (4 if (text != in_text) else 6)
-        debug.trace(level, f"ce.convert({in_text!r}) => {text!r}")
+        debug.trace(level, f"ce.convert({gh.elide(in_text)!r}) => {gh.elide(text)!r}")
         return text
     #
     # EX: ce.convert("✅ Success", strip=True) => " Success"
@@ -146,8 +209,10 @@ def main():
     strip_entirely = main_app.get_parsed_option(STRIP_OPT)
     ce = ConvertEmoticons(strip=strip_entirely)
 
-    for line in main_app.read_entire_input().splitlines():
-        print(ce.convert(line))
+    # Convert input as a block (n.b., same as line by line as no symbols are line breaks)
+    lines = main_app.read_entire_input().splitlines()
+    if lines:
+        print(ce.convert("\n".join(lines)))
     return
 
 #-------------------------------------------------------------------------------
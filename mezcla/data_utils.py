@@ -21,6 +21,9 @@
 # Standard module
 import pandas as pd
 import csv
+import importlib.util
+import os
+import weakref
 
 # Local modules
 from mezcla import debug
@@ -33,11 +36,23 @@ from mezcla.text_utils import version_to_number as version_as_float
 ## TODO3: rename to CVS_DELIM to avoid conflict with other usage
 DELIM = system.getenv_value("DELIM", None,
                             "Delimiter for input and output tables")
+CSV_ENGINE = system.getenv_text("CSV_ENGINE", "auto",
+                                 "Pandas read_csv engine: auto, c, pyarrow, or python")
+INFER_DTYPES = system.getenv_bool("INFER_DTYPES", False,
+                                  "Infer numeric and categorical column types in read_csv from a sample")
+DTYPE_SAMPLE_ROWS = system.getenv_int("DTYPE_SAMPLE_ROWS", 10000,
+                                      "Number of rows sampled for read_csv type inference")
+MAX_CATEGORY_RATIO = system.getenv_float("MAX_CATEGORY_RATIO", 0.5,
+                                         "Maximum ratio of distinct to total values in sample for categorical columns")
 COMMENT = 'comment'
 DIALECT = 'dialect'
 EXCEL = 'excel'
 DELIMITER = 'delimiter'
 SEP = 'sep'
+ENGINE = 'engine'
+PYTHON = 'python'
+PYARROW = 'pyarrow'
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".zip", ".xz", ".zst", ".tar")
 
 #--------------------------------------------------------------------------------
 
@@ -48,12 +63,137 @@ if (version_as_float(pd.__version__) < version_as_float(MIN_PANDAS_VERSION)):
 
 #-------------------------------------------------------------------------------
 
-def read_csv(filename, **in_kw):
+def is_file_path(filename):
+    """Whether FILENAME is a path (e.g., rather than a file object or URL)"""
+    return (isinstance(filename, (str, os.PathLike))
+            and not str(filename).startswith(("http:", "https:", "s3:")))
+
+
+def sniff_delimiter(filename, kw):
+    """Returns delimiter for FILENAME based on first non-comment line as with pandas python engine (or None)
+    Note: Compressed files and those with extra options for skipping rows are not sniffed."""
+    # EX: sniff_delimiter("examples/iris.csv", {}) => ","
+    delim = None
+    if (is_file_path(filename) and not str(filename).endswith(COMPRESSED_EXTENSIONS)
+        and not any(kw.get(k) for k in ['skiprows', DIALECT, 'compression'])):
+        try:
+            with open(filename, encoding=(kw.get('encoding') or "UTF-8"), errors="ignore") as f:
+                # note: comment-only lines are skipped
+                for line in f:
+                    if kw.get(COMMENT) and (kw[COMMENT] in line):
+                        line = line[:line.find(kw[COMMENT])]
+                    if line:
+                        break
+                delim = csv.Sniffer().sniff(line).delimiter
+        except:
+            debug.trace(5, f"Exception sniffing delimiter: {system.get_exception()}")
+    debug.trace(5, f"sniff_delimiter({filename}) => {delim!r}")
+    return delim
+
+
+def have_pyarrow():
+    """Whether pyarrow is installed"""
+    return (importlib.util.find_spec(PYARROW) is not None)
+
+
+def get_csv_engine(kw):
+    """Returns fastest pandas engine that supports read_csv options in KW (i.e., pyarrow, c or python)
+    Note: pyarrow is not used when skipping bad lines, as it also skips rows with missing fields."""
+    # EX: get_csv_engine({SEP: ",", "chunksize": 100}) => "c"
+    # pylint: disable=import-outside-toplevel, protected-access
+    from pandas.io.parsers import readers as pd_readers
+    engine = (kw.get(ENGINE) or CSV_ENGINE.lower())
+    if (engine == "auto"):
+        sep = kw.get(SEP)
+        def uses_any(options):
+            """Whether any of OPTIONS are specified"""
+            return any(kw.get(option) not in [None, False] for option in options)
+        if ((not sep) or (len(sep) > 1) or uses_any(pd_readers._c_unsupported)):
+            engine = PYTHON
+        elif (have_pyarrow() and (kw.get('on_bad_lines') != 'skip')
+              and not callable(kw.get('skiprows'))
+              and not uses_any(pd_readers._pyarrow_unsupported - {'quoting'})
+              and (kw.get('quoting', csv.QUOTE_MINIMAL) == csv.QUOTE_MINIMAL)):
+            engine = PYARROW
+        else:
+            engine = 'c'
+    debug.trace(6, f"get_csv_engine(_) => {engine}")
+    return engine
+
+
+def may_have_missing_fields(filename, kw):
+    """Whether FILENAME might have rows with fewer fields than the header using read_csv options KW
+    Note: This is used to avoid the c engine when missing values are not NaN by default (e.g., keep_default_na False), as it then uses "" rather than NaN for missing fields. Files that cannot be scanned (e.g., compressed) are assumed to have them."""
+    # EX: may_have_missing_fields("examples/iris.csv", {SEP: ","}) => False
+    result = True
+    if (is_file_path(filename) and not str(filename).endswith(COMPRESSED_EXTENSIONS)
+        and not any(kw.get(k) for k in ['skiprows', 'skipfooter', DIALECT, 'compression'])
+        and (kw.get('header', 'infer') in ['infer', 0, None])):
+        comment = kw.get(COMMENT)
+        num_fields = (len(kw['names']) if (kw.get('names') is not None) else None)
+        try:
+            with open(filename, encoding=(kw.get('encoding') or "UTF-8"), errors="replace", newline="") as f:
+                reader = csv.reader(f, delimiter=kw[SEP], quoting=kw.get('quoting', csv.QUOTE_MINIMAL),
+                                    quotechar=(kw.get('quotechar') or '"'), escapechar=kw.get('escapechar'),
+                                    doublequote=kw.get('doublequote', True))
+                result = False
+                for row in reader:
+                    # note: fields after comment are dropped (n.b., comment-only lines are skipped)
+                    if comment:
+                        commented = [i for (i, field) in enumerate(row) if (comment in field)]
+                        if commented:
+                            row = row[:commented[0]] + [row[commented[0]].split(comment)[0]]
+                            if (row == [""]):
+                                continue
+                    if not row:
+                        continue
+                    if num_fields is None:
+                        num_fields = len(row)
+                    elif (len(row) < num_fields):
+                        result = True
+                        break
+        except:
+            debug.trace(5, f"Exception scanning fields: {system.get_exception()}")
+            result = True
+    debug.trace(5, f"may_have_missing_fields({filename}) => {result}")
+    return result
+
+
+def infer_csv_dtypes(filename, kw, num_rows=None):
+    """Returns dtypes for FILENAME columns inferred from first NUM_ROWS rows using read_csv options KW
+    Note: Numeric columns keep the sample type, other columns are categorical if relatively few distinct values (see MAX_CATEGORY_RATIO), and the rest are str."""
+    if num_rows is None:
+        num_rows = DTYPE_SAMPLE_ROWS
+    sample_kw = {**kw, 'dtype': None, 'nrows': num_rows, 'chunksize': None}
+    sample_kw[ENGINE] = get_csv_engine(sample_kw)
+    sample = pd.read_csv(filename, **sample_kw)
+    dtypes = {}
+    for column in sample.columns:
+        values = sample[column]
+        if (pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)):
+            dtypes[column] = values.dtype
+        elif (values.nunique() <= max(1, MAX_CATEGORY_RATIO * len(values))):
+            dtypes[column] = 'category'
+        else:
+            dtypes[column] = str
+    if isinstance(kw.get('dtype'), dict):
+        dtypes.update(kw['dtype'])
+    debug.trace(5, f"infer_csv_dtypes({filename}) => {dtypes}")
+    return dtypes
+
+
+def read_csv(filename, infer_dtypes=None, **in_kw):
     """Wrapper around pandas read_csv
     Note: delimiter SEP defaults to DELIM env. var (n.b., uses sniffing if unset), dtype to str, and both error_bad_lines & keep_default_na to False. (Override these via keyword parameters.)
+    The fastest engine supporting the options is used (see get_csv_engine), with fallback to the python engine upon error. Likewise, column types are inferred from a sample if INFER_DTYPES, with fallback to dtype str.
+    Also, chunksize can be specified to get an iterator over data frames (n.b., without the fallback).
+    Note: Missing trailing fields are NaN as with the python engine, so the c engine is not used when these might occur with NA filtering off (see may_have_missing_fields).
     """
     # EX: tf = read_csv("examples/iris.csv"); tf.shape => (150, 5)
+    # EX: [len(df) for df in read_csv("examples/iris.csv", chunksize=100)] => [100, 50]
     ## TODO: clarify dtype usage
+    if infer_dtypes is None:
+        infer_dtypes = INFER_DTYPES
     kw = {SEP: DELIM, 'dtype': str,
           ## BAD: 'error_bad_lines': False, 'keep_default_na': False}
           'on_bad_lines': 'skip', 'keep_default_na': False}
@@ -64,7 +204,7 @@ def read_csv(filename, **in_kw):
         in_kw[DELIMITER] = None
     # Overide settings based on explicit keyword arguments
     kw.update(**in_kw)
-    kw['engine'] = 'python'
+    ## OLD: kw['engine'] = 'python'
     # Turn off quotoing if tab delimited
     if kw[SEP] == "\t":
         kw['quoting'] = csv.QUOTE_NONE
@@ -72,13 +212,37 @@ def read_csv(filename, **in_kw):
     if ((COMMENT not in kw) and (kw.get(DIALECT) != EXCEL)):
         debug.trace_fmt(4, "Enabling comments in read_csv")
         kw[COMMENT] = "#"
+    # Use explicit delimiter so that faster engine can be used
+    if (not kw[SEP]) and (not kw.get(ENGINE)) and (not kw.get(DIALECT)):
+        kw[SEP] = sniff_delimiter(filename, kw)
+    kw[ENGINE] = get_csv_engine(kw)
+    if ((kw[ENGINE] == 'c') and (not in_kw.get(ENGINE))
+        and ((not kw.get('keep_default_na', True)) or (not kw.get('na_filter', True)))
+        and may_have_missing_fields(filename, kw)):
+        kw[ENGINE] = PYTHON
     debug.trace_fmt(5, "read_csv({f}, [in_kw={ikw}])", f=filename, ikw=in_kw)
     debug.trace_fmt(6, "\tkw={k}", k=kw)
+    # Determine fallback options (e.g., python engine if error with faster one)
+    # note: retries are only done for files (e.g., not streams)
+    all_kw = [kw]
+    if infer_dtypes and is_file_path(filename):
+        try:
+            dtypes = infer_csv_dtypes(filename, {**kw, ENGINE: in_kw.get(ENGINE)})
+            all_kw.insert(0, {**kw, 'dtype': dtypes})
+        except:
+            debug.trace(4, f"Exception inferring dtypes: {system.get_exception()}")
+    if (kw[ENGINE] != PYTHON) and (not in_kw.get(ENGINE)):
+        all_kw.append({**kw, ENGINE: PYTHON})
+    if not is_file_path(filename):
+        all_kw = [kw]
     df = None
-    try:
-        df = pd.read_csv(filename, **kw)
-    except:
-        debug.trace(3, f"Exception during read_csv: {system.get_exception()}")
+    for i, read_kw in enumerate(all_kw):
+        try:
+            df = pd.read_csv(filename, **read_kw)
+            break
+        except:
+            debug.trace(3 if (i == len(all_kw) - 1) else 4,
+                        f"Exception during read_csv: {system.get_exception()}")
     debug.trace(4, f"read_csv({filename}) => {df}")
     return df
 
@@ -100,17 +264,49 @@ def to_csv(filename, data_frame, **in_kw):
 write_csv = to_csv
 
 
-def lookup_df_value(data_frame, return_field, lookup_field, lookup_value):
-    """Return value for DATA_FRAME's RETURN_FIELD given LOOKUP_FIELD value LOOKUP_VALUE"""
+def get_lookup_positions(data_frame, lookup_field):
+    """Returns dict from DATA_FRAME's LOOKUP_FIELD values to position of first row with the value
+    Note: This is cached, assuming the frame is not modified in place (see clear_lookup_cache)."""
+    key = (id(data_frame), lookup_field)
+    frame_ref, shape, positions = lookup_cache.get(key, (None, None, None))
+    if ((frame_ref is None) or (frame_ref() is not data_frame) or (shape != data_frame.shape)):
+        column = data_frame[lookup_field]
+        is_first = ~column.duplicated(keep="first").to_numpy()
+        first_positions = is_first.nonzero()[0]
+        positions = dict(zip(column.to_numpy()[first_positions].tolist(), first_positions.tolist()))
+        if (frame_ref is None):
+            weakref.finalize(data_frame, lookup_cache.pop, key, None)
+        lookup_cache[key] = (weakref.ref(data_frame), data_frame.shape, positions)
+        debug.trace(6, f"cached {len(positions)} lookup positions for {lookup_field}")
+    return positions
+#
+lookup_cache = {}
+
+
+def clear_lookup_cache():
+    """Clears cache used by lookup_df_value"""
+    lookup_cache.clear()
+
+
+def lookup_df_value(data_frame, return_field, lookup_field, lookup_value, use_cache=False):
+    """Return value for DATA_FRAME's RETURN_FIELD given LOOKUP_FIELD value LOOKUP_VALUE
+    Note: With USE_CACHE, the position of the value is determined via a cached index (see get_lookup_positions), which is only suitable if the frame is not modified in place."""
     # EX: lookup_df_value(tf, "sepal_length", "petal_length", "3.8") => "5.5"
-    ## TODO: rework in terms of Pandas primitives
     value = None
     try:
         # TODO: trace out index location
-        matches = [row[return_field] for index, row in data_frame.iterrows() 
-                   if (row[lookup_field] == lookup_value)]
-        if matches:
-            value = matches[0]
+        if use_cache:
+            position = get_lookup_positions(data_frame, lookup_field).get(lookup_value)
+        else:
+            matches = (data_frame[lookup_field] == lookup_value).to_numpy().nonzero()[0]
+            position = (matches[0] if len(matches) else None)
+        if position is not None:
+            value = data_frame[return_field].iloc[position]
+        ## OLD:
+        ## matches = [row[return_field] for index, row in data_frame.iterrows() 
+        ##            if (row[lookup_field] == lookup_value)]
+        ## if matches:
+        ##     value = matches[0]
     except:
         debug.trace(4, f"Exception during lookup_df_value: {system.get_exception()}")
     debug.trace(7, f"lookup_df_value(_, {return_field}, {lookup_field}, {lookup_value}) => {value}")
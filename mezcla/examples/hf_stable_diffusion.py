@@ -51,7 +51,7 @@ gr = None
 from mezcla import debug
 from mezcla import glue_helpers as gh
 from mezcla.main import Main
-from mezcla.my_regex import my_re
+from mezcla.my_regex import my_re, WordListMatcher
 from mezcla import system
 
 # Constants/globals
@@ -135,6 +135,7 @@ torch = None
 load_dataset = None
 
 word_list = []
+word_list_matcher = None
 
 sd_instance = None
 flask_app = Flask(__name__)
@@ -156,14 +157,23 @@ def init():
         import torch
 
     # Load blacklist for prompt terms
-    global word_list
+    # note: the terms are matched via single regex (see check_prompt)
+    global word_list, word_list_matcher
     if CHECK_UNSAFE:
         word_list_dataset = load_dataset("stabilityai/word-list", data_files="list.txt", use_auth_token=True)
         word_list = word_list_dataset["train"]['text']
         debug.trace_expr(5, word_list)
+        word_list_matcher = WordListMatcher(word_list)
     debug.trace(5, "out hf_stable_diffusion.init")
 
 
+def check_prompt(prompt):
+    """Raises RuntimeError if PROMPT contains a term from the blacklist (i.e., word_list)"""
+    if word_list_matcher and prompt and word_list_matcher.search(prompt):
+        ## OLD: raise gr.Error("Unsafe content found. Please try again with different prompts.")
+        raise RuntimeError("Unsafe content found. Please try again with different prompts.")
+
+
 def show_gpu_usage(level=TL.DETAILED):
     """Show usage for GPU memory, etc.
     TODO: support other types besides NVidia"""
@@ -290,10 +300,7 @@ class StableDiffusion:
             num_images = NUM_IMAGES
         if scale is None:
             scale = GUIDANCE_SCALE
-        for prompt_filter in word_list:
-            if my_re.search(rf"\b{prompt_filter}\b", prompt):
-                ## OLD: raise gr.Error("Unsafe content found. Please try again with different prompts.")
-                raise RuntimeError("Unsafe content found. Please try again with different prompts.")
+        check_prompt(prompt)
     
         images = []
         params = (prompt, negative_prompt, scale, num_images, skip_img_spec, width, height)
@@ -386,9 +393,7 @@ class StableDiffusion:
             scale = GUIDANCE_SCALE
         if denoise is None:
             denoise = DENOISING_FACTOR
-        for prompt_filter in word_list:
-            if my_re.search(rf"\b{prompt_filter}\b", prompt):
-                raise RuntimeError("Unsafe content found. Please try again with different prompts.")
+        check_prompt(prompt)
     
         images = []
         params = (image_b64, denoise, prompt, negative_prompt, scale, num_images, skip_img_spec)
@@ -278,6 +278,19 @@ class TestIt(TestWrapper):
         self.do_assert(len(images) == 1)
         return
 
+    def test_07_check_prompt(self):
+        """Make sure prompts with blacklisted terms are rejected (n.b., CPU only)"""
+        debug.trace(4, f"test_07_check_prompt(); self={self}")
+        save_matcher = THE_MODULE.word_list_matcher
+        try:
+            THE_MODULE.word_list_matcher = THE_MODULE.WordListMatcher(["pitbull", "gore"])
+            THE_MODULE.check_prompt("cute puppy with gorgeous fur")
+            with pytest.raises(RuntimeError):
+                THE_MODULE.check_prompt("cute pitbull puppy")
+        finally:
+            THE_MODULE.word_list_matcher = save_matcher
+        return
+
     @pytest.mark.xfail                   # TODO: remove xfail
     @pytest.mark.skipif(not extcolors, reason="extcolors package missing")
     def test_99_gpu_mem_usage(self):
@@ -13,6 +13,7 @@
 from datetime import datetime
 import json
 import os
+import re
 import sys
 import yaml
 
@@ -22,6 +23,12 @@ from mezcla import debug
 from mezcla import system
 from mezcla import glue_helpers as gh
 
+# Constants
+JSON_BLOCK_SIZE = system.getenv_int("JSON_BLOCK_SIZE", 2 ** 16,
+                                    "Characters read at a time for incremental JSON decoding")
+# note: same as json module (e.g., not all Unicode whitespace)
+JSON_WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+
 #-------------------------------------------------------------------------------
 # File system
 
@@ -194,8 +201,90 @@ def get_modification_date(path, strftime='%b %-d %H:%M'):
 #-------------------------------------------------------------------------------
 # File conversion
 
+def iter_json_array(in_file, block_size=None):
+    """Yields each item from JSON array in IN_FILE, decoding incrementally over blocks of BLOCK_SIZE characters
+    Note: Raises ValueError if not an array or if malformed (after items prior to error)."""
+    # EX: list(iter_json_array(io.StringIO('[1, {"a": [2]}]'), block_size=2)) => [1, {"a": [2]}]
+    if block_size is None:
+        block_size = JSON_BLOCK_SIZE
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    at_eof = False
+
+    def read_more():
+        """Appends next block to buffer, dropping text already decoded"""
+        # note: block size increases with buffer to avoid quadratic decoding of large items
+        nonlocal buffer, pos, at_eof
+        block = in_file.read(max(block_size, len(buffer) - pos))
+        at_eof = not block
+        buffer = buffer[pos:] + block
+        pos = 0
+        return not at_eof
+
+    def next_char():
+        """Returns next non-whitespace character (or "" if at end)"""
+        nonlocal pos
+        while True:
+            pos = JSON_WHITESPACE_REGEX.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return ""
+
+    # Decode each item in turn, making sure not truncated at end of buffer (e.g., "1.5e" for 1.5e-07)
+    if next_char() != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    delim = next_char()
+    if delim == "]":
+        pos += 1
+    while delim != "]":
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                if (at_eof or ((end < len(buffer)) and (buffer[end] in " \t\n\r,]"))):
+                    break
+            except ValueError:
+                if at_eof:
+                    raise
+            read_more()
+        pos = end
+        yield item
+        delim = next_char()
+        if delim not in [",", "]"]:
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+        pos += 1
+        if delim == ",":
+            next_char()
+    if next_char():
+        raise json.JSONDecodeError("Extra data", buffer, pos)
+
+
 def json_to_jsonl(in_path, out_path):
-    """Convert JSON-encoded file at IN_PATH to JSONL and save as OUT_PATH"""
+    """Convert JSON-encoded file at IN_PATH to JSONL and save as OUT_PATH
+    Note: A top-level list is converted incrementally (see iter_json_array)."""
+    # Convert list items one at a time, using temporary file in case of error
+    is_list = False
+    try:
+        with open(in_path, encoding="UTF-8") as in_file:
+            is_list = (in_file.read(JSON_BLOCK_SIZE).lstrip(" \t\n\r")[:1] == "[")
+            in_file.seek(0)
+            if is_list:
+                temp_path = f"{out_path}.partial"
+                try:
+                    with open(temp_path, "w", encoding="UTF-8") as out_file:
+                        for item in iter_json_array(in_file):
+                            out_file.write(json.dumps(item) + "\n")
+                    os.replace(temp_path, out_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+    except:
+        system.print_exception_info(f"Error: reading {in_path}")
+    if is_list:
+        return
+
     # Read data and validate
     data = None
     try:
@@ -214,22 +303,40 @@ def json_to_jsonl(in_path, out_path):
 
 
 def jsonl_to_json(in_path, out_path):
-    """Convert JSONL-encoded file at IN_PATH to JSON and save as OUT_PATH"""
-    # Read each line and validate
-    output_lines = []
-    for i, line in enumerate(system.read_lines(in_path)):
+    """Convert JSONL-encoded file at IN_PATH to JSON and save as OUT_PATH
+    Note: Each line is written as read, with conversion stopping at first invalid line."""
+    with open(out_path, "w", encoding="UTF-8") as out_file:
+        out_file.write("[\n")
+        num_items = 0
         try:
-            data = json.loads(line)
-            debug.assertion(data)
-        except:
-            system.print_exception_info(f"Error: converting line {i + 1} in {in_path}")
-            break
-        output_lines.append(line + ",")
-
-    # Save to output file
-    if output_lines:
-        output_lines[-1] = output_lines[-1][0:-1]
-    system.write_lines(out_path, ["["] + output_lines + ["]"])
+            with open(in_path, encoding="UTF-8") as in_file:
+                # Read each line and validate
+                for i, line in enumerate(in_file):
+                    line = line[:-1] if line.endswith("\n") else line
+                    try:
+                        data = json.loads(line)
+                        debug.assertion(data)
+                    except:
+                        system.print_exception_info(f"Error: converting line {i + 1} in {in_path}")
+                        break
+                    # Save to output file, with comma after previous line
+                    if num_items:
+                        out_file.write(",\n")
+                    out_file.write(line)
+                    num_items += 1
+        except IOError:
+            system.print_exception_info(f"Error: reading {in_path}")
+        if num_items:
+            out_file.write("\n")
+        out_file.write("]\n")
+    ## OLD:
+    ## output_lines = []
+    ## for i, line in enumerate(system.read_lines(in_path)):
+    ##     ...
+    ##     output_lines.append(line + ",")
+    ## if output_lines:
+    ##     output_lines[-1] = output_lines[-1][0:-1]
+    ## system.write_lines(out_path, ["["] + output_lines + ["]"])
     return
 
 
@@ -3,10 +3,19 @@
 # Filters lines in input file, based on random numbers
 # TODO: use iterator for input (see ???)
 #
+# Notes:
+# - The --fast option uses a block-skipping sampler: rather than drawing a random
+#   number per line, it draws the number of lines to skip before the next kept line
+#   from a geometric distribution. Skipped lines are scanned in bytes mode over
+#   large buffered blocks, so that the per-line cost is just a newline search.
+# - The fast sampler is reproducible given the seed, but it draws different random
+#   numbers than the line-by-line version, so the sampled lines differ.
+#
 
 """Filter lines randomly"""
 
 # Standard packages
+import math
 import random
 import sys
 
@@ -22,17 +31,112 @@ INCLUDE_HEADER = "include-header"
 RATIO = "ratio"
 SEED = "seed"
 QUIET_MODE = "quiet"
+FAST_MODE = "fast"
 ## TODO: ALT_TODO_ARG = "alt-todo-arg"
 DEFAULT_RATIO = system.getenv_number("DEFAULT_RATIO", 0.10,
                                      "Ratio of input to use (i.e., percent/100)")
 RANDOM_SEED = system.getenv_integer("RANDOM_SEED", 15485863,
                                     "Integral seed for randoom number generation")
+FAST_SAMPLING = system.getenv_bool("FAST_SAMPLING", False,
+                                   "Use block-skipping sampler by default")
+SAMPLER_BLOCK_SIZE = system.getenv_int("SAMPLER_BLOCK_SIZE", 1024 * 1024,
+                                       "Size of bytes blocks read by the fast sampler")
+NEWLINE = b"\n"
+
+
+class BlockSampler:
+    """Samples lines from a binary stream via geometric skip lengths"""
+
+    def __init__(self, ratio, block_size=None, rng=None):
+        """Initializer: RATIO is probability of line inclusion, BLOCK_SIZE the read size,
+        and RNG the random number generator (random module by default)"""
+        debug.trace(5, f"BlockSampler.__init__({ratio}, {block_size}, {rng})")
+        self.ratio = ratio
+        self.block_size = (block_size or SAMPLER_BLOCK_SIZE)
+        self.rng = (rng or random)
+        self.log_complement = (math.log(1.0 - ratio) if (0 < ratio < 1) else None)
+        self.num_kept = 0
+
+    def next_skip(self):
+        """Number of lines to skip before next kept line
+        Note: P(skip = k) = (1 - p)^k * p, matching per-line draws with probability p"""
+        if self.ratio >= 1:
+            return 0
+        if self.ratio <= 0:
+            return sys.maxsize
+        # note: 1 - random() is in (0, 1], so the log is defined
+        return int(math.log(1.0 - self.rng.random()) / self.log_complement)
+
+    @staticmethod
+    def skip_lines(block, pos, num, avg_len):
+        """Returns offset just past the NUM-th newline in BLOCK from POS
+        Note: jumps ahead by NUM lines of average length AVG_LEN and then adjusts
+        via find or rfind, so the number of Python-level calls is not proportional to NUM"""
+        # ex: skip_lines(b"a\nb\nc\n", 0, 2, 2) => 4
+        guess = min(len(block), pos + int(num * avg_len))
+        count = block.count(NEWLINE, pos, guess)
+        if count < num:
+            for _i in range(num - count):
+                guess = block.find(NEWLINE, guess) + 1
+            return guess
+        for _i in range(count - num + 1):
+            guess = block.rfind(NEWLINE, pos, guess)
+        return guess + 1
+
+    def sample(self, in_stream, out_stream):
+        """Copy randomly selected lines from binary IN_STREAM to OUT_STREAM
+        Note: returns number of lines kept; newline added to final line if missing"""
+        debug.trace(5, f"BlockSampler.sample({in_stream}, {out_stream})")
+        skip = self.next_skip()
+        kept_line = None                # kept line spanning blocks (if any)
+        while True:
+            block = in_stream.read(self.block_size)
+            if not block:
+                break
+            pos = 0
+            end = len(block)
+            num_newlines = block.count(NEWLINE)     # yet to be consumed in block
+            avg_len = (end / max(1, num_newlines))
+            while pos < end:
+                # Finish off line being kept
+                if kept_line is not None:
+                    nl = block.find(NEWLINE, pos)
+                    if nl < 0:
+                        kept_line.append(block[pos:])
+                        break
+                    kept_line.append(block[pos:nl + 1])
+                    out_stream.write(b"".join(kept_line))
+                    self.num_kept += 1
+                    kept_line = None
+                    num_newlines -= 1
+                    pos = nl + 1
+                    skip = self.next_skip()
+                    continue
+                # Skip over lines, bypassing entire block if possible
+                # note: a partial line at the end of the block counts as the
+                # next line to skip (i.e., its newline is in the next block)
+                if skip > 0:
+                    if num_newlines < skip:
+                        skip -= num_newlines
+                        break
+                    pos = self.skip_lines(block, pos, skip, avg_len)
+                    num_newlines -= skip
+                    skip = 0
+                kept_line = []
+        if kept_line:
+            kept_line.append(NEWLINE)
+            out_stream.write(b"".join(kept_line))
+            self.num_kept += 1
+        debug.trace(5, f"BlockSampler.sample() => {self.num_kept}")
+        return self.num_kept
+
 
 class Filter(Main):
     """Input processing class"""
     include_header = False
     ratio = 0.10
     quiet_mode = False
+    fast_mode = False
     ## alt_todo_arg = ""
 
     def setup(self):
@@ -43,6 +147,7 @@ class Filter(Main):
         if seed:
             random.seed(seed)
         self.quiet_mode = self.get_parsed_option(QUIET_MODE, self.quiet_mode)
+        self.fast_mode = self.get_parsed_option(FAST_MODE, FAST_SAMPLING)
         ## TODO: self.alt_todo_arg = self.get_parsed_option(alt_todo_arg, self.alt_todo_arg)
         debug.trace_object(6, self, "filter instance")
         debug.trace(4, "ratio={self.ratio}, seed={seed}")
@@ -50,6 +155,7 @@ class Filter(Main):
         self.status(f"Print header: {self.include_header}")
         self.status(f"Ratio: {self.ratio}")
         self.status(f"Random seed: {seed}")
+        self.status(f"Fast sampling: {self.fast_mode}")
         debug.trace_object(5, self, label="Filter instance")
         return
 
@@ -69,6 +175,23 @@ class Filter(Main):
             print(line)
         return
 
+    def process_input(self):
+        """Process input via block-skipping sampler if fast mode (otherwise line by line)"""
+        if not self.fast_mode:
+            super().process_input()
+            return
+        debug.trace(5, "Filter.process_input() [fast]")
+        in_stream = getattr(self.input_stream, "buffer", self.input_stream)
+        sys.stdout.flush()
+        out_stream = sys.stdout.buffer
+        if self.include_header:
+            header = in_stream.readline()
+            if header:
+                out_stream.write(header if header.endswith(NEWLINE) else (header + NEWLINE))
+        BlockSampler(self.ratio).sample(in_stream, out_stream)
+        out_stream.flush()
+        return
+
 if __name__ == '__main__':
     ## debug.trace_fmt(3, "Environment options: {eo}",
     ##                 eo=system.formatted_environment_option_descriptions())
@@ -76,7 +199,8 @@ if __name__ == '__main__':
                  # TODO: use Main.read_input directly w/ manual_input=True
                  # TODO: mention USE_PARAGRAPH_MODE env. option
                  boolean_options=[(INCLUDE_HEADER, "Include header line"),
-                                  (QUIET_MODE, "Don't print status messages")],
+                                  (QUIET_MODE, "Don't print status messages"),
+                                  (FAST_MODE, "Use block-skipping sampler (fewer random draws)")],
                  ## TODO: text_options=[(alt_todo_arg, "TODO-desc")],
                  float_options=[(RATIO, "Random threshold in range [0, 1] for lines to be incorporated", DEFAULT_RATIO), 
                                 (SEED, "Random seed", RANDOM_SEED)])
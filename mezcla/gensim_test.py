@@ -26,15 +26,19 @@
 
 # Standard packages
 import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 import logging
-from collections import OrderedDict
 import os
 import re
 import sys
 import tempfile
 
 # Installed packages
-from gensim import corpora, models, similarities
+from gensim import corpora, matutils, models, similarities
+import numpy as np
+import scipy.sparse
 
 # Local packages
 from mezcla import system
@@ -51,6 +55,13 @@ DOCID_FILENAME = tpo.getenv_value("DOCID_FILENAME", None)
 # TODO: default to number of CPU's
 PARALLEL_SHARDS = tpo.getenv_integer("PARALLEL_SHARDS", 1)
 IN_MEMORY = tpo.getenv_bool("IN_MEMORY", False)
+BATCH_SIMILARITY = tpo.getenv_bool("BATCH_SIMILARITY", True)
+SIMILARITY_SHARD_SIZE = tpo.getenv_integer("SIMILARITY_SHARD_SIZE", 16384)
+SIMILARITY_QUERY_BATCH = tpo.getenv_integer("SIMILARITY_QUERY_BATCH", 1024)
+SIMILARITY_BACKEND = tpo.getenv_text("SIMILARITY_BACKEND", "auto")
+SINGLE_PASS_BUILD = tpo.getenv_bool("SINGLE_PASS_BUILD", True)
+BUILD_WORKERS = tpo.getenv_integer("BUILD_WORKERS", 1)
+BUILD_CHUNK_SIZE = tpo.getenv_integer("BUILD_CHUNK_SIZE", 1000)
 TEMP_BASE = tpo.getenv_text("TEMP_BASE", tempfile.NamedTemporaryFile().name)
 #
 # The following are for pruning dictionary
@@ -60,14 +71,44 @@ MAX_NUM_TOKENS = tpo.getenv_integer("MAX_NUM_TOKENS", None)
 
 #------------------------------------------------------------------------
 
+def tokenize_text(text):
+    """Returns list of lowercased tokens from TEXT split at non-word characters"""
+    # Note: The empty tokens at the ends are retained for consistency with older models.
+    return re.split(r"\W+", text.lower())
+
+
+def build_partial_corpus(documents, are_files=False):
+    """Returns (dictionary, vectors) for DOCUMENTS, which are file paths if ARE_FILES
+    Note: Intended as worker function for parallel corpus construction (see CorpusData.build_corpus)"""
+    debug.trace(6, f"build_partial_corpus(_, {are_files}): num_docs={len(documents)}")
+    dictionary = corpora.Dictionary()
+    vectors = []
+    for document in documents:
+        text = system.read_entire_file(document) if are_files else document
+        vectors.append(dictionary.doc2bow(tokenize_text(text), allow_update=True))
+    return (dictionary, vectors)
+
+
+def merge_dictionary(dictionary, other):
+    """Merges OTHER into DICTIONARY, returning transformation for OTHER's vectors
+    Note: Unlike gensim's merge_with, the collection frequencies are also combined."""
+    transformer = dictionary.merge_with(other)
+    for (other_id, count) in other.cfs.items():
+        new_id = transformer.old2new[other_id]
+        dictionary.cfs[new_id] = dictionary.cfs.get(new_id, 0) + count
+    return transformer
+
+#------------------------------------------------------------------------
+
 class CorpusData(object):
     """Class for processing corpora with gensim (based on MyCorpus from gensim samples)"""
     # Note: Corpora can be too large for main memory, so designed around iterators.
     # TODO: Add option for using all available memory.
     # TODO: isolate class into separate module
 
-    def __init__(self, text=None, directory=None, in_memory=None):
-        """Constructor: initialize dictionary mapping for terms"""
+    def __init__(self, text=None, directory=None, in_memory=None, mm_file=None):
+        """Constructor: initialize dictionary mapping for terms
+        Note: If MM_FILE given, the vectors are written there in the same pass (see build_corpus)"""
         tpo.debug_print("CorpusData.__init__(%s)" % text, 6)
         # TODO: self.text => self.filename
         debug.assertion(not (text and directory))
@@ -81,8 +122,13 @@ class CorpusData(object):
         ## if (self.text):              # mapping from words to token IDs
         ##     self.dictionary = create_dictionary(self.text)
         self.dictionary = None
+        self.mm_file = None     # indexed matrix file from single-pass build
+        self.num_docs = None
         if (self.text or self.directory):
-            self.create_gensim_dictionary()
+            if (mm_file or self.in_memory):
+                self.build_corpus(mm_file)
+            else:
+                self.create_gensim_dictionary()
         return
 
     def load(self, basename):
@@ -114,7 +160,7 @@ class CorpusData(object):
         # Read each logical file returning entire lowercased contents
         for line in system.open_file(self.text):
             # note: assumes there's one document per line with tokens separated by whitespace
-            file_tokenized = re.split(r"\W+", line.lower())
+            file_tokenized = tokenize_text(line)
             debug.trace_fmt(6, "yielding tokens: len={l}", l=len(file_tokenized))
             ## BAD: yield self.dictionary.doc2bow(file_tokenized, allow_update=update_dict)
             yield file_tokenized
@@ -137,7 +183,7 @@ class CorpusData(object):
         for dir_filename in sorted(system.read_directory(self.directory)):
             full_path = gh.form_path(self.directory, dir_filename)
             if not system.is_directory(full_path):
-                file_tokenized = re.split(r"\W+", system.read_entire_file(full_path).lower())
+                file_tokenized = tokenize_text(system.read_entire_file(full_path))
                 debug.trace_fmt(6, "yielding tokens: len={l}", l=len(file_tokenized))
                 ## BAD: yield self.dictionary.doc2bow(file_tokenized, allow_update=update_dict)
                 yield file_tokenized
@@ -166,8 +212,88 @@ class CorpusData(object):
             vector = self.dictionary.doc2bow(file_contents, allow_update=True)
             if self.in_memory:
                 self.mm.append(vector)
+        self.num_docs = self.dictionary.num_docs
         return
-    
+
+    def read_document_chunks(self):
+        """Yields (documents, are_files) tuples with up to BUILD_CHUNK_SIZE lines or file paths from input"""
+        if self.directory:
+            documents = (gh.form_path(self.directory, f) for f in sorted(system.read_directory(self.directory)))
+            documents = (path for path in documents if not system.is_directory(path))
+        else:
+            documents = system.open_file(self.text)
+        while True:
+            chunk = list(itertools.islice(documents, BUILD_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield (chunk, bool(self.directory))
+        return
+
+    def read_partial_corpora(self):
+        """Yields (dictionary, vectors) for each input chunk in order, using BUILD_WORKERS processes"""
+        debug.trace(5, f"read_partial_corpora(): workers={BUILD_WORKERS}")
+        if (BUILD_WORKERS <= 1):
+            for (documents, are_files) in self.read_document_chunks():
+                yield build_partial_corpus(documents, are_files)
+        else:
+            # note: limits number of pending chunks to bound memory usage
+            with ProcessPoolExecutor(max_workers=BUILD_WORKERS) as executor:
+                pending = deque()
+                for (documents, are_files) in self.read_document_chunks():
+                    pending.append(executor.submit(build_partial_corpus, documents, are_files))
+                    if (len(pending) > 2 * BUILD_WORKERS):
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        return
+
+    def read_document_vectors(self):
+        """Yields bag-of-words vectors for input, merging the chunk dictionaries into self.dictionary"""
+        for (dictionary, vectors) in self.read_partial_corpora():
+            old2new = merge_dictionary(self.dictionary, dictionary).old2new
+            for vector in vectors:
+                yield sorted((old2new[token_id], count) for (token_id, count) in vector)
+        return
+
+    def build_corpus(self, mm_file=None):
+        """Creates dictionary and vectors in single pass over input, saving vectors to indexed MM_FILE if given (or else keeping in memory)
+        Note: Tokenization is done by worker processes if BUILD_WORKERS > 1, with the same token ID's as create_gensim_dictionary."""
+        debug.trace(5, f"build_corpus({mm_file})")
+        self.dictionary = corpora.Dictionary()
+        if mm_file:
+            # note: id2word omitted as dictionary is only complete after the pass
+            corpora.MmCorpus.serialize(mm_file, self.read_document_vectors())
+            self.mm_file = mm_file
+            self.mm = corpora.MmCorpus(mm_file)
+        else:
+            self.mm = list(self.read_document_vectors())
+        self.num_docs = self.dictionary.num_docs
+        debug.trace(4, f"build_corpus: num_docs={self.num_docs} num_terms={len(self.dictionary)}")
+        return
+
+    def filter_extremes(self, **kwargs):
+        """Prunes dictionary via gensim filter_extremes using KWARGS (e.g., no_below), updating vectors as well"""
+        debug.trace(5, f"filter_extremes({kwargs})")
+        old_token2id = dict(self.dictionary.token2id)
+        self.dictionary.filter_extremes(**kwargs)
+        if (self.mm is None):
+            return
+        old2new = {old_id: self.dictionary.token2id[token]
+                   for (token, old_id) in old_token2id.items() if token in self.dictionary.token2id}
+        # note: order of ID's preserved by compactify so vectors remain sorted; counts are
+        # converted back to integers as the matrix reader returns floats
+        pruned_vectors = ([(old2new[token_id], int(count)) for (token_id, count) in vector if token_id in old2new]
+                          for vector in self.mm)
+        if (self.mm_file is None):
+            self.mm = list(pruned_vectors)
+        else:
+            temp_mm_file = self.mm_file + ".pruned"
+            corpora.MmCorpus.serialize(temp_mm_file, pruned_vectors, id2word=self.dictionary)
+            os.replace(temp_mm_file, self.mm_file)
+            os.replace(temp_mm_file + ".index", self.mm_file + ".index")
+            self.mm = corpora.MmCorpus(self.mm_file)
+        return
+
     def __iter__(self):
         """Returns iterator over vectors in corpus"""
         ## OLD: """Returns iterator over vectors in corpus or over lines in input text"""
@@ -187,6 +313,8 @@ class CorpusData(object):
         num_docs = -1
         if (self.mm):
             num_docs = len(self.mm)
+        elif (self.num_docs is not None):
+            num_docs = self.num_docs
         else:
             debug.trace(4, "Warning: re-reading corpus for len--use load() so that mm defined.")
             num_docs = self.text_length()
@@ -325,6 +453,7 @@ class SimilarDocumentByCosine(SimilarDocument):
         # note: index_file serves both as the cache for the similarity object as well as base name for the shards it uses (see gensim's docsim.py)
         # TODO: rework so that corpus and dictionary not needed to retrieve pre-computed similarity results
         SimilarDocument.__init__(self, corpus, dictionary, verbose_output, max_similar, docid_filename)
+        self.corpus_matrix = None
         ## BAD: if (self.corpus and self.dictionary):
         if ((self.corpus is not None) and (self.dictionary is not None)):
             if index_file is None:
@@ -381,12 +510,108 @@ class SimilarDocumentByCosine(SimilarDocument):
         debug.trace_fmt(5, "find({d}) => {r}", d=docid, r=result)
         return result
 
-    def derive_all_similarities(self):
-        """Precompute similarities, using batch method via chunking (see Gensim documentation in docsim.py)."""
-        tpo.debug_format("SimilarDocumentByCosine.derive_all_similarities()", 5)
-        _all_sim = list(self.sim_index[self.corpus])
+    def derive_all_similarities(self, output_file=None):
+        """Precompute similarities, using batch method via chunking (see find_batch).
+        Note: If OUTPUT_FILE given, results are written as they are computed, one line per document with tab-separated docid and similar docid:score pairs (space-separated)"""
+        tpo.debug_format("SimilarDocumentByCosine.derive_all_similarities({output_file})", 5)
+        if not BATCH_SIMILARITY:
+            _all_sim = list(self.sim_index[self.corpus])
+            return
+        output_stream = system.open_file(output_file, mode="w") if output_file else None
+        for (docid, similar_docs) in self.iter_all_similarities():
+            if output_stream:
+                output_stream.write(f"{self.get_user_id(docid)}\t")
+                output_stream.write(" ".join(f"{d}:{score:.6f}" for (d, score, *_rest) in similar_docs))
+                output_stream.write("\n")
+        if output_stream:
+            output_stream.close()
+        return
+
+    def get_corpus_matrix(self):
+        """Returns unit-normalized document-by-term matrix for corpus (cached)
+        Note: This is sparse unless SIMILARITY_BACKEND is dense (or auto and over 10% non-zero)."""
+        if self.corpus_matrix is None:
+            term_doc = matutils.corpus2csc(self.corpus, num_terms=len(self.dictionary),
+                                           dtype=np.float32)
+            matrix = term_doc.T.tocsr()
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            matrix = scipy.sparse.diags(1.0 / norms).dot(matrix).tocsr()
+            density = (matrix.nnz / max(1, (matrix.shape[0] * matrix.shape[1])))
+            use_dense = ((SIMILARITY_BACKEND == "dense")
+                         or ((SIMILARITY_BACKEND == "auto") and (density > 0.1)))
+            debug.trace_fmt(5, "corpus matrix: shape={s} density={d} dense={u}",
+                            s=matrix.shape, d=density, u=use_dense)
+            self.corpus_matrix = (matrix.toarray() if use_dense else matrix)
+        return self.corpus_matrix
+
+    def top_similar(self, query_rows):
+        """Returns top-max_similar (doc_indices, scores) arrays for each of QUERY_ROWS (corpus row indices), sorted by descending score.
+        Note: Similarities are computed against shards of SIMILARITY_SHARD_SIZE documents, keeping the top candidates per shard via argpartition; as with gensim, zero scores are excluded (via -inf placeholders)."""
+        matrix = self.get_corpus_matrix()
+        queries = matrix[query_rows]
+        num_docs = matrix.shape[0]
+        k = max(1, self.max_similar)
+        best_indices = np.zeros((len(query_rows), 0), dtype=np.int64)
+        best_scores = np.zeros((len(query_rows), 0), dtype=np.float32)
+        for start in range(0, num_docs, SIMILARITY_SHARD_SIZE):
+            shard = matrix[start: start + SIMILARITY_SHARD_SIZE]
+            scores = queries.dot(shard.T)
+            if scipy.sparse.issparse(scores):
+                scores = scores.toarray()
+            scores = np.asarray(scores, dtype=np.float32)
+            scores[scores == 0] = -np.inf
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            best_indices = np.concatenate([best_indices, top + start], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_indices = np.take_along_axis(best_indices, top, axis=1)
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return (np.take_along_axis(best_indices, order, axis=1),
+                np.take_along_axis(best_scores, order, axis=1))
+
+    def find_batch(self, docids):
+        """Return documents similar to each of DOCIDS; result is a list of lists of tuples: (docid, weight)
+        Note: batched version of find using sparse matrix products (see top_similar)"""
+        debug.trace_fmt(5, "SimilarDocumentByCosine.find_batch(#{n})", n=len(docids))
+        gh.assertion(self.corpus and self.dictionary)
+        query_rows = np.array([int(docid) for docid in docids], dtype=np.int64)
+        results = []
+        for start in range(0, len(query_rows), SIMILARITY_QUERY_BATCH):
+            indices, scores = self.top_similar(query_rows[start: start + SIMILARITY_QUERY_BATCH])
+            # note: affine transform from cosine range [-1, 1] to [0, 1] (see normalize_score)
+            normal_scores = (np.clip(scores, -1.0, 1.0) + 1.0) / 2.0
+            for (row_indices, row_scores, row_normal) in zip(indices, scores, normal_scores):
+                keep = np.isfinite(row_scores)
+                similar_docs = [(self.get_user_id(int(doc)), float(score))
+                                for (doc, score) in zip(row_indices[keep], row_normal[keep])]
+                if self.verbose_output:
+                    similar_docs = [(docid, score, resolve_terms(docid, self.dictionary)) for (docid, score) in similar_docs]
+                results.append(similar_docs)
+        return results
+
+    def iter_all_similarities(self):
+        """Iterator over (docid, similar-doc-list) for all documents, computed in batches of SIMILARITY_QUERY_BATCH"""
+        num_docs = self.get_corpus_matrix().shape[0]
+        for start in range(0, num_docs, SIMILARITY_QUERY_BATCH):
+            docids = list(range(start, min(num_docs, start + SIMILARITY_QUERY_BATCH)))
+            for (docid, similar_docs) in zip(docids, self.find_batch(docids)):
+                yield (docid, similar_docs)
         return
 
+    def find_all_similar(self):
+        """Iterator for getting list of similar documents for each document (see SimilarDocument.find_all_similar)"""
+        if not BATCH_SIMILARITY:
+            yield from SimilarDocument.find_all_similar(self)
+            return
+        yield from self.iter_all_similarities()
+
 #------------------------------------------------------------------------
 
 def create_dictionary(filename):
@@ -502,6 +727,7 @@ def main(runtime_args=None):
     docid_filename = args['docid_filename']
     prune_dictionary = args['prune_dictionary']
     temp_file = None
+    temp_mm_file = temp_mm_dir = None
 
     # Map stdin to temporary file
     # TODO: rework in terms of streaming (e.g., for files > 4gb)
@@ -543,7 +769,16 @@ def main(runtime_args=None):
     else:
         ## OLD: corpus_data = CorpusData(filename)
         is_dir = system.is_directory(filename)
-        corpus_data = CorpusData(directory=filename) if is_dir else CorpusData(text=filename)
+        # note: the single-pass build writes the vectors to an indexed matrix file (temporary unless saving)
+        # note: the temporary matrix gets its own directory so that cleanup doesn't clobber user files
+        mm_file = None
+        if SINGLE_PASS_BUILD:
+            if save:
+                mm_file = output_basename + ".bow.mm"
+            else:
+                temp_mm_dir = tempfile.mkdtemp()
+                mm_file = temp_mm_file = gh.form_path(temp_mm_dir, "corpus.bow.mm")
+        corpus_data = CorpusData(directory=filename, mm_file=mm_file) if is_dir else CorpusData(text=filename, mm_file=mm_file)
     tpo.debug_print("corpus_data: type=%s value=%s" % (type(corpus_data), corpus_data), 5)
     debug.trace_object(5, corpus_data)
 
@@ -557,12 +792,14 @@ def main(runtime_args=None):
             option_overrides['no_above'] = MAX_PCT_DOCS
         if MAX_NUM_TOKENS:
             option_overrides['keep_n'] = MAX_NUM_TOKENS
-        corpus_data.dictionary.filter_extremes(**option_overrides)
+        corpus_data.filter_extremes(**option_overrides)
 
     # Print the corpus
     if (print_vectors and show_original):
         print("corpus_data: [")
         for docid, vector in enumerate(corpus_data):
+            # note: counts shown as integers even if read from matrix file
+            vector = [(token_id, int(count)) for (token_id, count) in vector]
             print(docid, vector if not verbose_output else resolve_terms(vector, corpus_data.dictionary))
         print("]")
 
@@ -598,13 +835,15 @@ def main(runtime_args=None):
         sim = SimilarDocumentByCosine(corpus=sim_corpus, dictionary=dictionary, index_file=index_filename, verbose_output=verbose_output, max_similar=max_similar, docid_filename=docid_filename)
         # Precompute similarities
         if not source_similar_docs:
-            sim.derive_all_similarities()
+            sim.derive_all_similarities(output_basename + ".similarities.txt" if save else None)
 
     # Show similar documents
     # TODO: have option to save as data file
     if source_similar_docs:
         if (source_similar_docs == ['*']):
             similar_doc_info = sim.find_all_similar()
+        elif BATCH_SIMILARITY:
+            similar_doc_info = zip(source_similar_docs, sim.find_batch(source_similar_docs))
         else:
             similar_doc_info = []
             for docid in source_similar_docs:
@@ -631,7 +870,7 @@ def main(runtime_args=None):
         tpo.debug_print("saving corpora files", 6)
         if ((not load) or (not gh.non_empty_file(output_basename + '.wordids.txt.bz2'))):
             corpus_data.dictionary.save_as_text(output_basename + '.wordids.txt.bz2')
-        if ((not load) or (not gh.non_empty_file(output_basename + '.bow.mm'))):
+        if ((not load) or (not gh.non_empty_file(output_basename + '.bow.mm'))) and (corpus_data.mm_file != output_basename + '.bow.mm'):
             mm = list(corpus_data) if expand_corpus else corpus_data
             corpora.MmCorpus.serialize(output_basename + '.bow.mm', mm)
         if (perform_tfidf):
@@ -644,6 +883,10 @@ def main(runtime_args=None):
     if (temp_file and (not tpo.detailed_debugging())):
         ## OLD: gh.run("rm -vf {temp_file}")
         gh.run("rm -vf {temp_file}*")
+    if (temp_mm_file and (not tpo.detailed_debugging())):
+        for path in [temp_mm_file, temp_mm_file + ".index"]:
+            gh.delete_existing_file(path)
+        os.rmdir(temp_mm_dir)
 
     return
 
@@ -32,12 +32,14 @@ Usage example:
 
 # Standard packages
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import inspect
 import os
 import re
+import shlex
 import shutil
-from subprocess import getoutput
+import subprocess
 import sys
 import tempfile
 from typing import (
@@ -119,6 +121,9 @@ DISABLE_RECURSIVE_DELETE = system.getenv_value(
     "DISABLE_RECURSIVE_DELETE", None,
     description="Disable use of potentially dangerous rm -r style recursive deletions")
 PRESERVE_TEMP_FILE = None
+RUN_WITHOUT_SHELL = system.getenv_bool(
+    "RUN_WITHOUT_SHELL", (os.name == "posix"),
+    description="Run commands lacking shell syntax directly rather than via /bin/sh")
 
 # Globals
 # note:
@@ -135,6 +140,14 @@ TEMP_FILE = None
 GLOBAL_TEMP_FILE = os.path.join(TMP, f"temp-{PID}")
 TEMP_LOG_FILE = os.path.join(TMP, f"{GLOBAL_TEMP_FILE}.log")
 TEMP_SCRIPT_FILE = os.path.join(TMP, f"{GLOBAL_TEMP_FILE}.script")
+#
+# note: commands with any of these characters (or starting with a builtin) are run via the shell
+SHELL_SYNTAX_REGEX = re.compile(r"[|&;<>()$`\\*?\[\]~{}!#\n]")
+SHELL_BUILTINS = frozenset(
+    ". : [ alias break case cd command continue do done echo elif else esac eval exec exit "
+    "export false fi for function getopts hash if kill local printf pwd read readonly return "
+    "set shift source test then time times trap true type ulimit umask unalias unset until "
+    "wait while".split())
 
 #------------------------------------------------------------------------
 
@@ -448,7 +461,7 @@ def disable_subcommand_tracing() -> None:
     """Disables tracing in scripts invoked via run().
     Note: Invoked in unittest_wrapper.py"""
     tpo.debug_print("disable_subcommand_tracing()", 7)
-    # Note this works by having run() temporarily setting DEBUG_LEVEL to 0."""
+    # Note this works by having run() pass DEBUG_LEVEL of 0 to the subprocess.
     global default_subtrace_level
     default_subtrace_level = 0
 
@@ -459,6 +472,7 @@ def run(
         subtrace_level: Optional[debug.IntOrTraceLevel] = None,
         just_issue: Optional[bool] = None,
         output: bool = False,
+        env_overrides: Optional[Dict[str, str]] = None,
         **namespace
     ) -> str:
     """Invokes COMMAND via system shell (e.g., os.system), using TRACE_LEVEL for debugging output, returning result. The command can use format-style templates, resolved from caller's namespace. The optional SUBTRACE_LEVEL sets tracing for invoked commands (default is same as TRACE_LEVEL); this works around problem with stderr not being separated, which can be a problem when tracing unit tests.
@@ -469,6 +483,8 @@ def run(
    - This function doesn't work fully under Win32. Tabs are not preserved, so redirect stdout to a file if needed.
    - If TEMP_FILE or TEMP_BASE defined, these are modified to be unique to avoid conflicts across processeses.
     - If OUTPUT, the result will be printed.
+   - ENV_OVERRIDES specifies additional environment variables for the command; os.environ is left as is.
+   - Commands without shell syntax are executed directly (see RUN_WITHOUT_SHELL).
    """
     # TODO: add automatic log file support as in run_script from unittest_wrapper.py
     # TODO: make sure no template markers left in command text (e.g., "tar cvfz {tar_file}")
@@ -476,33 +492,9 @@ def run(
     # Note: Script tracing controlled DEBUG_LEVEL environment variable.
     debug.assertion(isinstance(trace_level, int))
     debug.trace(trace_level + 2, f"run({command}, tl={trace_level}, sub_tr={subtrace_level}, iss={just_issue}, out={output}", skip_sanity_checks=True)
-    global default_subtrace_level
-    # Keep track of current debug level setting
-    debug_level_env = os.getenv("DEBUG_LEVEL")
-    if subtrace_level is None:
-        subtrace_level = default_subtrace_level
-    if subtrace_level != trace_level:
-        system.setenv("DEBUG_LEVEL", str(subtrace_level))
     in_just_issue = just_issue
     if just_issue is None:
         just_issue = False
-    save_temp_base = TEMP_BASE
-    if TEMP_BASE:
-        # note: makes sure subprocess TEMP_BASE is dir if main one is
-        if system.is_directory(TEMP_BASE) or TEMP_BASE.endswith("/"):
-            system.create_directory(TEMP_BASE)
-            new_TEMP_BASE = form_path(TEMP_BASE, "_subprocess_", create=True)
-            system.setenv("TEMP_BASE", new_TEMP_BASE)
-            ## TEMP
-            system.create_directory(new_TEMP_BASE)
-        else:
-            system.setenv("TEMP_BASE", TEMP_BASE + "_subprocess_")
-    save_temp_file = TEMP_FILE
-    if TEMP_FILE and (PRESERVE_TEMP_FILE is not True):
-        new_TEMP_FILE = TEMP_FILE + "_subprocess_"
-        debug.trace_expr(5, PRESERVE_TEMP_FILE)
-        debug.trace(5, f"Setting TEMP_FILE to {new_TEMP_FILE}")
-        system.setenv("TEMP_FILE", new_TEMP_FILE)
     # Expand the command template if brace-style variable reference encountered
     # NOTE: un-pythonic warnings issued by format so this should not affect anything
     # TODO: make this optional
@@ -524,24 +516,116 @@ def run(
     # should replace 'run("... >| f")' usages with 'delete_file(f); run(...)'.
     # note: TestWrapper.setUp handles the deletion automatically
     debug.assertion(">|" not in command_line)
-    result = None
-    ## TODO: if (just_issue or not foreground_wait): ... else: ...
     wait_for_command = (foreground_wait and not just_issue)
     debug.trace_expr(5, foreground_wait, just_issue, wait_for_command)
     ## TODO3: clarify what output is when stdout redirected (e.g., for issue in support of unittest_wrapper.run_script
-    result = getoutput(command_line) if wait_for_command else str(os.system(command_line))
+    result = run_command(command_line, get_subprocess_env(trace_level, subtrace_level, env_overrides),
+                         wait=wait_for_command)
     if output:
         print(result)
-    # Restore debug level setting in environment
-    system.setenv("DEBUG_LEVEL", debug_level_env or "")
-    system.setenv("TEMP_BASE", save_temp_base or "")
-    if save_temp_file and (PRESERVE_TEMP_FILE is not True):
-        debug.trace(5, f"Resetting TEMP_FILE to {save_temp_file}")
-        system.setenv("TEMP_FILE", save_temp_file)
     debug_print("run(_) => {\n%s\n}" % indent_lines(result), (trace_level + 1))
     return result
 
 
+def get_subprocess_env(
+        trace_level: debug.IntOrTraceLevel = 4,
+        subtrace_level: Optional[debug.IntOrTraceLevel] = None,
+        env_overrides: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, str]:
+    """Returns environment for commands issued via run: a copy of os.environ with DEBUG_LEVEL set from SUBTRACE_LEVEL (if not TRACE_LEVEL), TEMP_BASE and TEMP_FILE made unique to subprocesses, and ENV_OVERRIDES
+    Note: os.environ itself is not modified, so this is safe to use from threads."""
+    result = dict(os.environ)
+    if subtrace_level is None:
+        subtrace_level = default_subtrace_level
+    if subtrace_level != trace_level:
+        result["DEBUG_LEVEL"] = str(subtrace_level)
+    if TEMP_BASE:
+        # note: makes sure subprocess TEMP_BASE is dir if main one is
+        if system.is_directory(TEMP_BASE) or TEMP_BASE.endswith("/"):
+            new_TEMP_BASE = form_path(TEMP_BASE, "_subprocess_")
+            if not system.is_directory(new_TEMP_BASE):
+                system.create_directory(TEMP_BASE)
+                system.create_directory(new_TEMP_BASE)
+            result["TEMP_BASE"] = new_TEMP_BASE
+        else:
+            result["TEMP_BASE"] = TEMP_BASE + "_subprocess_"
+    if TEMP_FILE and (PRESERVE_TEMP_FILE is not True):
+        result["TEMP_FILE"] = TEMP_FILE + "_subprocess_"
+    if env_overrides:
+        result.update(env_overrides)
+    return result
+
+
+def get_direct_command_args(command_line: str, env: Optional[Dict[str, str]] = None) -> Optional[List[str]]:
+    """Returns argument list for running COMMAND_LINE without a shell, or None if shell needed (e.g., for pipes, variables, or builtins)
+    Note: None is also returned if the executable is not found via PATH from ENV (or os.environ), so that the shell reports the error."""
+    # EX: get_direct_command_args("ls -l '/tmp'") => ["ls", "-l", "/tmp"]
+    # EX: get_direct_command_args("ls /tmp | wc -l") => None
+    if (not RUN_WITHOUT_SHELL) or SHELL_SYNTAX_REGEX.search(command_line):
+        return None
+    try:
+        args = shlex.split(command_line)
+    except ValueError:
+        return None
+    if (not args) or (args[0] in SHELL_BUILTINS) or ("=" in args[0]):
+        return None
+    if not shutil.which(args[0], path=(env or os.environ).get("PATH")):
+        return None
+    return args
+
+
+def to_wait_status(return_code: int) -> int:
+    """Converts subprocess RETURN_CODE into wait status as with os.system (e.g., 256 for exit code 1)"""
+    # EX: to_wait_status(1) => 256
+    # EX: to_wait_status(-9) => 9
+    return ((return_code << 8) if (return_code >= 0) else -return_code)
+
+
+def run_command(command_line: str, env: Optional[Dict[str, str]] = None, wait: bool = True) -> str:
+    """Runs COMMAND_LINE with environment ENV, returning combined stdout and stderr (less final newline) if WAIT or else the wait status as with os.system (e.g., "256" for exit code 1)
+    Note: The command is executed directly if no shell syntax is used (see get_direct_command_args); otherwise, via /bin/sh as with subprocess.getoutput. The shell is also used if direct execution fails (e.g., script without shebang line)."""
+    args = get_direct_command_args(command_line, env)
+    debug.trace(6, f"run_command({command_line!r}, _, {wait}); args={args}")
+    if args:
+        try:
+            if not wait:
+                return str(to_wait_status(subprocess.call(args, env=env)))
+            process = subprocess.run(args, env=env, text=True, check=False,
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError:
+            debug.trace_exception(5, "run_command direct")
+            args = None
+    if not args:
+        if not wait:
+            return str(to_wait_status(subprocess.call(command_line, shell=True, env=env)))
+        process = subprocess.run(command_line, shell=True, env=env, text=True, check=False,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    result = process.stdout
+    if result.endswith("\n"):
+        result = result[:-1]
+    return result
+
+
+def run_many(
+        commands: List[str],
+        max_workers: Optional[int] = None,
+        trace_level: debug.IntOrTraceLevel = 4,
+        subtrace_level: Optional[debug.IntOrTraceLevel] = None,
+        env_overrides: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+    """Runs independent COMMANDS concurrently using up to MAX_WORKERS threads, returning list of outputs in same order
+    Notes:
+    - Unlike run, templates are not resolved (e.g., use f-strings instead).
+    - The environment is as with run (e.g., SUBTRACE_LEVEL and ENV_OVERRIDES)."""
+    # EX: run_many(["echo a", "echo b"]) => ["a", "b"]
+    debug.trace(trace_level + 2, f"run_many({elide_values(commands)}, {max_workers})")
+    sub_env = get_subprocess_env(trace_level, subtrace_level, env_overrides)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result = list(executor.map(lambda command: run_command(command, sub_env), commands))
+    debug.trace(trace_level + 1, f"run_many(_) => {elide_values(result)}")
+    return result
+
+
 def run_via_bash(
         command: str,
         trace_level: debug.IntOrTraceLevel = 4,
@@ -575,11 +659,13 @@ def issue(
         command: str,
         trace_level: debug.IntOrTraceLevel = 4,
         subtrace_level: Optional[debug.IntOrTraceLevel] = None,
+        env_overrides: Optional[Dict[str, str]] = None,
         **namespace
     ) -> None:
     """Wrapper around run() for when output is not being saved (i.e., just issues command). 
     Note:
     - Nothing is returned.
+    - ENV_OVERRIDES specifies additional environment variables (see run).
     - Traces stdout when debugging at quite-detailed level (6).
     - Captures stderr unless redirected and traces at error level (1)."""
     # EX: issue("ls /") => None
@@ -597,7 +683,7 @@ def issue(
     command_line = command
     if re.search("{.*}", command_line):
         command_line = tpo.format(command_line, indirect_caller=True, ignore_exception=False, **namespace)
-    output = run(command_line, trace_level, subtrace_level, just_issue=True)
+    output = run(command_line, trace_level, subtrace_level, just_issue=True, env_overrides=env_overrides)
     tpo.debug_print("stdout from command: {\n%s\n}\n" % indent(output), (2 + trace_level))
     # Trace out any standard error output and remove temporary log file (unless debugging)
     if log_file:
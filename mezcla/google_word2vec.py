@@ -32,6 +32,8 @@
 """Simple interface into Gensim's Word2vec algorithm"""
 
 import argparse
+from array import array
+import json
 import numpy
 import os
 import re
@@ -72,6 +74,12 @@ SKIP_INDIVIDUAL = tpo.getenv_boolean("SKIP_INDIVIDUAL", False,
 SIM_OUTPUT_FILE = system.getenv_value(
     "SIM_OUTPUT_FILE", None,
     desc="Output file for similarity info for all terms")
+SENTENCE_CACHE = tpo.getenv_text("SENTENCE_CACHE", "",
+                                 "Basename for pre-tokenized sentence cache (e.g., to speed up retraining)")
+USE_CORPUS_FILE = tpo.getenv_boolean("USE_CORPUS_FILE", False,
+                                     "Train via gensim's corpus_file mode using text version of sentence cache")
+CACHE_BLOCK_SIZE = tpo.getenv_integer("CACHE_BLOCK_SIZE", 10000,
+                                      "Number of sentences per block when reading sentence cache")
 
 def format_related_terms(model, positive_terms, max_num=NUM_TOP):
     """Determine related terms from MODEL for POSITIVE_TERMS, returning at most MAX_NUM entries each."""
@@ -156,6 +164,113 @@ class MySentences(object):
         return
 
 
+class SentenceCache(object):
+    """Pre-tokenized version of MySentences input for use over multiple passes (e.g., epochs).
+    The tokens are stored as a memory-mapped stream of integer ID's, along with sentence offsets
+    and the vocabulary, so that Python tokenization is only done once.
+    Note: Optionally, a space-separated text version is included for gensim's corpus_file mode."""
+    # Files: BASE.tokens (int32), BASE.offsets (int64 start positions plus end), BASE.vocab.json,
+    # BASE.meta.json (source signature), and optionally BASE.corpus.txt.
+
+    def __init__(self, basename):
+        """Class constructor: BASENAME is prefix for cache files"""
+        tpo.debug_format("SentenceCache.__init__({b})", 6, b=basename)
+        self.basename = basename
+        self.tokens_file = basename + ".tokens"
+        self.offsets_file = basename + ".offsets"
+        self.vocab_file = basename + ".vocab.json"
+        self.meta_file = basename + ".meta.json"
+        self.corpus_file = basename + ".corpus.txt"
+        self.vocab = None
+        self.tokens = None
+        self.offsets = None
+        return
+
+    @staticmethod
+    def get_source_info(file_name):
+        """Returns signature for FILE_NAME input (file sizes and times plus tokenization options)"""
+        file_names = [file_name]
+        if os.path.isdir(file_name):
+            file_names = [os.path.join(file_name, f) for f in sorted(os.listdir(file_name))]
+        files = [[f, os.path.getsize(f), os.path.getmtime(f)] for f in file_names if not os.path.isdir(f)]
+        return {"files": files, "preserve": PRESERVE, "downcase": DOWNCASE}
+
+    def is_current(self, file_name, corpus_file=False):
+        """Whether the cache is up to date for FILE_NAME, optionally including CORPUS_FILE version"""
+        ok = False
+        if gh.non_empty_file(self.meta_file):
+            meta = json.loads(system.read_file(self.meta_file))
+            ok = ((meta.get("source") == self.get_source_info(file_name))
+                  and ((not corpus_file) or meta.get("corpus_file", False)))
+        tpo.debug_format("SentenceCache.is_current({f}) => {ok}", 5, f=file_name, ok=ok)
+        return ok
+
+    def build(self, file_name, corpus_file=False):
+        """Tokenizes FILE_NAME via MySentences into the cache, optionally with CORPUS_FILE version"""
+        tpo.debug_format("SentenceCache.build({f}, {c})", 4, f=file_name, c=corpus_file)
+        token_ids = {}
+        num_tokens = 0
+        tokens_buffer = array("i")
+        offsets_buffer = array("q", [0])
+        corpus_out = system.open_file(self.corpus_file, "w") if corpus_file else None
+        with open(self.tokens_file, "wb") as tokens_out, open(self.offsets_file, "wb") as offsets_out:
+            for tokens in MySentences(file_name):
+                tokens_buffer.extend(token_ids.setdefault(t, len(token_ids)) for t in tokens)
+                num_tokens += len(tokens)
+                offsets_buffer.append(num_tokens)
+                if corpus_out:
+                    # note: gensim re-splits at whitespace (e.g., PRESERVE tokens unaffected)
+                    corpus_out.write(" ".join(tokens) + "\n")
+                if (len(offsets_buffer) >= CACHE_BLOCK_SIZE):
+                    tokens_buffer.tofile(tokens_out)
+                    offsets_buffer.tofile(offsets_out)
+                    del tokens_buffer[:]
+                    del offsets_buffer[:]
+            tokens_buffer.tofile(tokens_out)
+            offsets_buffer.tofile(offsets_out)
+        if corpus_out:
+            corpus_out.close()
+        file_utils.write_json(self.vocab_file, list(token_ids))
+        # note: metadata written last so that interrupted builds are redone
+        meta = {"source": self.get_source_info(file_name), "corpus_file": corpus_file,
+                "num_tokens": num_tokens}
+        file_utils.write_json(self.meta_file, meta)
+        self.vocab = None
+        return
+
+    def load(self, file_name=None, corpus_file=False):
+        """Opens the cache, first building it from FILE_NAME if not current (see build)
+        Returns: self"""
+        if (file_name is not None) and (not self.is_current(file_name, corpus_file)):
+            self.build(file_name, corpus_file)
+        self.vocab = json.loads(system.read_file(self.vocab_file))
+        self.offsets = numpy.memmap(self.offsets_file, dtype=numpy.int64, mode="r")
+        # note: numpy can't map empty files
+        self.tokens = (numpy.memmap(self.tokens_file, dtype=numpy.int32, mode="r")
+                       if os.path.getsize(self.tokens_file) else numpy.zeros(0, dtype=numpy.int32))
+        tpo.debug_format("SentenceCache: {n} sentences, {v} types", 4, n=len(self), v=len(self.vocab))
+        return self
+
+    def __len__(self):
+        """Returns number of sentences"""
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """Returns iterator producing token lists as with MySentences"""
+        if self.vocab is None:
+            self.load()
+        lookup = self.vocab.__getitem__
+        num_sentences = len(self)
+        for start in range(0, num_sentences, CACHE_BLOCK_SIZE):
+            # Resolve the tokens for the entire block at once
+            end = min(start + CACHE_BLOCK_SIZE, num_sentences)
+            offsets = (self.offsets[start:(end + 1)] - self.offsets[start]).tolist()
+            words = list(map(lookup, self.tokens[self.offsets[start]:self.offsets[end]].tolist()))
+            for i in range(end - start):
+                yield words[offsets[i]:offsets[i + 1]]
+        return
+
+
 def main():
     """Entry point for script"""
     tpo.debug_print("main(): sys.argv=%s" % sys.argv, 4)
@@ -170,6 +285,7 @@ if loading existing model.
 
 Notes:
 - The input file should have one document per line (multiple sentences allowed).
+- Use SENTENCE_CACHE to tokenize the input once for use in later passes and runs.
 - The following environment options are available:
   {env}
     """, env=env_options)
@@ -222,6 +338,10 @@ Notes:
         model = Word2Vec.load(filename)
     else:
         sentences = MySentences(filename)
+        sentence_cache = None
+        if SENTENCE_CACHE:
+            sentence_cache = SentenceCache(SENTENCE_CACHE).load(filename, corpus_file=USE_CORPUS_FILE)
+            sentences = sentence_cache
         if tpo.verbose_debugging():
             # TODO: try to develop develop read-only function that makes copy of iterator
             sentences = list(sentences)
@@ -229,7 +349,11 @@ Notes:
             tpo.debug_format("sentences={s}", 6, s=sentences)
         # Notes: 1 is default for word2vec (todo, try None)
         seed = 1 if (RANDOM_SEED == -1) else RANDOM_SEED
-        model = Word2Vec(sentences, workers=NUM_WORKERS, seed=seed)
+        if (sentence_cache and USE_CORPUS_FILE):
+            # note: gensim reads the file directly, with tokenization done in C
+            model = Word2Vec(corpus_file=sentence_cache.corpus_file, workers=NUM_WORKERS, seed=seed)
+        else:
+            model = Word2Vec(sentences, workers=NUM_WORKERS, seed=seed)
 
         # Optionally save model to disk
         if (save):
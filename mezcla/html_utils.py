@@ -53,11 +53,19 @@
 """HTML utility functions"""
 
 # Standard packages
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import hashlib
 import html
+import json
+import os
 import re
 import sys
+import tempfile
+import threading
 import time
 import traceback
+import urllib.parse
 import urllib.request
 from urllib.error import HTTPError, URLError
 from http.client import HTTPMessage
@@ -109,6 +117,30 @@ TARGET_BOOTSTRAP =  system.getenv_bool(
 FIREFOX_WEBDRIVER = system.getenv_bool(
     "FIREFOX_WEBDRIVER", True,          ## TODO: "FIREFOX_WEBDRIVER", False,
     description="Use Firefox webdriver for Selenium")
+REUSE_HTTP_SESSION = system.getenv_bool("REUSE_HTTP_SESSION", True,
+                                         "Use pooled keep-alive session for request-based downloads")
+HTTP_POOL_SIZE = system.getenv_int("HTTP_POOL_SIZE", 32,
+                                   "Max. connections kept alive per host in pooled session")
+BULK_DOWNLOAD_WORKERS = system.getenv_int("BULK_DOWNLOAD_WORKERS", 8,
+                                          "Number of threads for download_web_documents")
+PER_HOST_DOWNLOAD_LIMIT = system.getenv_int("PER_HOST_DOWNLOAD_LIMIT", 4,
+                                            "Max. concurrent downloads per host in download_web_documents")
+DOWNLOAD_RETRIES = system.getenv_int("DOWNLOAD_RETRIES", 3,
+                                     "Number of retries for failed bulk downloads")
+DOWNLOAD_BACKOFF = system.getenv_float("DOWNLOAD_BACKOFF", 0.5,
+                                       "Initial delay in seconds between bulk download retries (doubled each time)")
+DOWNLOAD_CHUNK_SIZE = system.getenv_int("DOWNLOAD_CHUNK_SIZE", 64 * 1024,
+                                        "Size of chunks for streaming downloads to disk")
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+USE_HTTP_CACHE = system.getenv_bool("USE_HTTP_CACHE", False,
+                                    "Use validating content-addressed cache for download_web_document with use_cached")
+HTTP_CACHE_TTL = system.getenv_float("HTTP_CACHE_TTL", 3600,
+                                     "Seconds before cached download is revalidated with server")
+HTTP_CACHE_MAX_SIZE = system.getenv_int("HTTP_CACHE_MAX_SIZE", 1024 * 1024 * 1024,
+                                        "Max. bytes of document bodies kept in HTTP cache")
+HTTP_CACHE_SAVE_INTERVAL = system.getenv_int("HTTP_CACHE_SAVE_INTERVAL", 100,
+                                             "Number of cache hits before access times are saved to HTTP cache index")
+HTTP_CACHE_SUBDIR = ".http-cache"
 HEADERS = "headers"
 FILENAME = "filename"
 
@@ -124,6 +156,10 @@ issued_param_dict_warning:bool = False
 # Placeholders for dynamically loaded modules
 BeautifulSoup : Optional[Callable] = None
 
+# Pooled HTTP session (see get_http_session)
+http_session : Optional[requests.Session] = None
+http_session_lock = threading.Lock()
+
 #-------------------------------------------------------------------------------
 # HTML utility functions
 
@@ -529,7 +565,7 @@ def old_download_web_document(url : str, filename: Optional[str] = None, downloa
 
 def download_web_document(url : str, filename: Optional[str] = None, download_dir: Optional[str] = None, meta_hash=None, use_cached : bool = False, as_binary : bool = False, ignore : bool = False) -> OptStrBytes:
     """Download document contents at URL, returning as unicode text (unless AS_BINARY).
-    Notes: An optional FILENAME can be given for the download, an optional DOWNLOAD_DIR[ectory] can be specified (defaults to '.'), and an optional META_HASH can be specified for recording filename and headers. Existing files will be considered if USE_CACHED. If IGNORE, no exceptions reports are printed."""
+    Notes: An optional FILENAME can be given for the download, an optional DOWNLOAD_DIR[ectory] can be specified (defaults to '.'), and an optional META_HASH can be specified for recording filename and headers. Existing files will be considered if USE_CACHED (or the validating DownloadCache if USE_HTTP_CACHE). If IGNORE, no exceptions reports are printed."""
     # EX: "currency" in download_web_document("https://simple.wikipedia.org/wiki/Dollar")
     # EX: download_web_document("www. bogus. url.html") => None
     ## TODO: def download_web_document(url, /, filename=None, download_dir=None, meta_hash=None, use_cached=False):
@@ -557,7 +593,18 @@ def download_web_document(url : str, filename: Optional[str] = None, download_di
         meta_hash[FILENAME] = local_filename
     headers = {}
     doc_data: OptStrBytes = ""
-    if use_cached and system.non_empty_file(local_filename):
+    if use_cached and USE_HTTP_CACHE:
+        debug.trace(5, "Using validating HTTP cache")
+        cache = get_download_cache(download_dir)
+        doc_data = cache.fetch(url)
+        if (doc_data is not None) and (meta_hash is not None):
+            with cache.lock:
+                entry = cache.index.get(url)
+            if entry:
+                meta_hash[FILENAME] = cache.object_path(entry["hash"])
+        if (doc_data is not None) and (not as_binary):
+            doc_data = doc_data.decode(errors='ignore')
+    elif use_cached and system.non_empty_file(local_filename):
         debug.trace_fmtd(5, "Using cached file for URL: {f}", f=local_filename)
         doc_data = _read_file(local_filename, as_binary)
     else:
@@ -631,7 +678,8 @@ def retrieve_web_document(url : str, meta_hash=None, as_binary : bool = False, i
     if "//" not in url:
         url = "http://" + url
     try:
-        r = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+        get_fn = (get_http_session().get if REUSE_HTTP_SESSION else requests.get)
+        r = get_fn(url, timeout=DOWNLOAD_TIMEOUT)
         status_code = r.status_code
         result = r.content
         debug.assertion(isinstance(result, bytes))
@@ -648,6 +696,299 @@ def retrieve_web_document(url : str, meta_hash=None, as_binary : bool = False, i
     return result
 
 
+def get_http_session() -> requests.Session:
+    """Returns shared requests session with connection pooling (i.e., keep-alive)
+    Note: The connection pool holds up to HTTP_POOL_SIZE connections per host."""
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                                    pool_maxsize=HTTP_POOL_SIZE)
+            http_session.mount("http://", adapter)
+            http_session.mount("https://", adapter)
+            debug.trace(5, f"new HTTP session: {http_session}")
+    return http_session
+
+
+def _get_download_filename(url : str, download_dir : str, unique : bool = False) -> str:
+    """Returns path for download of URL in DOWNLOAD_DIR, a la download_web_document.
+    Note: If UNIQUE, a hash of the URL is added before the extension (e.g., for shared basenames)."""
+    # EX: _get_download_filename("http://a.com/x/index.html", "d", unique=True) => "d/index-e76fc17c.html"
+    url_hash = hashlib.sha256(url.encode()).hexdigest()[:8]
+    if url.endswith("/"):
+        url = url[:-1]
+    filename = system.quote_url_text(gh.basename(url))
+    if unique:
+        (stem, extension) = os.path.splitext(filename)
+        filename = f"{stem}-{url_hash}{extension}"
+    return gh.form_path(download_dir, filename)
+
+
+def _stream_web_document(session : requests.Session, url : str, local_filename : str,
+                         max_retries : int, backoff : float, ignore : bool) -> bool:
+    """Downloads URL into LOCAL_FILENAME in chunks using SESSION, returning whether successful.
+    Note: Connection errors and transient statuses (e.g., 503) are retried up to MAX_RETRIES times, with the delay starting at BACKOFF seconds and doubling each time."""
+    debug.trace(6, f"_stream_web_document(_, {url}, {local_filename})")
+    ok = False
+    delay = backoff
+    # note: uses unique temp file in same directory, so concurrent downloads don't clobber each other
+    # and the final rename is atomic (n.b., permissions relaxed from mkstemp's owner-only default)
+    (fd, temp_filename) = tempfile.mkstemp(dir=(gh.dirname(local_filename) or "."),
+                                           prefix=(gh.basename(local_filename) + "."), suffix=".part")
+    os.close(fd)
+    os.chmod(temp_filename, 0o644)
+    for attempt in range(max_retries + 1):
+        if attempt > 0:
+            debug.trace(4, f"Retrying download of {url} in {delay}s (attempt {attempt})")
+            time.sleep(delay)
+            delay *= 2
+        try:
+            with session.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as r:
+                if r.status_code in RETRY_STATUS_CODES:
+                    debug.trace(4, f"Transient status {r.status_code} for {url}")
+                    continue
+                if r.status_code >= 400:
+                    debug.trace(4, f"Error status {r.status_code} for {url}")
+                    break
+                with open(temp_filename, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(temp_filename, local_filename)
+            ok = True
+            break
+        except requests.exceptions.RequestException:
+            debug.trace_exception(5, "_stream_web_document")
+        except OSError:
+            if not ignore:
+                system.print_exception_info("_stream_web_document")
+            break
+    if not ok:
+        gh.delete_existing_file(temp_filename)
+        if not ignore:
+            system.print_stderr(f"Error: unable to download {url}")
+    return ok
+
+
+def download_web_documents(urls : List[str], max_workers : Optional[int] = None,
+                           per_host_limit : Optional[int] = None,
+                           download_dir : Optional[str] = None, use_cached : bool = False,
+                           max_retries : Optional[int] = None, backoff : Optional[float] = None,
+                           ignore : bool = False) -> List[Optional[str]]:
+    """Download documents at URLS concurrently into DOWNLOAD_DIR (defaults to "downloads").
+    Returns the list of local filenames, with None for failed downloads.
+    Notes:
+    - Uses MAX_WORKERS threads sharing a pooled keep-alive session, with at most PER_HOST_LIMIT concurrent requests per host.
+    - Failed requests are retried MAX_RETRIES times with exponential BACKOFF.
+    - The local filenames follow download_web_document, except that a hash of the URL is added when different URLs share a basename. Existing files are used if USE_CACHED. If IGNORE, no error reports are printed.
+    """
+    # EX: download_web_documents(["www.google.com", "www.bing.com"]) => ["downloads/www.google.com", "downloads/www.bing.com"]
+    debug.trace(4, f"download_web_documents(#{len(urls)}, w={max_workers}, h={per_host_limit}, d={download_dir})")
+    if max_workers is None:
+        max_workers = BULK_DOWNLOAD_WORKERS
+    if per_host_limit is None:
+        per_host_limit = PER_HOST_DOWNLOAD_LIMIT
+    if max_retries is None:
+        max_retries = DOWNLOAD_RETRIES
+    if backoff is None:
+        backoff = DOWNLOAD_BACKOFF
+    if download_dir is None:
+        download_dir = "downloads"
+    if not gh.is_directory(download_dir):
+        gh.full_mkdir(download_dir)
+    session = get_http_session()
+    host_limits : Dict[str, threading.BoundedSemaphore] = {}
+    host_lock = threading.Lock()
+
+    # Determine basenames shared by different URLs
+    full_urls = [(url if ("//" in url) else ("http://" + url)) for url in urls]
+    url_names : Dict[str, set] = {}
+    for url in full_urls:
+        url_names.setdefault(_get_download_filename(url, download_dir), set()).add(url)
+
+    def download(url):
+        """Download URL subject to per-host limit"""
+        local_filename = _get_download_filename(url, download_dir)
+        if len(url_names[local_filename]) > 1:
+            local_filename = _get_download_filename(url, download_dir, unique=True)
+        if use_cached and system.non_empty_file(local_filename):
+            debug.trace(5, f"Using cached file for URL: {local_filename}")
+            return local_filename
+        host = urllib.parse.urlparse(url).netloc
+        with host_lock:
+            if host not in host_limits:
+                host_limits[host] = threading.BoundedSemaphore(per_host_limit)
+        with host_limits[host]:
+            ok = _stream_web_document(session, url, local_filename,
+                                      max_retries, backoff, ignore)
+        return (local_filename if ok else None)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result = list(executor.map(download, full_urls))
+    debug.trace(5, f"download_web_documents() => {result}")
+    return result
+
+
+class DownloadCache:
+    """Validating HTTP cache with content-addressed storage.
+    Notes:
+    - Bodies are stored under objects/ by SHA-256 hash, so different URLs with the same basename don't collide, and identical documents are stored once.
+    - The index (index.json) maps URL to hash, ETag, Last-Modified, fetch time, and last access.
+    - Entries older than the TTL are revalidated via If-None-Match and If-Modified-Since (i.e., cheap 304 responses).
+    - Least recently used entries are evicted when the bodies exceed MAX_SIZE bytes.
+    - Access times for cache hits are saved every HTTP_CACHE_SAVE_INTERVAL hits and upon close (e.g., at exit for get_download_cache).
+    """
+
+    def __init__(self, cache_dir : str, max_size : Optional[int] = None, ttl : Optional[float] = None):
+        """Initializer: CACHE_DIR holds index and objects; MAX_SIZE and TTL default to HTTP_CACHE_MAX_SIZE and HTTP_CACHE_TTL"""
+        debug.trace(5, f"DownloadCache.__init__({cache_dir}, {max_size}, {ttl})")
+        self.cache_dir = cache_dir
+        self.max_size = (HTTP_CACHE_MAX_SIZE if (max_size is None) else max_size)
+        self.ttl = (HTTP_CACHE_TTL if (ttl is None) else ttl)
+        self.index_path = gh.form_path(cache_dir, "index.json")
+        self.index : Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+        self.num_unsaved = 0
+        if not gh.is_directory(cache_dir):
+            gh.full_mkdir(cache_dir)
+        if system.non_empty_file(self.index_path):
+            try:
+                self.index = json.loads(system.read_entire_file(self.index_path))
+            except ValueError:
+                system.print_exception_info("DownloadCache index load")
+
+    def object_path(self, digest : str) -> str:
+        """Path for body with hash DIGEST"""
+        return gh.form_path(self.cache_dir, "objects", digest[:2], digest)
+
+    def save_index(self) -> None:
+        """Write index to disk (atomically)"""
+        with self.lock:
+            temp_path = self.index_path + ".tmp"
+            system.write_file(temp_path, json.dumps(self.index))
+            os.replace(temp_path, self.index_path)
+            self.num_unsaved = 0
+
+    def close(self) -> None:
+        """Save index if there are unsaved updates (e.g., access times)"""
+        with self.lock:
+            if self.num_unsaved:
+                self.save_index()
+
+    def fetch(self, url : str, ttl : Optional[float] = None) -> Optional[bytes]:
+        """Returns body for URL from cache, revalidating or downloading as needed (None if unavailable)"""
+        debug.trace(5, f"DownloadCache.fetch({url}, {ttl})")
+        if ttl is None:
+            ttl = self.ttl
+        now = time.time()
+        with self.lock:
+            entry = self.index.get(url)
+            if entry and (not system.file_exists(self.object_path(entry["hash"]))):
+                entry = None
+            if entry and ((now - entry["fetched_at"]) < ttl):
+                debug.trace(6, f"Fresh cache entry for {url}")
+                return self.touch(url, entry)
+            headers = {}
+            if entry and entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry and entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            r = get_http_session().get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+        except requests.exceptions.RequestException:
+            debug.trace_exception(4, "DownloadCache.fetch")
+            return None
+        with self.lock:
+            if entry and (r.status_code == 304):
+                debug.trace(6, f"Revalidated cache entry for {url}")
+                entry["fetched_at"] = now
+                return self.touch(url, entry)
+            if r.status_code >= 400:
+                debug.trace(4, f"Error status {r.status_code} for {url}")
+                return None
+            self.store(url, r.content, r.headers)
+        return r.content
+
+    def touch(self, url : str, entry : Dict[str, Any]) -> bytes:
+        """Update access time for URL's ENTRY, returning body
+        Note: the index is only saved every HTTP_CACHE_SAVE_INTERVAL updates (see close)"""
+        debug.trace(7, f"DownloadCache.touch({url}, _)")
+        with self.lock:
+            entry["last_access"] = time.time()
+            self.num_unsaved += 1
+            if (self.num_unsaved >= HTTP_CACHE_SAVE_INTERVAL):
+                self.save_index()
+        return system.read_binary_file(self.object_path(entry["hash"]))
+
+    def store(self, url : str, data : bytes, headers : Any) -> str:
+        """Add DATA for URL to the cache, using ETag and Last-Modified from HEADERS; returns hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        with self.lock:
+            if not system.file_exists(path):
+                gh.full_mkdir(gh.dirname(path))
+                temp_path = path + ".tmp"
+                system.write_binary_file(temp_path, data)
+                os.replace(temp_path, path)
+            old_entry = self.index.get(url)
+            now = time.time()
+            self.index[url] = {"hash": digest, "size": len(data),
+                               "etag": headers.get("ETag"),
+                               "last_modified": headers.get("Last-Modified"),
+                               "fetched_at": now, "last_access": now}
+            if old_entry and (old_entry["hash"] != digest):
+                self.release(old_entry["hash"])
+            self.evict()
+            self.save_index()
+        debug.trace(6, f"DownloadCache.store({url}) => {digest}")
+        return digest
+
+    def release(self, digest : str) -> int:
+        """Remove body for DIGEST unless still referenced, returning bytes freed"""
+        if any((entry["hash"] == digest) for entry in self.index.values()):
+            return 0
+        path = self.object_path(digest)
+        size = (os.path.getsize(path) if system.file_exists(path) else 0)
+        if size:
+            os.remove(path)
+        return size
+
+    def evict(self) -> None:
+        """Drop least recently used entries until bodies fit in max_size
+        Note: bodies are removed once no longer referenced (n.b., single pass via reference counts)"""
+        with self.lock:
+            sizes = {entry["hash"]: entry["size"] for entry in self.index.values()}
+            total = sum(sizes.values())
+            if (total <= self.max_size):
+                return
+            ref_counts : Dict[str, int] = {}
+            for entry in self.index.values():
+                ref_counts[entry["hash"]] = ref_counts.get(entry["hash"], 0) + 1
+            for url in sorted(self.index, key=lambda u: self.index[u]["last_access"]):
+                if ((total <= self.max_size) or (len(self.index) <= 1)):
+                    break
+                debug.trace(5, f"Evicting {url} from HTTP cache")
+                digest = self.index.pop(url)["hash"]
+                ref_counts[digest] -= 1
+                if not ref_counts[digest]:
+                    gh.delete_existing_file(self.object_path(digest))
+                    total -= sizes[digest]
+
+
+download_caches : Dict[str, DownloadCache] = {}
+##
+def get_download_cache(download_dir : Optional[str] = None) -> DownloadCache:
+    """Returns DownloadCache for DOWNLOAD_DIR (stored in HTTP_CACHE_SUBDIR)"""
+    if download_dir is None:
+        download_dir = "downloads"
+    cache_dir = gh.form_path(download_dir, HTTP_CACHE_SUBDIR)
+    with http_session_lock:
+        if cache_dir not in download_caches:
+            download_caches[cache_dir] = DownloadCache(cache_dir)
+            atexit.register(download_caches[cache_dir].close)
+    return download_caches[cache_dir]
+
+
 def init_BeautifulSoup():
     """Make sure bs4.BeautifulSoup is loaded"""
     import bs4                           # pylint: disable=import-error, import-outside-toplevel
@@ -30,6 +30,9 @@
 """Example for using the KenLM language modeling utility"""
 
 # Standard modules
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 import os
 import sys
 
@@ -38,7 +41,7 @@ import kenlm
 
 # Local modules
 from mezcla import debug
-from mezcla.system import getenv_boolean, getenv_text
+from mezcla.system import getenv_boolean, getenv_int, getenv_text
 from mezcla import glue_helpers as gh
 from mezcla import tpo_common as tpo
 from mezcla import system
@@ -52,6 +55,13 @@ DEFAULT_LM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lm', 'test.arpa
 LM = getenv_text("LM", DEFAULT_LM_FILE)
 SENT_DELIM = getenv_text("SENT_DELIM", "\n", "Delimiter for sentence splitting")
 VERBOSE = getenv_boolean("VERBOSE", False, "Verbose output")
+BATCH_MODE = getenv_boolean("BATCH_MODE", False,
+                            "Score sentences from files (or - for stdin) with tab-separated output")
+SCORE_WORKERS = getenv_int("SCORE_WORKERS", 1,
+                           "Number of processes for batch-mode scoring")
+SCORE_CHUNK_SIZE = getenv_int("SCORE_CHUNK_SIZE", 10000,
+                              "Number of sentences per batch-mode work unit")
+READ_BLOCK_SIZE = 2 ** 20
 
 # Globals
 ## TEMP: Need to rework tests/test_kenkm_example.py
@@ -66,7 +76,113 @@ def summed_constituent_score(s):
     """
     global model
     return sum(prob for (prob, _len, _oov) in model.full_scores(s))
-    
+
+
+def load_model(lm_file=None):
+    """Loads language model from LM_FILE (or LM) into global model
+    Note: binary models are memory mapped, so the pages are shared by batch-mode workers."""
+    debug.trace(5, f"load_model({lm_file}); pid={os.getpid()}")
+    global model
+    model = kenlm.LanguageModel(lm_file or LM)
+    return model
+
+
+def read_sentences(stream, delim=None):
+    """Yields non-blank sentences from text STREAM split by DELIM (or SENT_DELIM), reading a block at a time"""
+    if delim is None:
+        delim = SENT_DELIM
+    pending = ""
+    while True:
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        sentences = (pending + block).split(delim)
+        pending = sentences.pop()
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence
+    if pending.strip():
+        yield pending
+    return
+
+
+def score_sentences(sentences):
+    """Returns list of (score, num_words, num_oov) tuples for SENTENCES using global model
+    Note: the score is the log10 probability including </s>, as with model.score."""
+    results = []
+    for sentence in sentences:
+        score = 0.0
+        num_oov = 0
+        for (prob, _len, oov) in model.full_scores(sentence):
+            score += prob
+            num_oov += oov
+        results.append((score, len(sentence.split()), num_oov))
+    return results
+
+
+def batch_score(sentences, num_workers=None, chunk_size=None):
+    """Yields (sentence, score, num_words, num_oov) for SENTENCES in input order
+    Note: Uses NUM_WORKERS processes (SCORE_WORKERS), each with its own copy of the model, over chunks of CHUNK_SIZE sentences (SCORE_CHUNK_SIZE)."""
+    if num_workers is None:
+        num_workers = SCORE_WORKERS
+    if chunk_size is None:
+        chunk_size = SCORE_CHUNK_SIZE
+    debug.trace(5, f"batch_score(_): workers={num_workers} chunk_size={chunk_size}")
+    sentences = iter(sentences)
+    chunks = iter(lambda: list(itertools.islice(sentences, chunk_size)), [])
+    if (num_workers <= 1):
+        if model is None:
+            load_model()
+        for chunk in chunks:
+            for (sentence, result) in zip(chunk, score_sentences(chunk)):
+                yield (sentence, *result)
+    else:
+        # note: limits number of pending chunks to bound memory usage
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=load_model,
+                                 initargs=(LM,)) as executor:
+            pending = deque()
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk:
+                    pending.append((chunk, executor.submit(score_sentences, chunk)))
+                while pending and ((len(pending) > 2 * num_workers) or (chunk is None)):
+                    (done_chunk, future) = pending.popleft()
+                    for (sentence, result) in zip(done_chunk, future.result()):
+                        yield (sentence, *result)
+    return
+
+
+def perplexity(score, num_words):
+    """Returns perplexity for log10 SCORE over NUM_WORDS (plus </s>), as with model.perplexity"""
+    return 10.0 ** (-score / (num_words + 1))
+
+
+def run_batch_mode(filenames):
+    """Prints score, normalized score, perplexity and OOV count for sentences in FILENAMES (- for stdin)"""
+    debug.trace(5, f"run_batch_mode({filenames})")
+
+    def all_sentences():
+        """Yields sentences from each file in turn"""
+        for filename in filenames:
+            if (filename == "-"):
+                yield from read_sentences(sys.stdin)
+            else:
+                with open(filename, encoding="UTF-8") as stream:
+                    yield from read_sentences(stream)
+
+    print("score\tnormalized\tperplexity\toov\tsentence")
+    total_score = total_words = total_oov = num_sentences = 0
+    for (sentence, score, num_words, num_oov) in batch_score(all_sentences()):
+        print(f"{tpo.round_num(score)}\t{tpo.round_num(score / num_words)}\t"
+              f"{tpo.round_num(perplexity(score, num_words))}\t{num_oov}\t{sentence}")
+        total_score += score
+        total_words += num_words
+        total_oov += num_oov
+        num_sentences += 1
+    if num_sentences:
+        debug.trace(TL.USUAL, f"{num_sentences} sentences; {total_words} words; {total_oov} OOV; "
+                    f"perplexity={tpo.round_num(10.0 ** (-total_score / (total_words + num_sentences)))}")
+    return
+
 
 def main():
     """Entry point"""
@@ -78,6 +194,7 @@ def main():
         show_usage = True
     if show_usage:
         print("Usage: %s [--help] [sentence | -]" % sys.argv[0])
+        print("       BATCH_MODE=1 %s [file | -] ..." % sys.argv[0])
         print("")
         print("Example:")
         print("  kenlm=~/programs/kenlm")
@@ -89,15 +206,21 @@ def main():
         print("- Use LM environment variable to specify alternative language model (see lmplz)")
         print("- Use SENT_DELIM to specify sentence delimiter (default is newline)")
         print("- To use standard input, specify - for sentence above.")
+        print("- In batch mode, the output is tab-separated: score, normalized, perplexity, oov, and sentence.")
+        print("- Batch mode can use several processes (SCORE_WORKERS): use a binary model (see build_binary), so that the pages are shared.")
         print("- Use the following environment options to customize processing")
         print("\t" + tpo.formatted_environment_option_descriptions())
         ## OLD: sys.exit()
         ## TODO?: system.exit(status_code=0)
         system.exit()
+
+    # Score sentences in chunks, streaming input (n.b., model loaded by workers)
+    if BATCH_MODE:
+        run_batch_mode(sys.argv[1:] or ["-"])
+        return
     
     # Load model from ARPA-format file
-    global model
-    model = kenlm.LanguageModel(LM)
+    load_model()
     print('{0}-gram model'.format(model.order))
     
     # Read input
@@ -25,8 +25,13 @@ Sample usage:
 
 # Standard modules
 import time
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
 import pathlib
 import atexit
+import sqlite3
 from collections.abc import Iterable
 
 # Installed modules
@@ -38,6 +43,7 @@ from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import CTransformers
 from langchain_community.vectorstores import FAISS
+import numpy as np
 
 # Local modules
 # TODO: def mezcla_import(name): ... components = eval(name).split(); ... import nameN-1.nameN as nameN
@@ -123,7 +129,25 @@ INDEX_STORE_DIR = system.getenv_text(
     description="path to store index data base")
 INDEX_ONLY_RECENT = system.getenv_bool(
     "INDEX_ONLY_RECENT", True,
-    description="whether or not to filter files by modification time newer than index")
+    description="whether or not to filter files by modification time newer than index (e.g., when adopting index without manifest)")
+INCREMENTAL_INDEX = system.getenv_bool(
+    "INCREMENTAL_INDEX", True,
+    description="Use manifest to only index new or changed files (and drop deleted ones)")
+INDEX_RECURSIVE = system.getenv_bool(
+    "INDEX_RECURSIVE", False,
+    description="Include files in subdirectories when indexing incrementally")
+EXTRACTION_WORKERS = system.getenv_int(
+    "EXTRACTION_WORKERS", (os.cpu_count() or 1),
+    description="Number of processes for text extraction during indexing (1 for in-process)")
+EMBEDDING_BATCH_SIZE = system.getenv_int(
+    "EMBEDDING_BATCH_SIZE", 256,
+    description="Number of chunks per embedding model call")
+USE_EMBEDDING_CACHE = system.getenv_bool(
+    "USE_EMBEDDING_CACHE", True,
+    description="Cache chunk embeddings on disk keyed by hash of chunk text")
+INDEXABLE_FILE_REGEX = r'.*\.(pdf|docx|html|txt)'
+MANIFEST_FILENAME = "manifest.json"
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite"
 
 
 def get_file_mod_fime(path: str) -> float:
@@ -153,6 +177,154 @@ def get_last_modified_date(iterable: Iterable) -> float:
     return result
 
 
+def convert_to_txt(in_file: str) -> str:
+    """reads non-txt files and returns the text inside them"""
+    if in_file.endswith('.html'):
+        text = html_utils.html_to_text(system.read_file(in_file))
+    else:
+        text = extract_document_text.document_to_text(in_file)
+    return text
+
+
+def extract_text(in_file: str) -> str:
+    """Returns text for IN_FILE, converting from other formats if needed (e.g., PDF)"""
+    if in_file.endswith('.txt'):
+        return system.read_entire_file(in_file, encoding="unicode_escape")
+    return convert_to_txt(in_file)
+
+
+def extract_chunks(path: str) -> tuple:
+    """Returns tuple with PATH, list of text chunks from the file, and whether extraction succeeded
+    Note: run in worker processes by DesktopSearch.update_index"""
+    ok = True
+    try:
+        text = extract_text(path)
+    except:
+        system.print_exception_info(f"extract_text for {path}")
+        text = ""
+        ok = False
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE,
+                                              chunk_overlap=CHUNK_OVERLAP)
+    return (path, splitter.split_text(text or ""), ok)
+
+
+def get_file_hash(path: str) -> str:
+    """Returns SHA-256 hash of contents of file at PATH"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_indexable_files(dir_path: str, recursive: bool = False) -> list:
+    """Returns sorted list of files under DIR_PATH with indexable extensions (e.g., .pdf)"""
+    if recursive:
+        files = [os.path.join(root, name) for (root, _dirs, names) in os.walk(dir_path)
+                 for name in names]
+    else:
+        files = system.get_directory_filenames(dir_path, just_regular_files=True)
+    return sorted(f for f in files if my_re.match(INDEXABLE_FILE_REGEX, f))
+
+
+class IndexManifest:
+    """Persistent record of indexed files: path => size, mtime, content hash, and chunk ids
+    Note: stored as JSON alongside the FAISS index"""
+
+    def __init__(self, index_store_dir):
+        """Initializer: loads manifest from INDEX_STORE_DIR if present"""
+        debug.trace(5, f"IndexManifest.__init__({index_store_dir})")
+        self.path = gh.form_path(index_store_dir, MANIFEST_FILENAME)
+        self.entries = {}
+        if system.non_empty_file(self.path):
+            self.entries = json.loads(system.read_entire_file(self.path))
+
+    def save(self):
+        """Write manifest to disk (atomically)"""
+        temp_path = self.path + ".tmp"
+        system.write_file(temp_path, json.dumps(self.entries))
+        os.replace(temp_path, self.path)
+
+    def is_unchanged(self, path, stat):
+        """Whether file at PATH has same size and mtime as in manifest (via os.stat STAT)"""
+        entry = self.entries.get(path)
+        return bool(entry and (entry["size"] == stat.st_size) and (entry["mtime"] == stat.st_mtime))
+
+    def seed_from_index(self, db, dir_path, index_time):
+        """Add entries for files in DIR_PATH with chunks in older FAISS DB lacking a manifest
+        Notes:
+        - Sources are either full paths or relative to DIR_PATH (e.g., /doc.pdf_temp_3.txt for doc.pdf via index_dir_via_temp).
+        - Unless INDEX_ONLY_RECENT and the file is not modified after INDEX_TIME, the entry is marked stale.
+        """
+        debug.trace(4, f"IndexManifest.seed_from_index(_, {dir_path}, {index_time})")
+        for (docid, doc) in db.docstore._dict.items():    # pylint: disable=protected-access
+            source = doc.metadata.get("source", "")
+            relative_source = source.lstrip(os.sep)
+            candidates = [source, gh.form_path(dir_path, relative_source),
+                          gh.form_path(dir_path, my_re.sub(r"_temp_\d+\.txt$", "", relative_source))]
+            path = next((c for c in candidates
+                         if (c.startswith(dir_path + os.sep) and system.file_exists(c))), None)
+            if not path:
+                debug.trace(5, f"FYI: ignoring legacy chunk {docid} for {source!r}")
+                continue
+            if path not in self.entries:
+                stat = os.stat(path)
+                recent = (stat.st_mtime > index_time)
+                self.entries[path] = {"size": -1, "mtime": -1, "hash": "", "chunk_ids": []}
+                if (INDEX_ONLY_RECENT and not recent):
+                    self.entries[path].update({"size": stat.st_size, "mtime": stat.st_mtime,
+                                               "hash": get_file_hash(path)})
+            self.entries[path]["chunk_ids"].append(docid)
+
+    def paths_under(self, dir_path, recursive=False):
+        """Returns manifest paths in DIR_PATH (or below if RECURSIVE)"""
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        return [path for path in self.entries
+                if (path.startswith(prefix)
+                    and (recursive or (os.sep not in path[len(prefix):])))]
+
+
+class EmbeddingCache:
+    """On-disk cache of chunk embeddings keyed by hash of model name and chunk text
+    Note: stored via sqlite alongside the FAISS index"""
+
+    def __init__(self, path, model_name):
+        """Initializer: opens cache at PATH for MODEL_NAME embeddings"""
+        debug.trace(5, f"EmbeddingCache.__init__({path}, {model_name})")
+        self.model_name = model_name
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def get_key(self, text):
+        """Returns cache key for chunk TEXT"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode(errors="replace")).hexdigest()
+
+    def lookup(self, keys):
+        """Returns dict from cached KEYS to vectors"""
+        result = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start: start + 500]
+            query = ("SELECT key, vector FROM embeddings WHERE key IN (%s)"
+                     % ",".join("?" * len(batch)))
+            for (key, vector) in self.connection.execute(query, batch):
+                result[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return result
+
+    def store(self, key_vectors):
+        """Adds (key, vector) pairs in KEY_VECTORS to cache"""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes())
+             for (key, vector) in key_vectors])
+        self.connection.commit()
+
+    def close(self):
+        """Closes the sqlite connection"""
+        debug.trace(5, "EmbeddingCache.close()")
+        self.connection.close()
+
+
 class DesktopSearch:
     """Class for searching local computer"""
 
@@ -166,12 +338,166 @@ class DesktopSearch:
         self.db = None
         self.llm = None
         self.qa_llm = None
+        self.embedding_cache = None
         debug.trace_object(5, self, label=f"{self.__class__.__name__} instance")
 
     def index_dir(self, dir_path):
-        """Index files at DIR_PATH"""
+        """Index files at DIR_PATH
+        Note: uses update_index unless INCREMENTAL_INDEX disabled"""
+        if INCREMENTAL_INDEX:
+            self.update_index(dir_path)
+        else:
+            self.index_dir_via_temp(dir_path)
+
+    def get_embeddings(self):
+        """Returns embeddings model, loading if needed"""
+        if not self.embeddings:
+            self.embeddings = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL,
+                model_kwargs={'device': TORCH_DEVICE},
+                encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE})
+        return self.embeddings
+
+    def embed_chunks(self, texts):
+        """Returns embedding vectors for chunk TEXTS, using the embedding cache if enabled"""
+        debug.trace(5, f"DesktopSearch.embed_chunks(#{len(texts)})")
+        if not USE_EMBEDDING_CACHE:
+            return self.get_embeddings().embed_documents(texts)
+        if self.embedding_cache is None:
+            self.embedding_cache = EmbeddingCache(
+                gh.form_path(self.index_store_dir, EMBEDDING_CACHE_FILENAME), EMBEDDING_MODEL)
+        keys = [self.embedding_cache.get_key(text) for text in texts]
+        key_vectors = self.embedding_cache.lookup(keys)
+        missing = {key: text for (key, text) in zip(keys, texts) if key not in key_vectors}
+        debug.trace(5, f"{len(missing)} of {len(texts)} chunks not in embedding cache")
+        if missing:
+            vectors = self.get_embeddings().embed_documents(list(missing.values()))
+            new_key_vectors = list(zip(missing.keys(), vectors))
+            self.embedding_cache.store(new_key_vectors)
+            key_vectors.update(new_key_vectors)
+        return [key_vectors[key] for key in keys]
+
+    def add_chunks(self, texts, metadatas, ids):
+        """Embed chunk TEXTS and add to vector store along with METADATAS and IDS"""
+        debug.trace(5, f"DesktopSearch.add_chunks(#{len(texts)})")
+        text_embeddings = list(zip(texts, self.embed_chunks(texts)))
+        if self.db is None:
+            self.db = FAISS.from_embeddings(text_embeddings, self.get_embeddings(),
+                                            metadatas=metadatas, ids=ids)
+        else:
+            self.db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+    def update_index(self, dir_path, recursive=None):
+        """Incrementally index files at DIR_PATH, optionally RECURSIVE[ly]
+        Notes:
+        - A manifest alongside the index records size, mtime, and content hash for each file along with the ids of its chunks.
+        - Only new or changed files are extracted and embedded, and chunks for changed or deleted files are removed from the index.
+        - Files are read in place (i.e., not copied to a temp directory).
+        - An index without a manifest (e.g., from index_dir_via_temp) gets the manifest seeded from the chunk sources, so files aren't added twice; with INDEX_ONLY_RECENT, files not modified since the index was saved are kept as is.
+        - Nothing is loaded if no files were added, changed, or deleted.
+        - Files with extraction errors are not recorded in the manifest, so they are tried again on the next update.
+        - Text extraction runs on a pool of EXTRACTION_WORKERS processes, and chunks are embedded and added to the index in batches of EMBEDDING_BATCH_SIZE (see embed_chunks for caching).
+        """
+        debug.trace(4, f"DesktopSearch.update_index({dir_path})")
+        if recursive is None:
+            recursive = INDEX_RECURSIVE
+        if not system.is_directory(self.index_store_dir):
+            gh.full_mkdir(self.index_store_dir)
+        manifest = IndexManifest(self.index_store_dir)
+        real_path = system.real_path(dir_path)
+
+        # Adopt chunks from index created without manifest (e.g., via index_dir_via_temp)
+        index_path = gh.form_path(self.index_store_dir, "index.faiss")
+        if (system.file_exists(index_path) and not system.file_exists(manifest.path)):
+            debug.trace(3, f"FYI: seeding manifest from older index at {self.index_store_dir}")
+            self.load_index()
+            manifest.seed_from_index(self.db, real_path, get_file_mod_fime(index_path))
+
+        # Determine new, changed, and deleted files
+        # note: hash only computed if size or mtime differs (e.g., touched files)
+        current_files = get_indexable_files(real_path, recursive)
+        updated_files = []
+        stale_ids = []
+        for path in current_files:
+            stat = os.stat(path)
+            if manifest.is_unchanged(path, stat):
+                continue
+            digest = get_file_hash(path)
+            entry = manifest.entries.get(path)
+            if entry and (entry["hash"] == digest):
+                entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+                continue
+            if entry:
+                stale_ids += entry["chunk_ids"]
+            updated_files.append((path, stat, digest))
+        current = set(current_files)
+        deleted_files = [path for path in manifest.paths_under(real_path, recursive)
+                         if path not in current]
+        for path in deleted_files:
+            stale_ids += manifest.entries.pop(path)["chunk_ids"]
+        debug.trace(4, f"{len(updated_files)} new or changed files; {len(deleted_files)} deleted")
+        if not (updated_files or deleted_files):
+            # note: avoids loading embedding model and index (n.b., manifest might have new mtimes)
+            manifest.save()
+            return
+
+        # Start text extraction for new or changed files
+        # note: the workers are started before the embedding model gets loaded
+        executor = None
+        paths = [path for (path, _stat, _digest) in updated_files]
+        if ((EXTRACTION_WORKERS > 1) and (len(paths) > 1)):
+            executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS)
+            extracted = executor.map(extract_chunks, paths, chunksize=16)
+        else:
+            extracted = map(extract_chunks, paths)
+
+        # Remove vectors for changed or deleted files
+        if ((self.db is None) and system.file_exists(index_path)):
+            self.load_index()
+        if ((self.db is not None) and stale_ids):
+            self.db.delete(stale_ids)
+
+        # Add chunks in batches as extraction results arrive
+        # note: the embedding cache is closed afterwards (see embed_chunks)
+        batch_texts, batch_metadatas, batch_ids = [], [], []
+        try:
+            for ((path, chunks, ok), (_path, stat, digest)) in zip(extracted, updated_files):
+                # note: files with extraction errors are left out of the manifest so they get retried
+                if not ok:
+                    debug.trace(3, f"FYI: not recording {path} in manifest due to extraction error")
+                    manifest.entries.pop(path, None)
+                    continue
+                chunk_ids = [f"{path}#{i}" for i in range(len(chunks))]
+                manifest.entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                                          "hash": digest, "chunk_ids": chunk_ids}
+                batch_texts += chunks
+                # note: separate dict per chunk, as the vector store keeps a reference to each
+                batch_metadatas += [{'source': path} for _chunk in chunks]
+                batch_ids += chunk_ids
+                if len(batch_texts) >= EMBEDDING_BATCH_SIZE:
+                    self.add_chunks(batch_texts, batch_metadatas, batch_ids)
+                    batch_texts, batch_metadatas, batch_ids = [], [], []
+            if batch_texts:
+                self.add_chunks(batch_texts, batch_metadatas, batch_ids)
+        finally:
+            if executor:
+                executor.shutdown()
+            if self.embedding_cache is not None:
+                self.embedding_cache.close()
+                self.embedding_cache = None
+
+        # Save the vector store along with the manifest
+        if self.db is not None:
+            self.db.save_local(self.index_store_dir)
+        manifest.save()
+        debug.trace_expr(4, self.db)
+        gpu_utils.trace_gpu_usage()
+
+    def index_dir_via_temp(self, dir_path):
+        """Index files at DIR_PATH, copying files into temp dir
+        Note: older non-incremental version (e.g., reindexes based on INDEX_ONLY_RECENT)"""
         ## TODO: look into indexing files from buffers rather than external files
-        debug.trace(4, f"DesktopSearch.index_dir({dir_path})")
+        debug.trace(4, f"DesktopSearch.index_dir_via_temp({dir_path})")
 
         # Make sure target index directory exists
         if not system.is_directory(self.index_store_dir):
@@ -182,15 +508,6 @@ class DesktopSearch:
         loader = DirectoryLoader(dir_path, glob="./*.txt", loader_cls=TextLoader, loader_kwargs=text_loader_kwargs)
         debug.trace_expr(5, loader)
 
-        ## TODO1: move this helper outside of index_dir
-        def convert_to_txt(in_file: str) -> str:
-            """reads non-txt files and returns the text inside them"""
-            if in_file.endswith('.html'):
-                text = html_utils.html_to_text(system.read_file(in_file))
-            else:
-                text = extract_document_text.document_to_text(in_file)
-            return text
-    
         ## TODO1: move this helper outside of index_dir
         def correct_metadata(doc: Document, base_dir: str) -> Document:
             """removes the first two parts of the source metadata
@@ -233,7 +550,7 @@ class DesktopSearch:
         if INDEX_ONLY_RECENT:
             filtered_files = [f for f in list_files if (get_file_mod_fime(f) > modif_time)]
         
-        files_to_convert = [found for found in filtered_files if my_re.match(r'.*\.(pdf|docx|html|txt)', found)]
+        files_to_convert = [found for found in filtered_files if my_re.match(INDEXABLE_FILE_REGEX, found)]
         # register cleanup function before creating temp files
         if not KEEP_TEMP_FILES:
             atexit.register(gh.delete_directory, tmp_path)
@@ -254,10 +571,7 @@ class DesktopSearch:
         # documents are splitted to a maximum of 500 characters per chunk (by default)
         texts = splitter.split_documents(documents)
         corrected_texts = [correct_metadata(text, tmp_path) for text in texts]
-        if not self.embeddings:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL,
-                model_kwargs={'device': TORCH_DEVICE})
+        self.get_embeddings()
 
         # add (or create from docs) to the db and save it
         try:
@@ -289,10 +603,7 @@ class DesktopSearch:
             self.llm = llm
 
         # load the interpreted information from the local database
-        if not self.embeddings:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL,
-                model_kwargs={'device': TORCH_DEVICE})
+        self.get_embeddings()
         options = {}
         if ALLOW_UNSAFE_MODELS:
             options["allow_dangerous_deserialization"] = ALLOW_UNSAFE_MODELS
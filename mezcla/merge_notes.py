@@ -54,8 +54,12 @@
 import argparse
 import datetime
 import fileinput
+import heapq
+import itertools
+import json
 import re
 import sys
+import tempfile
 from collections import defaultdict
 
 # Local packages
@@ -65,6 +69,14 @@ from mezcla import system
 
 SKIP_BOM = system.getenv_bool("SKIP_BOM", False,
                               "Don't output byte order mark U+FEFF")
+NOTES_MEMORY_BUDGET = system.getenv_int("NOTES_MEMORY_BUDGET", 64 * 1024 * 1024,
+                                        "Characters of notes to keep in memory before spilling to temporary files")
+
+# Regex patterns
+# note: DATE_LINE_PRESCREEN_REGEX is a necessary condition for date lines (prior to
+# day-of-week normalization), so that most lines are rejected with a single check.
+DIVIDER_REGEX = re.compile("^--------------------+$")
+DATE_LINE_PRESCREEN_REGEX = re.compile(r"^(?:\w+ )?\d+ [a-z][a-z][a-z] \d+$", re.IGNORECASE)
 
 #...............................................................................
 
@@ -99,6 +111,72 @@ def resolve_date(textual_date, default_date=None):
     return date
 
 
+class DatedNotes:
+    """Collection of note text keyed by textual date, output in order of resolved date
+    Note: Text is kept in per-date lists, which are spilled to sorted temporary files (i.e., runs) if over MEMORY_BUDGET characters; these are merged when outputting."""
+
+    def __init__(self, resolved_date, default_date, memory_budget=None):
+        """Initializer: RESOLVED_DATE maps textual date to datetime, with DEFAULT_DATE used if not present"""
+        debug.trace(5, f"DatedNotes.__init__(_, {default_date}, {memory_budget})")
+        if memory_budget is None:
+            memory_budget = NOTES_MEMORY_BUDGET
+        self.resolved_date = resolved_date
+        self.default_date = default_date
+        self.memory_budget = memory_budget
+        self.date_order = {}
+        self.notes = defaultdict(list)
+        self.num_chars = 0
+        self.runs = []
+
+    def add(self, date, text):
+        """Adds TEXT to notes for textual DATE"""
+        if date not in self.date_order:
+            self.date_order[date] = len(self.date_order)
+        self.notes[date].append(text)
+        self.num_chars += len(text)
+        if (self.num_chars > self.memory_budget):
+            self.spill()
+
+    def sort_key(self, date):
+        """Returns key for sorting by resolved DATE, with ties by order of first occurrence"""
+        return (self.resolved_date.get(date, self.default_date), self.date_order[date])
+
+    def spill(self):
+        """Writes notes in memory to temporary file sorted by date"""
+        debug.trace(4, f"DatedNotes.spill(): run {len(self.runs) + 1} with {self.num_chars} chars")
+        # pylint: disable=consider-using-with
+        run = tempfile.TemporaryFile("w+", encoding="UTF-8")
+        for date in sorted(self.notes, key=self.sort_key):
+            run.write(json.dumps([date, "".join(self.notes[date])]) + "\n")
+        run.seek(0)
+        self.runs.append(run)
+        self.notes = defaultdict(list)
+        self.num_chars = 0
+
+    def keys(self):
+        """Returns the textual dates"""
+        return self.date_order.keys()
+
+    def iter_entries(self):
+        """Yields (date, text) for each textual date in order of resolved date"""
+        def read_run(run):
+            """Yields (sort key, date, text) from RUN file"""
+            for line in run:
+                (date, text) = json.loads(line)
+                yield (self.sort_key(date), date, text)
+        in_memory = ((self.sort_key(date), date, "".join(self.notes[date]))
+                     for date in sorted(self.notes, key=self.sort_key))
+        # note: merge is stable, so text from earlier runs comes first
+        all_notes = heapq.merge(*[read_run(run) for run in self.runs], in_memory,
+                                key=lambda entry: entry[0])
+        for (date, entries) in itertools.groupby(all_notes, key=lambda entry: entry[1]):
+            yield (date, "".join(text for (_key, _date, text) in entries))
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+#...............................................................................
+
 def main():
     """Entry point for script"""
     debug.trace(4, "main(): sys.argv=%s" % sys.argv)
@@ -119,11 +197,12 @@ def main():
     # Initial defaults
     # note: initializes current date to dummy from way back when
     line_num = 0
-    notes_hash = defaultdict(str)
     resolved_date = {}
     dummy_date = "1 Jan 1900"
     dummy_hour = "00:00:00"
     resolved_dummy_date = resolve_date(dummy_date)
+    ## OLD: notes_hash = defaultdict(str)
+    notes_hash = DatedNotes(resolved_date, resolved_dummy_date)
     debug.assertion(resolved_dummy_date < resolve_date("1 Jan 00"))
     debug.assertion(dummy_hour in str(resolved_dummy_date))
     last_date = dummy_date
@@ -160,7 +239,7 @@ def main():
             line_num = 1
 
         # Optionally ignore section dividers (20 or more dashes)
-        if (ignore_dividers and re.search("^--------------------+$", line)):
+        if (ignore_dividers and DIVIDER_REGEX.search(line)):
             debug.trace_fmtd(5, "Ignoring divider at line {n}: {l}",
                              l=original_line, n=line_num)
             continue
@@ -172,13 +251,15 @@ def main():
         # TODO: allow for a variety of date formats; allow for optional time
         new_date = last_date
         new_resolved_date = last_resolved_date
+        is_candidate = DATE_LINE_PRESCREEN_REGEX.search(line)
         # Ensure days of the week are abbreviated (with no more than 3 letters)
-        line = re.sub(r"^(Sun|Mon|Tue|Wed|Thu|Fri|Sat)\w+day", r"\1", line, flags=re.IGNORECASE)
-        line = re.sub(r"^(Tue)s (\d)", r"\1 \2", line, flags=re.IGNORECASE)
-        line = re.sub(r"^(Thu)rs? (\d)", r"\1 \2", line, flags=re.IGNORECASE)
+        if is_candidate:
+            line = re.sub(r"^(Sun|Mon|Tue|Wed|Thu|Fri|Sat)\w+day", r"\1", line, flags=re.IGNORECASE)
+            line = re.sub(r"^(Tue)s (\d)", r"\1 \2", line, flags=re.IGNORECASE)
+            line = re.sub(r"^(Thu)rs? (\d)", r"\1 \2", line, flags=re.IGNORECASE)
         # TODO: Ensure months are abbreviated
         ## EX: line = re.sub(r" (\d+) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\w* (\d+)", r" \1 \2 \3", line, flags=re.IGNORECASE)
-        if (my_re.search(r"^([a-z][a-z][a-z] )?\d+ [a-z][a-z][a-z] \d+$", line, re.IGNORECASE)):
+        if (is_candidate and my_re.search(r"^([a-z][a-z][a-z] )?\d+ [a-z][a-z][a-z] \d+$", line, re.IGNORECASE)):
             new_date = my_re.group(0)
             needs_source_info = True
             has_new_date = True
@@ -205,14 +286,14 @@ def main():
                             
         # Add optional source indicator to current date
         if show_file_info and needs_source_info:
-            notes_hash[new_date] += "[src: {f}:{n}]\n".format(f=fileinput.filename(), 
-                                                             n=fileinput.filelineno())
+            notes_hash.add(new_date, "[src: {f}:{n}]\n".format(f=fileinput.filename(),
+                                                               n=fileinput.filelineno()))
             needs_source_info = False
                 
         # Add line to notes for current date
         # TODO: use resolved date as key so different specifications for same date output together without new date spec
         debug.assertion((not has_new_date) or (new_date != dummy_date))
-        notes_hash[new_date] += original_line + "\n"
+        notes_hash.add(new_date, original_line + "\n")
         has_new_date = False
 
     # Print the note entries sorted by resolved date.
@@ -220,13 +301,7 @@ def main():
     # - The sorting is based on the datetime.datetime type. If an error
     #   occurs, the problem might be due to the resolve_date function
     #   incorrectly returning a string instead of the proper datetime type.
-    # - This is used for sake of debugging (e.g., tracing bad comparison input).
-    def get_resolved_date(k):
-        """Debugging accessor for resolved_date with tracing"""
-        r = resolved_date.get(k, resolved_dummy_date)
-        debug.trace_fmtd(7, "get_resolved_date({k}) => {r}", k=k, r=r)
-        return r
-    #
+    # - The entries are merged from sorted runs (see DatedNotes).
     debug.trace_fmtd(7, "notes_hash keys: {{\n{k}\n}}", 
                      k="\t\n".join([str(v) for v in notes_hash.keys()]))
     #
@@ -236,8 +311,7 @@ def main():
         except:
             system.print_exception_info("printing BOM")
     #
-    for pos, date in enumerate(sorted(notes_hash.keys(), 
-                                      key=get_resolved_date)):
+    for pos, (date, notes) in enumerate(notes_hash.iter_entries()):
         debug.trace_fmtd(6, "outputting notes for date {d} [resolved: {r}]", 
                          d=date, r=resolved_date.get(date))
         if output_dividers and (pos > 0):
@@ -245,7 +319,7 @@ def main():
         debug.trace_fmtd(6, "[src {f}:{n}]", skip_newline=True,
                          f=fileinput.filename(), n=fileinput.filelineno())
         try:
-            print("%s\n\n" % notes_hash[date])
+            print("%s\n\n" % notes)
         except:
             system.print_exception_info("printing entry")
 
@@ -12,6 +12,7 @@
 import datetime
 from difflib import ndiff
 import inspect
+import io
 import math
 import random
 import re
@@ -25,7 +26,6 @@ import time
 # Local packages
 from mezcla import debug
 from mezcla import glue_helpers as gh
-from mezcla.my_regex import my_re
 from mezcla import system
 from mezcla import text_utils
 
@@ -38,11 +38,34 @@ VALUE_EPSILON = system.getenv_float("VALUE_EPSILON", 1e-3,
 debug.assertion(TYPICAL_EPSILON < VALUE_EPSILON)
 RANDOM_SEED = system.getenv_integer("RANDOM_SEED", 15485863,
                                     "Integral seed for random number generation: 0 for default")
+SIEVE_SEGMENT_SIZE = system.getenv_integer("SIEVE_SEGMENT_SIZE", 2 ** 22,
+                                           "Number of values per segment in primes_up_to sieve")
+MAX_SIEVE_VALUE = system.getenv_integer("MAX_SIEVE_VALUE", 10 ** 8,
+                                        "Largest value for sieve-based lookup in is_prime_array and prime_factorizations")
+#
+# note: the first 12 primes as bases make Miller-Rabin deterministic for n < 3.3 * 10^24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+MIN_MILLER_RABIN_VALUE = 2 ** 32
+TIMESTAMP_BLOCK_SIZE = system.getenv_integer("TIMESTAMP_BLOCK_SIZE", 2 ** 20,
+                                             "Characters of lines processed at a time in add_timestamp_diff")
+#
+# note: ISO_TIMESTAMP_REGEX is for timestamps as in log files (e.g., 2023-10-06T04:02:36.5228822Z),
+# and FIXED_TIMESTAMP_REGEX for those with fixed-width fields (i.e., parsed via slicing).
+ISO_TIMESTAMP_REGEX = re.compile(r"(\d{4}-\d{1,2}-\d{1,2}T\d{2}:\d{2}:\d{2}\.\d{6,}Z)")
+FIXED_TIMESTAMP_REGEX = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6,}Z", re.ASCII)
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 10 ** 6
 
 
 def transitive_closure(edge_list):
     """Computes transitive close for graph given by EDGE_LIST (i.e., makes indirect links explicit)"""
     # ex: transitive_closure([(1,2),(2,3),(3,4)]) => set([(1, 2), (1, 3), (1, 4), (2, 3), (3, 4), (2, 4)])
+    # note: see iter_transitive_closure for the algorithm
+    return set(iter_transitive_closure(edge_list))
+
+
+def naive_transitive_closure(edge_list):
+    """Original version of transitive_closure via repeated self-joins until fixed point
+    Note: quadratic per round, so only practical for small graphs (e.g., as test reference)"""
     # notes; based on https://stackoverflow.com/questions/8673482/transitive-closure-python-tuples
     closure = set(edge_list)
     while True:
@@ -57,6 +80,146 @@ def transitive_closure(edge_list):
     return closure
 
 
+MAX_REACHABLE_SET_SIZE = 256           # larger sets of components use bitmask
+BYTE_BIT_POSITIONS = [[i for i in range(8) if (byte & (1 << i))] for byte in range(256)]
+NONZERO_BYTE_REGEX = re.compile(rb"[^\x00]")
+#
+def get_bit_positions(mask):
+    """Returns list of positions of bits set in non-negative integer MASK, in increasing order
+    Note: scans the bytes of MASK, which is much faster than bit-by-bit for large sparse masks."""
+    # EX: get_bit_positions(0b10110) => [1, 2, 4]
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    positions = []
+    for match in NONZERO_BYTE_REGEX.finditer(data):
+        offset = 8 * match.start()
+        positions.extend((offset + i) for i in BYTE_BIT_POSITIONS[data[match.start()]])
+    return positions
+
+
+def get_strongly_connected_components(successors):
+    """Returns list of strongly connected components for graph with SUCCESSORS lists over node indices 0..N-1
+    Note: Uses iterative version of Tarjan's algorithm, so components are in reverse topological order (i.e., successors first)."""
+    # EX: get_strongly_connected_components([[1], [0, 2], []]) => [[2], [1, 0]]
+    num_nodes = len(successors)
+    index = [-1] * num_nodes
+    lowlink = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    stack = []
+    components = []
+    counter = 0
+    for root in range(num_nodes):
+        if index[root] >= 0:
+            continue
+        # note: work items are (node, position of next successor to check)
+        work = [(root, 0)]
+        while work:
+            (node, pos) = work.pop()
+            if pos == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            else:
+                lowlink[node] = min(lowlink[node], lowlink[successors[node][pos - 1]])
+            node_successors = successors[node]
+            while pos < len(node_successors):
+                child = node_successors[pos]
+                pos += 1
+                if index[child] < 0:
+                    work.append((node, pos))
+                    work.append((child, 0))
+                    break
+                if on_stack[child]:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        other = stack.pop()
+                        on_stack[other] = False
+                        component.append(other)
+                        if other == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def iter_transitive_closure(edge_list):
+    """Yields pairs in transitive closure for graph given by EDGE_LIST, without materializing the closure
+    Notes:
+    - Strongly connected components are condensed, and the components reachable from each are derived in reverse topological order, using integer bitmasks for unions unless small (see MAX_REACHABLE_SET_SIZE).
+    - A node is only paired with itself if on a cycle (e.g., via a self loop), as with naive_transitive_closure.
+    - Pairs are grouped by component (i.e., not in input order)."""
+    # Assign node indices and get adjacency lists
+    node_index = {}
+    nodes = []
+    successors = []
+    self_loops = set()
+    for (source, target) in edge_list:
+        for node in (source, target):
+            if node not in node_index:
+                node_index[node] = len(nodes)
+                nodes.append(node)
+                successors.append([])
+        (source_index, target_index) = (node_index[source], node_index[target])
+        successors[source_index].append(target_index)
+        if (source_index == target_index):
+            self_loops.add(source_index)
+    debug.trace(5, f"iter_transitive_closure: {len(nodes)} nodes")
+
+    # Condense graph into components, with successor components given by index
+    members = get_strongly_connected_components(successors)
+    component_of = [0] * len(nodes)
+    for (comp, comp_members) in enumerate(members):
+        for node in comp_members:
+            component_of[node] = comp
+    component_successors = [set() for _comp in members]
+    num_predecessors = [0] * len(members)
+    for (comp, comp_members) in enumerate(members):
+        for node in comp_members:
+            component_successors[comp].update(component_of[succ] for succ in successors[node])
+        component_successors[comp].discard(comp)
+        for succ_comp in component_successors[comp]:
+            num_predecessors[succ_comp] += 1
+    debug.trace(5, f"iter_transitive_closure: {len(members)} components")
+
+    # Derive reachable components, with successors handled first
+    # note: small sets are kept as is, because bitmask size depends on the
+    # component indices; entries are dropped once all predecessors processed.
+    reachable = [None] * len(members)
+    for (comp, comp_members) in enumerate(members):
+        reached = set()
+        mask = 0
+        for succ_comp in component_successors[comp]:
+            succ_reached = reachable[succ_comp]
+            if isinstance(succ_reached, int):
+                mask |= succ_reached
+            else:
+                reached.update(succ_reached)
+            reached.add(succ_comp)
+            num_predecessors[succ_comp] -= 1
+            if not num_predecessors[succ_comp]:
+                reachable[succ_comp] = None
+        if ((len(comp_members) > 1) or (comp_members[0] in self_loops)):
+            reached.add(comp)
+        if (mask or (len(reached) > MAX_REACHABLE_SET_SIZE)):
+            for reached_comp in reached:
+                mask |= (1 << reached_comp)
+            reached = mask
+        if num_predecessors[comp]:
+            reachable[comp] = reached
+        if reached:
+            if isinstance(reached, int):
+                reached = get_bit_positions(reached)
+            targets = [nodes[node] for reached_comp in reached
+                       for node in members[reached_comp]]
+            for node in comp_members:
+                source = nodes[node]
+                for target in targets:
+                    yield (source, target)
+    return
+
+
 def read_tabular_data(filename):
     """Reads table with (unique) key and tab-separated value. 
     Note: key made lowercase"""
@@ -99,6 +262,10 @@ def is_prime(num):
     debug.trace_fmt(5, "in is_prime({n})", n=num)
     is_prime_num = True
 
+    # Use Miller-Rabin for large integers, as trial division is impractical
+    if (isinstance(num, int) and (num >= MIN_MILLER_RABIN_VALUE)):
+        return is_prime_miller_rabin(num)
+
     # First, check primes below 4 (only 2)
     if (num <= 3):
         is_prime_num = (num > 1)
@@ -144,6 +311,148 @@ def prime_factorization(num):
     return factors
 
 
+def is_prime_miller_rabin(num):
+    """Whether integer NUM is prime via Miller-Rabin test
+    Note: deterministic for NUM < 3.3 * 10^24 (e.g., all 64-bit values) given MILLER_RABIN_BASES"""
+    # EX: is_prime_miller_rabin(2 ** 61 - 1) => True
+    # EX: is_prime_miller_rabin(3215031751) => False
+    if (num < 2):
+        return False
+    for prime in MILLER_RABIN_BASES:
+        if (num % prime == 0):
+            return (num == prime)
+    # Write num - 1 as d * 2^r with d odd
+    d = num - 1
+    r = 0
+    while (d % 2 == 0):
+        d //= 2
+        r += 1
+    for base in MILLER_RABIN_BASES:
+        x = pow(base, d, num)
+        if (x in (1, num - 1)):
+            continue
+        for _i in range(r - 1):
+            x = pow(x, 2, num)
+            if (x == num - 1):
+                break
+        else:
+            return False
+    return True
+
+
+def primes_up_to(max_num):
+    """Returns NumPy array of primes less than or equal to MAX_NUM
+    Note: Uses segmented Sieve of Eratosthenes over odd numbers, with SIEVE_SEGMENT_SIZE values per segment."""
+    # EX: list(primes_up_to(20)) => [2, 3, 5, 7, 11, 13, 17, 19]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    max_num = int(max_num)
+    if (max_num < 2):
+        return np.zeros(0, dtype=np.int64)
+    # Get base primes up to square root via simple sieve
+    root = math.isqrt(max_num)
+    is_base = np.ones(root + 1, dtype=bool)
+    is_base[:2] = False
+    for i in range(2, math.isqrt(root) + 1):
+        if is_base[i]:
+            is_base[i * i::i] = False
+    base_primes = np.flatnonzero(is_base)[1:]
+    # Sieve odd numbers segment by segment
+    # note: index i of segment represents low + 2i
+    segments = [np.array([2], dtype=np.int64)]
+    segment_size = max(1, SIEVE_SEGMENT_SIZE // 2)
+    for low in range(3, max_num + 1, 2 * segment_size):
+        high = min(low + 2 * segment_size, max_num + 1)
+        is_candidate = np.ones((high - low + 1) // 2, dtype=bool)
+        for prime in base_primes.tolist():
+            if (prime * prime >= high):
+                break
+            start = max(prime * prime, ((low + prime - 1) // prime) * prime)
+            if (start % 2 == 0):
+                start += prime
+            is_candidate[(start - low) // 2::prime] = False
+        segments.append(low + 2 * np.flatnonzero(is_candidate).astype(np.int64))
+    result = np.concatenate(segments)
+    # note: base primes are not removed from segments (n.b., p*p used as start)
+    debug.trace(6, f"primes_up_to({max_num}) => {len(result)} primes")
+    return result
+
+
+def is_prime_array(values):
+    """Returns NumPy boolean array indicating whether each of VALUES is prime
+    Note: Uses sieve lookup for values up to MAX_SIEVE_VALUE and Miller-Rabin otherwise (as with is_prime)."""
+    # EX: list(is_prime_array([0, 1, 2, 9, 97])) => [False, False, True, False, True]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    values = np.asarray(values)
+    result = np.zeros(values.shape, dtype=bool)
+    if not values.size:
+        return result
+    in_range = (values >= 2) & (values <= MAX_SIEVE_VALUE)
+    if in_range.any():
+        primes = primes_up_to(values[in_range].max())
+        positions = np.searchsorted(primes, values[in_range])
+        result[in_range] = (primes[np.minimum(positions, len(primes) - 1)] == values[in_range])
+    for index in np.flatnonzero(values.ravel() > MAX_SIEVE_VALUE).tolist():
+        result.flat[index] = is_prime_miller_rabin(int(values.flat[index]))
+    return result
+
+
+def smallest_prime_factors(max_num):
+    """Returns NumPy array with smallest prime factor for each number from 0 to MAX_NUM (with 0 for 0 and 1)"""
+    # EX: list(smallest_prime_factors(10)) => [0, 0, 2, 3, 2, 5, 2, 7, 2, 3, 2]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    max_num = int(max_num)
+    dtype = np.uint32 if (max_num < 2 ** 32) else np.uint64
+    factors = np.zeros(max(max_num, 1) + 1, dtype=dtype)
+    for prime in primes_up_to(math.isqrt(max_num)).tolist():
+        multiples = factors[prime * prime::prime]
+        multiples[multiples == 0] = prime
+    # note: remaining numbers are prime
+    unset = np.flatnonzero(factors == 0)
+    unset = unset[unset >= 2]
+    factors[unset] = unset
+    return factors[:max_num + 1]
+
+
+def prime_factorizations(values):
+    """Returns list of prime factor lists for VALUES, as with prime_factorization
+    Note: Uses a smallest-prime-factor table if all values are up to MAX_SIEVE_VALUE."""
+    # EX: prime_factorizations([12, 1, 97]) => [[2, 2, 3], [], [97]]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    values = list(values)
+    if ((not values) or (max(values) > MAX_SIEVE_VALUE)):
+        return [prime_factorization(value) for value in values]
+    factors_table = smallest_prime_factors(max(max(values), 1))
+    result = []
+    # note: done in chunks to bound size of factor matrix
+    chunk_size = 2 ** 16
+    for start in range(0, len(values), chunk_size):
+        remaining = np.maximum(np.asarray(values[start:start + chunk_size], dtype=np.int64), 1)
+        steps = []
+        while True:
+            active = (remaining > 1)
+            if not active.any():
+                break
+            factors = np.where(active, factors_table[remaining], 0).astype(np.int64)
+            steps.append(factors)
+            remaining = np.where(active, remaining // np.maximum(factors, 1), 1)
+        if not steps:
+            result += [[] for _value in remaining]
+            continue
+        factor_matrix = np.stack(steps, axis=1)
+        is_factor = (factor_matrix > 0)
+        # note: factors are flattened in row order and then split per value
+        all_factors = factor_matrix[is_factor].tolist()
+        offset = 0
+        for num_factors in is_factor.sum(axis=1).tolist():
+            result.append(all_factors[offset:offset + num_factors])
+            offset += num_factors
+    return result
+
+
 def fibonacci(max_num):
     """Returns Fibonacci sequence with numbers less than MAX_NUM"""
     # EX: fibonacci(10) => [0, 1, 1, 2, 3, 5, 8]
@@ -352,37 +661,89 @@ def parse_timestamp(ts: str, truncate=None, utc=None) -> datetime.datetime:
     return result
 
 
+class TimestampParser:
+    """Parser for ISO 8601 timestamps as with parse_timestamp, but returning microseconds since 1 Jan 0001
+    Note: Fixed-width timestamps are parsed via slicing, caching the date prefix (through minutes) across calls; others are parsed via parse_timestamp."""
+
+    def __init__(self):
+        """Initializer"""
+        self.prefix = None
+        self.prefix_microseconds = None
+
+    def parse(self, ts: str) -> int:
+        """Returns microseconds for timestamp TS, truncating fractional seconds after 6 digits
+        Note: Raises ValueError if invalid (e.g., hour 24)"""
+        # EX: TimestampParser().parse("0001-01-02T00:01:01.1234567Z") => 86461123456
+        if (FIXED_TIMESTAMP_REGEX.fullmatch(ts) and (ts[17:19] < "60")):
+            prefix = ts[:16]
+            if (prefix != self.prefix):
+                # note: datetime checks ranges (e.g., day of month)
+                start = datetime.datetime(int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                                          int(ts[11:13]), int(ts[14:16]))
+                self.prefix_microseconds = ((start.toordinal() - 1) * MICROSECONDS_PER_DAY
+                                            + (start.hour * 60 + start.minute) * 60 * 10 ** 6)
+                self.prefix = prefix
+            return (self.prefix_microseconds + int(ts[17:19]) * 10 ** 6 + int(ts[20:26]))
+        result = parse_timestamp(ts)
+        return ((result.toordinal() - 1) * MICROSECONDS_PER_DAY
+                + ((result.hour * 60 + result.minute) * 60 + result.second) * 10 ** 6
+                + result.microsecond)
+
+
 def add_timestamp_diff(in_filename, out_filename, prefix=False):
     """Add timestamp difference to each occurrence from IN_FILENAME based on previous occurrence, saving to OUT_FILENAME
     If PREFIX, then the difference is added to start of line, otherwise after timestamp
+    Note: The file is processed in blocks of TIMESTAMP_BLOCK_SIZE, with timestamps parsed via TimestampParser.
+    An unreadable input file is reported as an error, producing empty output (as before).
     """
     # TODO3: isolate as separate utility?
-    new_lines = []
+    parser = TimestampParser()
     last_time = None
-    for line in system.read_lines(in_filename):
-        # Check for ISO 8601 timestamp (e.g., 2023-10-06T04:02:36.5228822Z)
-        new_line = line
-        if my_re.search(r"(\d{4}-\d{1,2}-\d{1,2}T\d{2}:\d{2}:\d{2}\.\d{6,}Z)", line):
-            timestamp = my_re.group(1)
-            try:
-                new_time = parse_timestamp(timestamp)
-            except:
-                new_time = last_time
-
-            # Compute delta in microsseconds
-            time_diff = "0"
-            microsec = "\u00B5" + "s"        # U+00B5 (µ)
-            if last_time:
-                time_diff = "+" + str((new_time - last_time).total_seconds() * 1e6) + microsec
-            if prefix:
-                new_line = time_diff + "\t" + line
-            else:
-                new_line = line.replace(timestamp, f"{timestamp} [{time_diff}]")
-            last_time = new_time
-        new_lines.append(new_line)
-
-    # Output revised lines
-    system.write_lines(out_filename, new_lines)
+    microsec = "\u00B5" + "s"        # U+00B5 (µ)
+    try:
+        # pylint: disable=consider-using-with
+        in_file = open(in_filename, encoding="UTF-8")
+    except IOError:
+        # note: same error handling as system.read_entire_file
+        debug.trace_exception(1, "add_timestamp_diff/IOError")
+        system.print_stderr("Error: Unable to read file '{f}': {exc}",
+                            f=in_filename, exc=system.get_exception())
+        in_file = io.StringIO()
+    with in_file, open(out_filename, "w", encoding="UTF-8") as out_file:
+        while True:
+            lines = in_file.readlines(TIMESTAMP_BLOCK_SIZE)
+            if not lines:
+                break
+            new_lines = []
+            for line in lines:
+                # Check for ISO 8601 timestamp (e.g., 2023-10-06T04:02:36.5228822Z)
+                new_line = line
+                match = ISO_TIMESTAMP_REGEX.search(line)
+                if match:
+                    timestamp = match.group(1)
+                    try:
+                        new_time = parser.parse(timestamp)
+                    except:
+                        new_time = last_time
+
+                    # Compute delta in microsseconds
+                    # note: same as timedelta.total_seconds() * 1e6
+                    time_diff = "0"
+                    if last_time is not None:
+                        time_diff = "+" + str(((new_time - last_time) / 10 ** 6) * 1e6) + microsec
+                    if prefix:
+                        new_line = time_diff + "\t" + line
+                    else:
+                        new_line = line.replace(timestamp, f"{timestamp} [{time_diff}]")
+                    last_time = new_time
+                new_lines.append(new_line)
+
+            # Output revised lines
+            # note: newline added to last line if missing (as with system.write_lines)
+            if not new_lines[-1].endswith("\n"):
+                new_lines[-1] += "\n"
+            out_file.write("".join(new_lines))
+    return
 
 
 def random_int(min_value=None, max_value=None):
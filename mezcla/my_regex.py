@@ -40,7 +40,7 @@ from mezcla import system
 ## DEBUG: system.print_error("checking SKIP_RE_ALL")
 RE_ALL = (not system.getenv_bool("SKIP_RE_ALL", False,
                                  "Don't use re.__all__: for sake of pylint"))
-__all__ = ['regex_wrapper', 'my_re']
+__all__ = ['regex_wrapper', 'my_re', 'WordListMatcher']
 if RE_ALL:
     ## TODO: __all__ = re.__all__ + ['regex_wrapper', 'my_re']
     __all__ += re.__all__
@@ -267,6 +267,68 @@ class regex_wrapper():
         debug.trace(self.TRACE_LEVEL, f"post_match() => {result!r}")
         return result
     
+#...............................................................................
+
+class WordListMatcher():
+    """Matches any of a list of literal TERMS as whole words (i.e., at word boundaries)
+    Note: A single regex is compiled from a trie over the terms, so that one search
+    replaces a separate rf"\\b{term}\\b" search per term. Terms are escaped (n.b., regex
+    operators are not supported), and empty terms are ignored."""
+    # EX: WordListMatcher(["cat", "cattle", "dog"]).findall("cattle and dogs") => ["cattle"]
+    # EX: WordListMatcher(["cat", "cattle", "dog"]).regex => r"\b(?:cat(?:tle)?|dog)\b"
+
+    def __init__(self, terms, flags=0):
+        """Initializer: compiles regex for TERMS using FLAGS (e.g., re.IGNORECASE)"""
+        trie = {}
+        num_terms = 0
+        for term in terms:
+            if not term:
+                continue
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[""] = True
+            num_terms += 1
+        self.regex = (rf"\b(?:{self.trie_regex(trie, top=True)})\b" if trie else None)
+        self.pattern = (re.compile(self.regex, flags) if trie else None)
+        debug.trace(REGEX_TRACE_LEVEL, f"WordListMatcher: {num_terms} terms; regex len={len(self.regex or '')}")
+
+    @staticmethod
+    def trie_regex(node, top=False):
+        """Returns alternation regex for trie NODE, with longer continuations tried first
+        Note: alternatives are grouped unless at TOP level"""
+        # note: a character class is used when all branches are single-character terms
+        branches = [(ch, child) for (ch, child) in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        is_atom = all((child.keys() == {""}) for (_ch, child) in branches)
+        is_grouped = False
+        if is_atom:
+            chars = [re.escape(ch) for (ch, _child) in branches]
+            regex = (chars[0] if (len(chars) == 1) else f"[{''.join(chars)}]")
+        else:
+            alternatives = [(re.escape(ch) + WordListMatcher.trie_regex(child))
+                            for (ch, child) in branches]
+            regex = "|".join(alternatives)
+            if ((len(alternatives) > 1) and not top):
+                regex = f"(?:{regex})"
+                is_grouped = True
+        if "" in node:
+            regex = (f"{regex}?" if (is_atom or is_grouped) else f"(?:{regex})?")
+        return regex
+
+    def search(self, text):
+        """Returns match object for first term found in TEXT or None"""
+        result = (self.pattern.search(text) if self.pattern else None)
+        debug.trace(REGEX_TRACE_LEVEL + 1, f"WordListMatcher.search({text!r}) => {result!r}")
+        return result
+
+    def findall(self, text):
+        """Returns list of (non-overlapping) terms found in TEXT"""
+        result = (self.pattern.findall(text) if self.pattern else [])
+        debug.trace(REGEX_TRACE_LEVEL + 1, f"WordListMatcher.findall({text!r}) => {result!r}")
+        return result
+
 #...............................................................................
 # Initialization
 #
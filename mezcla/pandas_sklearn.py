@@ -9,6 +9,7 @@
 # Notes:
 # - Environment variables:
 #   DATA_FILE  FIELD_SEP  SCORING_METRIC  SEED  SKIP_DEVEL  SKIP_PLOTS  USE_DATAFRAME  VALIDATE_ALL  VALIDATION_CLASSIFIER  VERBOSE 
+#   EVAL_WORKERS  EVAL_CACHE_DIR  NUM_FOLDS
 # - Currently only supports cross-validation (i.e., partitions of single datafile).
 # - This partititions training data into development and validation sets.
 # - Also does k-fold cross validation over development data split using 1/k-th as test.
@@ -37,16 +38,23 @@
 from mezcla import debug            # pylint: disable=ungrouped-imports
 
 # Standard packages
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import pickle
 ## OLD: import sys
+import time
 
 # Installed pckages
 import numpy as np
 import pandas as pd
 from pandas.plotting import scatter_matrix
+import sklearn
 from sklearn import model_selection
+from sklearn.base import clone
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from sklearn.metrics import precision_recall_curve
+from sklearn.metrics import precision_recall_curve, get_scorer
 from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
 
@@ -155,10 +163,18 @@ MICRO_AVERAGE = getenv_bool("MICRO_AVERAGE", False,
                             "Use micro-averaging for mutliclass problems")
 DUMP_MODEL = getenv_bool("DUMP_MODEL", False,
                          "Dump out model-specific representation")
+NUM_FOLDS = getenv_int("NUM_FOLDS", 10,
+                       "Number of folds for cross validation over development data")
+EVAL_WORKERS = getenv_int("EVAL_WORKERS", 1,
+                          "Number of processes for cross validation over classifiers and folds")
+EVAL_CACHE_DIR = getenv_value("EVAL_CACHE_DIR", None,
+                              "Directory for caching cross-validation fold results")
 
 # Globals
 devel_classifiers = [DEVEL_CLASSIFIER]
 validation_classifiers = [VALIDATION_CLASSIFIER]
+# note: features and classes for evaluate_fold (n.b., set once per worker process)
+eval_data = None
 
 #...............................................................................
 # Optional packages
@@ -209,6 +225,159 @@ def create_feature_mapping(label_values):
     debug.trace_fmtd(7, "create_feature_mapping({l}) => {h}", l=in_label_values, h=id_hash)
     return id_hash
 
+#...............................................................................
+# Cross validation support
+#
+# Note: Evaluation is done over (classifier, fold) pairs, optionally using a process
+# pool and with results cached on disk (e.g., so reruns only evaluate new models).
+
+def get_data_hash(*data):
+    """Return SHA-256 hex digest over DATA items (e.g., feature frame and classes)"""
+    hasher = hashlib.sha256()
+    for item in data:
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            labels = (list(item.columns) if isinstance(item, pd.DataFrame) else [item.name])
+            hasher.update(repr(labels).encode())
+            hasher.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+        else:
+            array = np.asarray(item)
+            hasher.update(f"{array.dtype}{array.shape}".encode())
+            hasher.update(pickle.dumps(array) if (array.dtype == object) else array.tobytes())
+    result = hasher.hexdigest()
+    debug.trace(6, f"get_data_hash() => {result}")
+    return result
+
+
+def get_model_key(name, model):
+    """Return key for classifier NAME based on MODEL class and parameters"""
+    try:
+        params = sorted(model.get_params().items())
+    except:
+        system.print_exception_info("get_params")
+        params = repr(model)
+    model_class = f"{type(model).__module__}.{type(model).__qualname__}"
+    result = f"{name}|{model_class}|{params!r}"
+    debug.trace(6, f"get_model_key({name}, _) => {result!r}")
+    return result
+
+
+def select_rows(data, indices):
+    """Return rows of DATA (frame or array) at positional INDICES"""
+    return (data.iloc[indices] if isinstance(data, (pd.DataFrame, pd.Series)) else data[indices])
+
+
+def set_eval_data(X, y):
+    """Set features X and classes Y for use by evaluate_fold"""
+    # note: used as process pool initializer so that data is only sent once per worker
+    global eval_data
+    eval_data = (X, y)
+
+
+def evaluate_fold(model, train_index, test_index, scoring):
+    """Fit clone of MODEL over TRAIN_INDEX rows of eval_data and score TEST_INDEX rows using SCORING
+    Returns tuple with score, fit time, and predict time (i.e., for scoring)"""
+    # note: this is the same as each fold of model_selection.cross_val_score
+    X, y = eval_data
+    estimator = clone(model)
+    start = time.time()
+    estimator.fit(select_rows(X, train_index), select_rows(y, train_index))
+    fit_time = (time.time() - start)
+    start = time.time()
+    score = get_scorer(scoring)(estimator, select_rows(X, test_index), select_rows(y, test_index))
+    predict_time = (time.time() - start)
+    return (float(score), fit_time, predict_time)
+
+
+def is_picklable(model):
+    """Whether MODEL can be sent to worker process"""
+    # note: for example, Keras classifier uses lambda for model creation
+    try:
+        pickle.dumps(model)
+        ok = True
+    except:
+        debug.trace_exception(5, "is_picklable")
+        ok = False
+    return ok
+
+
+def evaluate_models(models, X, y, scoring=None, num_folds=None, num_workers=None, cache_dir=None):
+    """Cross validate each (name, model) pair in MODELS over features X and classes Y using SCORING metric.
+    Returns dict from name to list of (score, fit_time, predict_time, cached) tuples, one per fold, or None if error.
+    Note: Uses NUM_WORKERS processes over models and folds, and optionally caches fold results under CACHE_DIR
+    (n.b., times for cached folds are from the original evaluation).
+    """
+    debug.trace(4, f"evaluate_models({[n for (n, _m) in models]}, _, _, {scoring}, {num_folds}, {num_workers}, {cache_dir})")
+    if scoring is None:
+        scoring = SCORING_METRIC
+    if num_folds is None:
+        num_folds = NUM_FOLDS
+    if num_workers is None:
+        num_workers = EVAL_WORKERS
+    if cache_dir is None:
+        cache_dir = EVAL_CACHE_DIR
+    kfold = model_selection.KFold(n_splits=num_folds, shuffle=True, random_state=SEED)
+    splits = list(kfold.split(X))
+    results = {name: [None] * len(splits) for (name, _model) in models}
+    failed = set()
+
+    # Check cache for fold results, queuing others for evaluation
+    data_key = ""
+    if cache_dir:
+        gh.full_mkdir(cache_dir)
+        data_key = f"{get_data_hash(X, y)}|{sklearn.__version__}|{SEED}|{scoring}"
+    pending = []
+    for (name, model) in models:
+        model_key = (get_model_key(name, model) if cache_dir else "")
+        for fold in range(len(splits)):
+            cache_file = None
+            if cache_dir:
+                fold_key = f"{data_key}|{model_key}|{fold + 1} of {num_folds}"
+                cache_file = gh.form_path(cache_dir, hashlib.sha256(fold_key.encode()).hexdigest() + ".json")
+                if system.file_exists(cache_file):
+                    try:
+                        results[name][fold] = (tuple(json.loads(system.read_file(cache_file))) + (True,))
+                        debug.trace(5, f"Using cached result for {name} fold {fold + 1}: {cache_file}")
+                        continue
+                    except:
+                        system.print_exception_info(f"reading {cache_file}")
+            pending.append((name, fold, model, cache_file))
+    debug.trace(4, f"{len(pending)} of {len(models) * len(splits)} folds to evaluate")
+
+    def record_result(name, fold, cache_file, result):
+        """Save RESULT for NAME's FOLD, optionally to CACHE_FILE"""
+        results[name][fold] = (tuple(result) + (False,))
+        if cache_file:
+            system.write_file(cache_file, json.dumps(result))
+
+    # Evaluate remaining folds, using process pool if multiple workers
+    set_eval_data(X, y)
+    local = pending
+    if ((num_workers > 1) and pending):
+        picklable = {name: is_picklable(model) for (name, model) in models}
+        local = [task for task in pending if not picklable[task[0]]]
+        remote = [task for task in pending if picklable[task[0]]]
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=set_eval_data, initargs=(X, y)) as executor:
+            futures = [(task, executor.submit(evaluate_fold, task[2], *splits[task[1]], scoring))
+                       for task in remote]
+            for ((name, fold, _model, cache_file), future) in futures:
+                try:
+                    record_result(name, fold, cache_file, future.result())
+                except:
+                    system.print_exception_info(f"evaluating {name} fold {fold + 1}")
+                    failed.add(name)
+    for (name, fold, model, cache_file) in local:
+        if name in failed:
+            continue
+        try:
+            record_result(name, fold, cache_file, evaluate_fold(model, *splits[fold], scoring))
+        except:
+            system.print_exception_info(f"evaluating {name} fold {fold + 1}")
+            failed.add(name)
+    for name in failed:
+        results[name] = None
+    debug.trace(6, f"evaluate_models() => {results}")
+    return results
+
 #...............................................................................
 # Main processing
 
@@ -429,17 +598,32 @@ def main():
     if (not SKIP_DEVEL):
         print("Sample development test set results using scoring method '{sm}'".format(sm=SCORING_METRIC))
         ## TODO: average = "micro" if (not is_binary) else None
+        devel_models = []
         for name, model in models:
             if ((name not in devel_classifiers) and (not INCLUDE_ALL_DEVEL)):
                 debug.trace_fmt(5, "Skipping classifier {n} (not for devel and not include all)", n=name)
                 continue
-            kfold = model_selection.KFold(n_splits=10, shuffle=True, random_state=SEED)
-            ## TODO: cv_results = model_selection.cross_val_score(model, X_train, y_train, cv=kfold, scoring=SCORING_METRIC, average=average)
-            ## TODO: get this to work when SCORING_METRIC is not accuracy (which leads to not supported error for multiclass data)
-            ## (e.g., add environment variable so that sklearn uses micro or macro average
+            devel_models.append((name, model))
+        ## TODO: get this to work when SCORING_METRIC is not accuracy (which leads to not supported error for multiclass data)
+        ## (e.g., add environment variable so that sklearn uses micro or macro average
+        ## OLD: cv_results = model_selection.cross_val_score(model, X_train, y_train, cv=kfold, scoring=SCORING_METRIC)
+        # note: models and folds evaluated together (see evaluate_models)
+        fold_results = evaluate_models(devel_models, X_train, y_train)
+        for name, model in devel_models:
             try:
-                cv_results = model_selection.cross_val_score(model, X_train, y_train, cv=kfold, scoring=SCORING_METRIC)
-                summaries.append("{n}\t{avg}\t{std}".format(n=name, avg=system.round_num(cv_results.mean()), std=system.round_num(cv_results.std())))
+                if not fold_results[name]:
+                    continue
+                cv_results = np.array([score for (score, _fit_time, _predict_time, _cached) in fold_results[name]])
+                # note: times for cached folds are excluded from totals, as not measured in this run
+                fit_time = sum(fit_time for (_score, fit_time, _predict_time, cached) in fold_results[name]
+                               if not cached)
+                predict_time = sum(predict_time for (_score, _fit_time, predict_time, cached) in fold_results[name]
+                                   if not cached)
+                num_cached = sum(1 for (_score, _fit_time, _predict_time, cached) in fold_results[name] if cached)
+                cached_spec = (f"\t({num_cached} of {len(cv_results)} folds cached)" if num_cached else "")
+                summaries.append("{n}\t{avg}\t{std}\t{fit}\t{pred}{c}".format(
+                    n=name, avg=system.round_num(cv_results.mean()), std=system.round_num(cv_results.std()),
+                    fit=system.round_num(fit_time), pred=system.round_num(predict_time), c=cached_spec))
 
                 # Show confusion matrix for sample split of training data
                 if VERBOSE:
@@ -465,7 +649,8 @@ def main():
             except:
                 system.print_exception_info("training evaluation")
         print("Cross validation results over development test set")
-        print("name\tacc\tstdev")
+        # note: fit and predict times are totals over the folds evaluated (in seconds), excluding cached ones
+        print("name\tacc\tstdev\tfit\tpredict")
         print("\n".join(summaries))
     
     # Make predictions on validation dataset
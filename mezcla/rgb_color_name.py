@@ -13,7 +13,7 @@
 # TODO2: Put on a new low-priority script with respect to testing coverage.
 #
 # TODO3: define class for color name conversion proper (e.g., decompose Script
-# into option parsing class and color conversion class)
+# into option parsing class and color conversion class): see ColorNameResolver
 #--------------------------------------------------------------------------------
 # Sample input (based on extcolors):
 #
@@ -59,9 +59,13 @@ Sample usage:
 ##    <(39, 39, 39), darkslategray>   :  24.35% (630
 
 # Standard packages
-## OLD: import re
+import json
+import os
+import re
+import stat
 
 # Installed packages
+import numpy as np
 import webcolors
 from scipy.spatial import KDTree
 
@@ -82,6 +86,128 @@ HEX6 = "hex6"
 SKIP_DIRECT = "skip-direct"
 SHOW_HEX = "show-hex"
 HEX_CH = "[0-9A-F]"
+HEX_SPEC_REGEX = re.compile("(0x)|[A-F]|(^#)", flags=re.IGNORECASE)
+
+# Environment options
+DEFAULT_LINE_BLOCK_SIZE = 1000
+LINE_BLOCK_SIZE = system.getenv_int(
+    "LINE_BLOCK_SIZE", 0,
+    description=f"Number of lines resolved together: 0 for {DEFAULT_LINE_BLOCK_SIZE} if input is a regular file and 1 otherwise (e.g., terminal or pipe)")
+COLOR_TABLE_FILE = system.getenv_value(
+    "COLOR_TABLE_FILE", None,
+    description="Memory-mapped lookup table for nearest color names (created if needed)")
+COLOR_TABLE_BITS = system.getenv_int(
+    "COLOR_TABLE_BITS", 8,
+    description="Bits per RGB component for lookup table: 8 is exact (16M entries); fewer quantizes")
+
+#...............................................................................
+
+def get_css3_hex_names():
+    """Returns mapping from CSS3 hex codes to color names"""
+    if hasattr(webcolors, "CSS3_HEX_TO_NAMES"):
+        hexnames = webcolors.CSS3_HEX_TO_NAMES
+    else:
+        ## TODO3: try to find non-private way to get list (without iterating
+        ## through 16 million!)
+        try:
+            hexnames = webcolors._definitions._CSS3_HEX_TO_NAMES
+        except:
+            hexnames = {}
+    if not hexnames:
+        system.error("Error: unable to resolve hexname from webcolors")
+    return hexnames
+
+
+class ColorNameResolver:
+    """Resolves RGB triples into color names, using nearest color if no exact match.
+    Note: Lookups are done in batches, optionally via a memory-mapped table of nearest names."""
+
+    def __init__(self, table_file=None, table_bits=None):
+        """Initializer: populates color names into spatial name database and direct lookup table,
+        optionally along with lookup table in TABLE_FILE using TABLE_BITS per component"""
+        debug.trace(5, f"ColorNameResolver.__init__({table_file}, {table_bits})")
+        hexnames = get_css3_hex_names()
+        debug.trace_values(6, hexnames)
+        self.color_names = list(hexnames.values())
+        color_positions = [tuple(webcolors.hex_to_rgb(hex_code)) for hex_code in hexnames]
+        self.direct_names = dict(zip(color_positions, self.color_names))
+        self.space_color_db = KDTree(color_positions)
+        self.table_bits = (table_bits or COLOR_TABLE_BITS)
+        self.lookup_table = None
+        if table_file:
+            self.lookup_table = self.load_lookup_table(table_file)
+        debug.trace_object(5, self, label="ColorNameResolver instance")
+
+    def load_lookup_table(self, table_file):
+        """Returns memory-mapped table from TABLE_FILE for nearest color index, creating it if needed
+        Note: The table is indexed by the components truncated to table_bits (see get_table_index)."""
+        bits = self.table_bits
+        debug.assertion(1 <= bits <= 8)
+        info_file = table_file + ".json"
+        info = {"names": self.color_names, "bits": bits}
+        if not (system.file_exists(table_file) and system.file_exists(info_file)
+                and (json.loads(system.read_file(info_file)) == info)):
+            # Query the center of each cell in chunks of red values
+            debug.trace(3, f"Creating color lookup table {table_file}")
+            size = (1 << bits)
+            offset = (1 << (8 - bits)) // 2
+            levels = (np.arange(size) << (8 - bits)) + offset
+            temp_file = table_file + ".tmp"
+            table = np.lib.format.open_memmap(temp_file, mode="w+", dtype=np.uint8, shape=(size ** 3,))
+            green, blue = np.meshgrid(levels, levels, indexing="ij")
+            for red in range(size):
+                points = np.column_stack([np.full(size * size, levels[red]), green.ravel(), blue.ravel()])
+                _dist, indices = self.space_color_db.query(points)
+                table[(red * size * size):((red + 1) * size * size)] = indices
+            table.flush()
+            del table
+            os.replace(temp_file, table_file)
+            system.write_file(info_file, json.dumps(info))
+        return np.load(table_file, mmap_mode="r")
+
+    def get_table_index(self, colors):
+        """Returns index into lookup table for COLORS array"""
+        shift = (8 - self.table_bits)
+        quantized = (colors >> shift)
+        return ((quantized[:, 0] << (2 * self.table_bits)) | (quantized[:, 1] << self.table_bits) | quantized[:, 2])
+
+    def get_nearest_indices(self, colors):
+        """Returns indices of color names nearest to each RGB triple in COLORS list"""
+        colors = np.array(colors, dtype=np.int64).reshape(-1, 3)
+        if self.lookup_table is None:
+            indices = (self.space_color_db.query(colors)[1] if len(colors) else np.zeros(0, dtype=int))
+        else:
+            # note: out-of-range values use the spatial database
+            indices = np.zeros(len(colors), dtype=int)
+            in_range = np.all((colors >= 0) & (colors <= 255), axis=1)
+            indices[in_range] = self.lookup_table[self.get_table_index(colors[in_range])]
+            if not np.all(in_range):
+                indices[~in_range] = self.space_color_db.query(colors[~in_range])[1]
+        return indices
+
+    def get_direct_name(self, rgb):
+        """Returns name of color exactly matching RGB triple or None
+        Note: The components are clipped as with webcolors.rgb_to_name"""
+        rgb = tuple(rgb)
+        name = self.direct_names.get(rgb)
+        if (name is None) and ((min(rgb) < 0) or (max(rgb) > 255)):
+            name = self.direct_names.get(tuple(min(max(c, 0), 255) for c in rgb))
+        return name
+
+    def resolve(self, colors, check_direct_match=True):
+        """Returns list of color names for COLORS list of RGB triples, optionally with CHECK_DIRECT_MATCH"""
+        names = [None] * len(colors)
+        if check_direct_match:
+            names = [self.get_direct_name(rgb) for rgb in colors]
+        unresolved = [i for (i, name) in enumerate(names) if not name]
+        if unresolved:
+            indices = self.get_nearest_indices([colors[i] for i in unresolved])
+            for (i, index) in zip(unresolved, indices.tolist()):
+                names[i] = self.color_names[index]
+        debug.trace(6, f"resolve([{len(colors)} colors]) => {names}")
+        return names
+
+#...............................................................................
 
 class Script(Main):
     """Input processing class: convert RGB tuples to <RGB, label> pairs"""
@@ -93,6 +219,9 @@ class Script(Main):
     skip_direct = False
     show_hex = None
     check_direct_match = None
+    resolver = None
+    rgb_pattern = None
+    pending_lines = None
 
     def setup(self):
         """Check results of command line processing"""
@@ -116,33 +245,25 @@ class Script(Main):
         self.check_direct_match = not self.skip_direct
 
         # Populate color names into spatial name database
-        # TODO2: isolate into helper class
-        ## OLD:
-        if hasattr(webcolors, "CSS3_HEX_TO_NAMES"):
-            hexnames = webcolors.CSS3_HEX_TO_NAMES
-        else:
-            ## TODO3: try to find non-private way to get list (without iterating
-            ## through 16 million!)
-            try:
-                hexnames = webcolors._definitions._CSS3_HEX_TO_NAMES
-            except:
-                hexnames = {}
-        if not hexnames:
-            system.error("Error: unable to resolve hexname from webcolors")
-            
-        debug.trace_values(6, hexnames)
-        debug.trace_expr(5, hexnames, max_len=2**16)
-        self.color_names = []
-        color_positions = []
-        #
-        for hex_code, name in hexnames.items():
-            debug.trace(6, f"color: {name}={hex_code}")
-            self.color_names.append(name)
-            color_positions.append(webcolors.hex_to_rgb(hex_code))
-            #
-        self.space_color_db = KDTree(color_positions)
+        self.resolver = ColorNameResolver(table_file=COLOR_TABLE_FILE)
+        self.color_names = self.resolver.color_names
+        self.space_color_db = self.resolver.space_color_db
+        self.rgb_pattern = re.compile(self.rgb_regex, flags=re.IGNORECASE)
+        self.pending_lines = []
+        self.block_size = None
         debug.trace_object(5, self, label="Script instance")
 
+    def get_block_size(self):
+        """Returns number of lines to resolve together: LINE_BLOCK_SIZE if set, or
+        DEFAULT_LINE_BLOCK_SIZE when input is a regular file (n.b., 1 for terminals or pipes so output not held back)"""
+        if LINE_BLOCK_SIZE:
+            return LINE_BLOCK_SIZE
+        try:
+            is_file = stat.S_ISREG(os.fstat(self.input_stream.fileno()).st_mode)
+        except (AttributeError, OSError, ValueError):
+            is_file = False
+        return (DEFAULT_LINE_BLOCK_SIZE if is_file else 1)
+
     def process_line(self, line):
         """Processes current line from input"""
         debug.trace_fmtd(6, "Script.process_line({l})", l=line)
@@ -153,74 +274,77 @@ class Script(Main):
             debug.assertion(not my_re.search(r"^\s*(IMDR|JFIF|PNG)\s*$", line),
                             "Input should not be an image (e.g., use extcolors output)")
         
-        # Extract RGB references and add color name label
+        # Queue line for resolution along with others in block
+        # note: block size determined here as input not opened until after setup
+        if self.block_size is None:
+            self.block_size = self.get_block_size()
+            debug.trace(5, f"block_size={self.block_size}")
+        self.pending_lines.append((self.line_num, line))
+        if (len(self.pending_lines) >= self.block_size):
+            self.process_pending()
+
+    def process_pending(self):
+        """Adds color name labels for RGB references in pending lines, printing revised lines"""
+        debug.trace(5, f"Script.process_pending(): num={len(self.pending_lines)}")
+        # Extract RGB references
         # ex: "(128, 128, 128):  72.98% (1888)" => "<Grey, (128, 128, 128)>:  72.98% (1888)
-        ## OLD: MAX_TRIES = max(1, line.count("("))
-        MAX_TRIES = (1 + len(my_re.findall(self.rgb_regex, line, flags=my_re.IGNORECASE)))
-        debug.trace(5, f"len: {len(line)}; MAX_TRIES={MAX_TRIES}")
-        num_tries = 0
-        text = line
-        processed_text = ""
-        while (my_re.search(self.rgb_regex, text, flags=my_re.IGNORECASE)
-               and (num_tries < MAX_TRIES)):
-            num_tries += 1
-            # Extract RGB components
-            rgb_original = my_re.group(0)
-            rgb = rgb_original
-            red = my_re.group(1)
-            green = my_re.group(2)
-            blue = my_re.group(3)
-            start = my_re.start()
-            end = my_re.end()
-
-            # Determine whether RGB in hexadecimal or decimal
-            rgb_base = 10
-            if (self.hex or my_re.search("(0x)|[A-F]|(^#)", rgb, flags=my_re.IGNORECASE)):
-                if not self.hex:
-                    debug.trace(4, f"FYI: Assuming hex RGB spec '{rgb}' on line {self.line_num}")
-                rgb_base = 16
-            # Handle special case of #xyz => #xxyyzz
-            if (my_re.search(r"^#...$", rgb)):
-                debug.trace(4, f"Expanding hex shortcut at line {self.line_num}: {line}")
-                red += red
-                green += green
-                blue += blue
-                rgb = "#" + red + green + blue
-            # Convert to tuple of integers
-            query_color = [system.safe_int(c, base=rgb_base) for c in [red, green, blue]]
-
-            try:
-                # Try for exact match
-                color_name = None
-                if self.check_direct_match:
-                    try:
-                        color_name = webcolors.rgb_to_name(query_color)
-                    except:
-                        debug.trace(5, f"Direct lookup failed: {system.get_exception()}")
-                    
-                # Query nearest point
-                if not color_name:
-                    dist, index = self.space_color_db.query(query_color)
-                    debug.trace_fmtd(5, f"{rgb} => {index}; dist={dist}")
-                    color_name = self.color_names[index]
-            except:
-                system.print_stderr(f"Exception in color decoding: {system.get_exception()}")
-                continue
-
-            rgb_spec = rgb
-            hex_spec = ""
-            if self.show_hex:
-                # https://stackoverflow.com/questions/2269827/how-to-convert-an-int-to-a-hex-string
-                hex_spec = " 0x" + "".join(f"{c:0>2X}" for c in query_color)
-            color_spec = f"<{rgb_spec}, {color_name}{hex_spec}>"
-            processed_text += text[0: start] + color_spec
-            text = text[end:]
-            debug.trace_fmtd(4, "match: {m}; new text: {new}",
-                             m=rgb_original, new=text)
-        debug.assertion(num_tries <= MAX_TRIES)
-
-        # Print revised line
-        print(processed_text + text)
+        line_matches = []
+        query_colors = []
+        for (line_num, line) in self.pending_lines:
+            matches = []
+            for match in self.rgb_pattern.finditer(line):
+                # Extract RGB components
+                rgb = match.group(0)
+                (red, green, blue) = match.group(1, 2, 3)
+
+                # Determine whether RGB in hexadecimal or decimal
+                rgb_base = 10
+                if (self.hex or HEX_SPEC_REGEX.search(rgb)):
+                    if not self.hex:
+                        debug.trace(4, f"FYI: Assuming hex RGB spec '{rgb}' on line {line_num}")
+                    rgb_base = 16
+                # Handle special case of #xyz => #xxyyzz
+                if ((len(rgb) == 4) and rgb.startswith("#")):
+                    debug.trace(4, f"Expanding hex shortcut at line {line_num}: {line}")
+                    red += red
+                    green += green
+                    blue += blue
+                    rgb = "#" + red + green + blue
+                # Convert to tuple of integers
+                try:
+                    query_color = [int(red, rgb_base), int(green, rgb_base), int(blue, rgb_base)]
+                except ValueError:
+                    query_color = [system.safe_int(c, base=rgb_base) for c in [red, green, blue]]
+                matches.append((match.start(), match.end(), rgb, query_color))
+                query_colors.append(query_color)
+            line_matches.append(matches)
+
+        # Resolve the color names (n.b., exact match unless skip-direct)
+        color_names = iter(self.resolver.resolve(query_colors, self.check_direct_match))
+
+        # Splice in the labels and print revised lines
+        output_lines = []
+        for ((_line_num, line), matches) in zip(self.pending_lines, line_matches):
+            processed_text = []
+            last_end = 0
+            for (start, end, rgb_spec, query_color) in matches:
+                color_name = next(color_names)
+                hex_spec = ""
+                if self.show_hex:
+                    # https://stackoverflow.com/questions/2269827/how-to-convert-an-int-to-a-hex-string
+                    hex_spec = " 0x" + "".join(f"{c:0>2X}" for c in query_color)
+                processed_text.append(line[last_end:start])
+                processed_text.append(f"<{rgb_spec}, {color_name}{hex_spec}>")
+                last_end = end
+            processed_text.append(line[last_end:])
+            output_lines.append("".join(processed_text))
+        if output_lines:
+            print("\n".join(output_lines))
+        self.pending_lines = []
+
+    def wrap_up(self):
+        """Process any remaining lines"""
+        self.process_pending()
 
 def main():
     """Entry point"""
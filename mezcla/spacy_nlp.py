@@ -47,6 +47,8 @@ LANG_MODEL = "lang-model"
 USE_SCI_SPACY = "use-scispacy"
 DOWNLOAD_MODEL = "download-model"
 SHOW_REPRESENTATION = "show-representation"
+BATCH_SIZE = "batch-size"
+NUM_PROCESSES = "num-processes"
 
 # Environment options
 COUNT_ENTITIES = system.getenv_bool("COUNT_ENTITIES", False,
@@ -57,6 +59,12 @@ USE_PYSBD = system.getenv_bool("USE_PYSBD", (SENT_TOKENIZER.lower() == "pysbd"),
                                "Use pySBD--pragmatic Sentence Boundary Disambiguation")
 USE_NLTK = system.getenv_bool("USE_NLTK", (SENT_TOKENIZER.lower() == "nltk"),
                               "Use NLTK--NL Toolkit")
+SPACY_BATCH_SIZE = system.getenv_int("SPACY_BATCH_SIZE", 0,
+                                     "Batch size for Spacy's nlp.pipe over input units (0 for unit at a time)")
+SPACY_N_PROCESS = system.getenv_int("SPACY_N_PROCESS", 1,
+                                    "Number of processes for nlp.pipe when batching")
+PIPE_BUFFER_SIZE = system.getenv_int("PIPE_BUFFER_SIZE", 10000,
+                                     "Maximum number of input units buffered per nlp.pipe call")
 SPACY_MODEL = system.getenv_text(
     ## TODO2: "SPACY_MODEL", "en_core_web_lg",
     "SPACY_MODEL", "en_core_web_md",
@@ -306,6 +314,11 @@ class Script(Main):
     download_model = False
     show_reprsentation = False
     sent_num = 0
+    batch_size = SPACY_BATCH_SIZE
+    num_processes = SPACY_N_PROCESS
+    pending_units = None
+    # Input position attributes from Main, which are saved with units pending in batch mode
+    context_attributes = ["line_num", "rel_line_num", "page_num", "para_num", "rel_para_num", "char_offset"]
 
     def setup(self):
         """Check results of command line processing"""
@@ -322,7 +335,10 @@ class Script(Main):
         default_show_representation = ((not (do_specific_task or TRACK_PAGES))
                                        or self.verbose)
         self.show_representation = self.get_parsed_option(SHOW_REPRESENTATION, default_show_representation)
+        self.batch_size = self.get_parsed_option(BATCH_SIZE, self.batch_size)
+        self.num_processes = self.get_parsed_option(NUM_PROCESSES, self.num_processes)
         self.doc = None
+        self.pending_units = []
 
         # Download model from server
         if self.download_model:
@@ -425,7 +441,8 @@ class Script(Main):
         return score
     
     def process_line(self, line):
-        """Processes current line from input, showing word/lexeme information by default"""
+        """Processes current line from input, showing word/lexeme information by default
+        Note: In batch mode, the line is queued for nlp.pipe (see process_pending)"""
         # TODO: add entity-type filter
         debug.trace_fmtd(6, "Script.process_line({l})", l=line)
 
@@ -433,7 +450,38 @@ class Script(Main):
         # TODO: allow for embedded sentences
         ## self.doc = self.nlp(re.sub(r"\S", " ", line))
         line = (re.sub(r"\s", " ", line))
-        self.doc = self.nlp(line)
+        if self.batch_size:
+            context = [getattr(self, a) for a in self.context_attributes]
+            self.pending_units.append((line, context))
+            if (len(self.pending_units) >= PIPE_BUFFER_SIZE):
+                self.process_pending()
+            return
+        self.process_doc(line, self.nlp(line))
+
+    def process_pending(self):
+        """Runs units queued by process_line through nlp.pipe, with output in input order
+        Note: The input position attributes are restored for each unit (e.g., page_num)"""
+        debug.trace(5, f"Script.process_pending(): num={len(self.pending_units)}")
+        if not self.pending_units:
+            return
+        current_context = [getattr(self, a) for a in self.context_attributes]
+        docs = self.nlp.pipe((line for (line, _context) in self.pending_units),
+                             batch_size=self.batch_size, n_process=self.num_processes)
+        for ((line, context), doc) in zip(self.pending_units, docs):
+            for (attribute, value) in zip(self.context_attributes, context):
+                setattr(self, attribute, value)
+            self.process_doc(line, doc)
+        self.pending_units = []
+        for (attribute, value) in zip(self.context_attributes, current_context):
+            setattr(self, attribute, value)
+
+    def wrap_up(self):
+        """Process any units pending in batch mode"""
+        self.process_pending()
+
+    def process_doc(self, line, doc):
+        """Show information for sentences in DOC produced by Spacy for LINE"""
+        self.doc = doc
         debug.trace_object(7, self.doc, "doc")
         if self.verbose:
             line_text = re.sub(r"\r?\n", " <newline> ", line)
@@ -517,6 +565,8 @@ if __name__ == '__main__':
                          (DOWNLOAD_MODEL, "Download Spacy model"),
                          (SHOW_REPRESENTATION, "Show final representation (e.g., word & token attributes"),
         ],
-        text_options=[(LANG_MODEL, "Language model for NLP")])
+        text_options=[(LANG_MODEL, "Language model for NLP")],
+        int_options=[(BATCH_SIZE, "Batch size for nlp.pipe over input units (e.g., 64; 0 for unit at a time)", SPACY_BATCH_SIZE),
+                     (NUM_PROCESSES, "Number of processes for nlp.pipe in batch mode", SPACY_N_PROCESS)])
     app.run()
     debug.trace_expr(5, pysbd)
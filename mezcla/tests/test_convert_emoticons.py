@@ -107,6 +107,28 @@ class TestIt(TestWrapper):
         self.do_assert(convert_emoticons(chinese_age) == chinese_age)
         return
 
+    @trap_exception
+    def test_translation_runs(self):
+        """Make sure translation over non-ASCII runs matches character-by-character version"""
+        debug.trace(4, f"TestIt.test_translation_runs(); self={self}")
+        texts = ["price £5", "a\xa0b", "año ©2024", "✅ Success ❌ Failure", "¿😎 ok?😴",
+                 "天気 \U0001F60E\U0001F634!", "plain"]
+        options = [{}, {"strip": True}, {"augment": True},
+                   {"strip": True, "replacement": "_"}, {"strip": True, "replacement": "\x00"}]
+        for kwargs in options:
+            for text in texts:
+                self.monkeypatch.setattr(THE_MODULE, "CHAR_BY_CHAR", True)
+                expected = THE_MODULE.convert_emoticons(text, **kwargs)
+                self.monkeypatch.setattr(THE_MODULE, "CHAR_BY_CHAR", False)
+                actual = THE_MODULE.convert_emoticons(text, **kwargs)
+                debug.trace_expr(5, kwargs, text, expected, actual)
+                self.do_assert(actual == expected)
+        self.do_assert(THE_MODULE.convert_emoticons("price £5") == "price £5")
+        self.do_assert(THE_MODULE.convert_emoticons("© ok", augment=True) == "© [copyright sign] ok")
+        self.do_assert(THE_MODULE.convert_emoticons("a ✅\xa0b", strip=True, replacement="\x00")
+                       == "a \x00\xa0b")
+        return
+
 
 #------------------------------------------------------------------------
 
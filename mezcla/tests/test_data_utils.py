@@ -12,6 +12,7 @@
 """Tests for data_utils module"""
 
 # Standard packages
+import csv
 import os
 import pandas as pd
 
@@ -66,6 +67,58 @@ class TestDataUtils:
         tf = THE_MODULE.read_csv(f"{self.path}/../examples/iris.csv")
         assert THE_MODULE.lookup_df_value(tf, "sepal_length", "petal_length", "3.8") == "5.5" 
 
+    def test_read_csv_engine(self):
+        """Ensure faster engine gives same result as python engine"""
+        debug.trace(4, "test_read_csv_engine()")
+        temp_file = gh.get_temp_file()
+        system.write_file(temp_file, "# comment\nname\tvalue\n\"a\t1\nb\t\nc\t3\t4\n#d\t5\n")
+        assert THE_MODULE.sniff_delimiter(temp_file, {"comment": "#"}) == "\t"
+        assert THE_MODULE.get_csv_engine({THE_MODULE.SEP: "\t", "comment": "#"}) == "c"
+        assert THE_MODULE.get_csv_engine({THE_MODULE.SEP: None}) == "python"
+        tab_kw = {THE_MODULE.SEP: "\t", "comment": "#", "quoting": csv.QUOTE_NONE}
+        assert not THE_MODULE.may_have_missing_fields(temp_file, tab_kw)
+        df = THE_MODULE.read_csv(temp_file, sep="\t")
+        assert df.equals(THE_MODULE.read_csv(temp_file, sep="\t", engine="python"))
+        assert df.values.tolist() == [['"a', '1'], ['b', '']]
+        # note: missing fields should be NaN as with python engine (n.b., not "" as with c)
+        for extra in ["d\n", "d#\te\n"]:
+            system.write_file(temp_file, "name\tvalue\na\t1\n" + extra)
+            assert THE_MODULE.may_have_missing_fields(temp_file, tab_kw)
+            df = THE_MODULE.read_csv(temp_file, sep="\t")
+            assert df.equals(THE_MODULE.read_csv(temp_file, sep="\t", engine="python"))
+            assert pd.isna(df["value"][1])
+        assert not THE_MODULE.may_have_missing_fields(f"{self.path}/../examples/iris.csv", {THE_MODULE.SEP: ","})
+        chunks = list(THE_MODULE.read_csv(f"{self.path}/../examples/iris.csv", chunksize=100))
+        assert [len(chunk) for chunk in chunks] == [100, 50]
+
+    def test_read_csv_infer_dtypes(self, monkeypatch):
+        """Ensure type inference from sample, including fallback to str"""
+        debug.trace(4, "test_read_csv_infer_dtypes()")
+        tf = THE_MODULE.read_csv(f"{self.path}/../examples/iris.csv", infer_dtypes=True)
+        assert tf["sepal_length"].dtype == float
+        assert isinstance(tf["class"].dtype, pd.CategoricalDtype)
+        monkeypatch.setattr(THE_MODULE, "DTYPE_SAMPLE_ROWS", 2)
+        temp_file = gh.get_temp_file()
+        system.write_file(temp_file, "num,text\n1,a\n2,b\nn/a,c\n")
+        df = THE_MODULE.read_csv(temp_file, infer_dtypes=True)
+        assert df["num"].tolist() == ["1", "2", "n/a"]
+
+    def test_lookup_df_value_cache(self):
+        """Ensure lookup_df_value cache is opt-in and reflects added rows"""
+        debug.trace(4, "test_lookup_df_value_cache()")
+        df = pd.DataFrame({"key": ["a", "b", "a"], "value": [1, 2, 3]})
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "a", use_cache=True) == 1
+        df.loc[3] = ["c", 4]
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "c", use_cache=True) == 4
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "c") == 4
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "d", use_cache=True) is None
+        # note: in-place edits are only seen by default (uncached) lookup
+        df.loc[0, "key"] = "z"
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "a") == 3
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "z") == 1
+        THE_MODULE.clear_lookup_cache()
+        assert THE_MODULE.lookup_df_value(df, "value", "key", "a", use_cache=True) == 3
+
     def test_main(self, capsys):
         """Ensure main works as expected"""
         debug.trace(4, "main()")
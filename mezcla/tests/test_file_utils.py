@@ -10,8 +10,10 @@
 """Tests for file_utils module"""
 
 # Standard packages
+import io
 import json
 import re
+import tracemalloc
 
 # Installed packages
 import pytest
@@ -109,6 +111,41 @@ class TestFileUtils(TestWrapper):
         THE_MODULE.jsonl_to_json(in_file, out_file)
         assert(json.loads(system.read_file(out_file)) == sample_array)
 
+    def test_iter_json_array(self):
+        """Tests for iter_json_array over small blocks"""
+        debug.trace(4, "test_iter_json_array()")
+        sample_array = [1.5e-07, -12, {"a": ["b, ]", None]}, "", [], True]
+        for block_size in [1, 2, 3, 64]:
+            in_file = io.StringIO(" [ " + " ,\n".join(map(json.dumps, sample_array)) + "]\n")
+            assert list(THE_MODULE.iter_json_array(in_file, block_size=block_size)) == sample_array
+        for bad_json in ["[1, 2", "[1,]", "[1 2]", "[1] 2", "{}"]:
+            with pytest.raises(ValueError):
+                list(THE_MODULE.iter_json_array(io.StringIO(bad_json), block_size=2))
+
+    def test_json_conversion_memory(self):
+        """Make sure JSON to JSONL conversion and back use bounded memory"""
+        debug.trace(4, "test_json_conversion_memory()")
+        json_file = gh.form_path(self.temp_base, "large.json")
+        jsonl_file = gh.form_path(self.temp_base, "large.jsonl")
+        items = [{"id": i, "text": f"item {i} " * 5, "values": [i, i / 3]} for i in range(50000)]
+        system.write_file(json_file, json.dumps(items))
+        file_size = len(system.read_file(json_file))
+        del items
+        for (convert, in_file, out_file) in [(THE_MODULE.json_to_jsonl, json_file, jsonl_file),
+                                             (THE_MODULE.jsonl_to_json, jsonl_file, json_file + ".new")]:
+            tracemalloc.start()
+            convert(in_file, out_file)
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            debug.trace_expr(4, convert, file_size, peak)
+            assert peak < file_size / 10
+        assert len(system.read_lines(jsonl_file)) == 50000
+        assert json.loads(system.read_file(json_file + ".new")) == json.loads(system.read_file(json_file))
+        # note: output not created if malformed
+        system.write_file(json_file, "[1, 2, 3, x]")
+        THE_MODULE.json_to_jsonl(json_file, gh.form_path(self.temp_base, "bad.jsonl"))
+        assert not system.file_exists(gh.form_path(self.temp_base, "bad.jsonl"))
+
 
 #------------------------------------------------------------------------
 
@@ -14,7 +14,8 @@
 """Tests for filter_random module"""
 
 # Standard packages
-## NOTE: this is empty for now
+import io
+import random
 
 # Installed packages
 import pytest
@@ -46,10 +47,10 @@ class TestFilterRandom(TestWrapper):
         gh.write_lines(self.temp_file, data)
         return
     
-    def run_data_file_test(self, ratio, data_file_path, expected_output):
+    def run_data_file_test(self, ratio, data_file_path, expected_output, extra_options=""):
         """Run script to include RATIO of DATA_FILE lines with EXPECTED_OUTPUT"""
         debug.trace(5, f"run_data_file_test({self}, {ratio}, {data_file_path}, {expected_output})")
-        script_output = self.run_script(options=f"--ratio {ratio} --quiet --seed 13",
+        script_output = self.run_script(options=f"--ratio {ratio} --quiet --seed 13 {extra_options}",
                                         data_file=data_file_path)
         actual_output = script_output.strip()
         expected_output = expected_output.strip()
@@ -75,6 +76,48 @@ class TestFilterRandom(TestWrapper):
         self.setUp()
         return self.run_data_file_test(1.0, self.temp_file, temp_file_contents)
 
+    def test_fast_filter_none(self):
+        """Makes sure no lines are filtered out with ratio 1.0 in fast mode"""
+        debug.trace(4, f"TestFilterRandom.test_fast_filter_none({self})")
+        temp_file_contents = system.read_file(self.temp_file)
+        return self.run_data_file_test(1.0, self.temp_file, temp_file_contents,
+                                       extra_options="--fast")
+
+    def test_fast_include_header(self):
+        """Makes sure header retained when all other lines filtered in fast mode"""
+        debug.trace(4, f"TestFilterRandom.test_fast_include_header({self})")
+        return self.run_data_file_test(0.0, self.temp_file, "0\n",
+                                       extra_options="--fast --include-header")
+
+    def test_block_sampler(self):
+        """Makes sure BlockSampler handles lines spanning blocks and is reproducible"""
+        debug.trace(4, f"TestFilterRandom.test_block_sampler({self})")
+        data = "".join(f"line {i}\n" for i in range(10000)).encode()
+        def sample(ratio, seed, block_size):
+            """Returns lines sampled from DATA"""
+            out_stream = io.BytesIO()
+            sampler = THE_MODULE.BlockSampler(ratio, block_size=block_size,
+                                              rng=random.Random(seed))
+            num_kept = sampler.sample(io.BytesIO(data), out_stream)
+            lines = out_stream.getvalue().decode().splitlines()
+            assert num_kept == len(lines)
+            return lines
+        all_lines = sample(1.0, 13, 7)
+        assert all_lines == data.decode().splitlines()
+        assert not sample(0.0, 13, 7)
+        some_lines = sample(0.1, 13, 7)
+        assert some_lines == sample(0.1, 13, 64 * 1024)
+        assert 800 < len(some_lines) < 1200
+        assert set(some_lines) <= set(all_lines)
+        assert some_lines != sample(0.1, 17, 7)
+
+    def test_block_sampler_no_final_newline(self):
+        """Makes sure final line without newline gets one"""
+        debug.trace(4, f"TestFilterRandom.test_block_sampler_no_final_newline({self})")
+        out_stream = io.BytesIO()
+        THE_MODULE.BlockSampler(1.0, block_size=2).sample(io.BytesIO(b"a\nbcd"), out_stream)
+        assert out_stream.getvalue() == b"a\nbcd\n"
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
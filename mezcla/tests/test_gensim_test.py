@@ -79,6 +79,14 @@ class TestGensimTest(TestWrapper):
         return
 
     
+def get_test_documents(num_docs=45):
+    """Returns NUM_DOCS lines of text with overlapping vocabulary (e.g., for similarity tests)"""
+    words = ("apple banana cherry dog cat fleas sky blue red green "
+             "house tree river stone light night").split()
+    return [" ".join(words[(i * k + k) % len(words)] for k in range(1, 3 + (i % 5))) + f", item {i % 7}."
+            for i in range(num_docs)]
+
+
 class TestGensimTest2:
      """Class for internal testcase definitions"""
 
@@ -88,7 +96,90 @@ class TestGensimTest2:
          corpus = THE_MODULE.CorpusData(__file__)
          # note: currently 81 unique tokens extracted
          assert len(list(corpus)) > 50
-   
+
+     @pytest.mark.skipif(not gensim, reason="gensim module missing")
+     @pytest.mark.parametrize("num_workers", [1, 2])
+     def test_build_corpus(self, num_workers, monkeypatch, tmp_path):
+         """Make sure single-pass build matches the original dictionary and vectors"""
+         monkeypatch.setattr(THE_MODULE, "BUILD_WORKERS", num_workers)
+         monkeypatch.setattr(THE_MODULE, "BUILD_CHUNK_SIZE", 7)
+         data_file = tmp_path / "docs.txt"
+         lines = get_test_documents()
+         data_file.write_text("\n".join(lines) + "\n")
+         # note: reference uses original dictionary creation (i.e., not build_corpus)
+         reference = THE_MODULE.CorpusData(text=str(data_file), in_memory=False)
+         expected_mm = [reference.dictionary.doc2bow(tokens) for tokens in reference.read_corpus_files()]
+         mm_file = str(tmp_path / "docs.bow.mm")
+         corpus_data = THE_MODULE.CorpusData(text=str(data_file), mm_file=mm_file)
+         assert corpus_data.dictionary.token2id == reference.dictionary.token2id
+         assert corpus_data.dictionary.dfs == reference.dictionary.dfs
+         assert corpus_data.dictionary.cfs == reference.dictionary.cfs
+         assert len(corpus_data) == corpus_data.num_docs == len(lines)
+         assert gh.non_empty_file(mm_file + ".index")
+         assert [[(i, int(c)) for (i, c) in v] for v in corpus_data] == expected_mm
+         assert [(i, int(c)) for (i, c) in corpus_data[30]] == expected_mm[30]
+         # note: pruning should remap the saved vectors
+         corpus_data.filter_extremes(no_below=2, no_above=1.0)
+         vector = corpus_data[30]
+         assert vector and all(corpus_data.dictionary.dfs[i] >= 2 for (i, _c) in vector)
+
+     @pytest.mark.skipif(not gensim, reason="gensim module missing")
+     @pytest.mark.parametrize("backend", ["sparse", "dense"])
+     def test_find_batch(self, backend, monkeypatch, tmp_path):
+         """Make sure batched similarity matches per-document find"""
+         monkeypatch.setattr(THE_MODULE, "SIMILARITY_BACKEND", backend)
+         monkeypatch.setattr(THE_MODULE, "SIMILARITY_SHARD_SIZE", 7)
+         monkeypatch.setattr(THE_MODULE, "SIMILARITY_QUERY_BATCH", 5)
+         data_file = tmp_path / "docs.txt"
+         data_file.write_text("\n".join(get_test_documents()) + "\n")
+         corpus_data = THE_MODULE.CorpusData(text=str(data_file))
+         corpus = list(corpus_data)
+         sim = THE_MODULE.SimilarDocumentByCosine(corpus=corpus, dictionary=corpus_data.dictionary,
+                                                  index_file=str(tmp_path / "sim_index"), max_similar=4)
+         batch_results = sim.find_batch(list(range(len(corpus))))
+         for docid, similar_docs in enumerate(batch_results):
+             expected = sim.find(docid)
+             scores = sorted(s for (_d, s) in similar_docs)
+             expected_scores = sorted(s for (_d, s) in expected)
+             assert len(scores) == len(expected_scores)
+             assert all(abs(s1 - s2) < 1e-4 for (s1, s2) in zip(scores, expected_scores))
+             # note: documents tied with k-th score can differ, so only those above are checked
+             min_score = expected_scores[0] + 1e-4
+             assert ({d for (d, s) in similar_docs if s > min_score}
+                     == {d for (d, s) in expected if s > min_score})
+         assert [s for (_d, s) in sim.find_all_similar()] == batch_results
+
+     @pytest.mark.skipif(not gensim, reason="gensim module missing")
+     def test_derive_all_similarities(self, tmp_path):
+         """Make sure all-pairs similarities are streamed to file"""
+         data_file = tmp_path / "docs.txt"
+         data_file.write_text("my dog has fleas\nmy cat has fleas\nthe sky is blue\n")
+         corpus_data = THE_MODULE.CorpusData(text=str(data_file))
+         sim = THE_MODULE.SimilarDocumentByCosine(corpus=list(corpus_data), dictionary=corpus_data.dictionary,
+                                                  index_file=str(tmp_path / "sim_index"))
+         output_file = str(tmp_path / "similarities.txt")
+         sim.derive_all_similarities(output_file)
+         output_lines = gh.read_lines(output_file)
+         assert len(output_lines) == 3
+         # note: cosine of 0.8 for first two documents normalized to 0.9
+         assert re.search(r"^0\t0:1\.0+ 1:0\.90* ", output_lines[0])
+         assert output_lines[2].startswith("2\t2:1.0")
+
+     @pytest.mark.skipif(not gensim, reason="gensim module missing")
+     def test_main_temp_matrix(self, monkeypatch, tmp_path):
+         """Make sure temporary matrix cleanup leaves files sharing TEMP_BASE prefix alone"""
+         data_file = tmp_path / "docs.txt"
+         data_file.write_text("my dog has fleas\nmy cat has fleas\nthe sky is blue\n")
+         temp_dir = tmp_path / "temp"
+         temp_dir.mkdir()
+         monkeypatch.setattr(THE_MODULE, "TEMP_BASE", str(tmp_path / "docs"))
+         monkeypatch.setattr(THE_MODULE.tempfile, "tempdir", str(temp_dir))
+         # note: temp files are kept when detailed debugging (e.g., due to level set by other tests)
+         monkeypatch.setattr(THE_MODULE.tpo, "detailed_debugging", lambda: False)
+         THE_MODULE.main(["--print", str(data_file)])
+         assert data_file.exists()
+         assert not list(temp_dir.iterdir())
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
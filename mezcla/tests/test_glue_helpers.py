@@ -205,6 +205,62 @@ class TestGlueHelpers(TestWrapper):      ## TODO: (TestWrapper)
         debug.trace(4, "test_run()")
         assert "root" in THE_MODULE.run("ls /")
 
+    def test_run_environment(self):
+        """Ensure run passes environment overrides without modifying os.environ"""
+        debug.trace(4, "test_run_environment()")
+        self.monkeypatch.delenv("GH_TEST_VAR", raising=False)
+        self.monkeypatch.setattr(THE_MODULE, "TEMP_FILE", "/tmp/gh-test")
+        self.monkeypatch.setattr(THE_MODULE, "PRESERVE_TEMP_FILE", None)
+        assert THE_MODULE.run("printenv GH_TEST_VAR", env_overrides={"GH_TEST_VAR": "a b"}) == "a b"
+        assert THE_MODULE.run("echo $GH_TEST_VAR", env_overrides={"GH_TEST_VAR": "c"}) == "c"
+        assert THE_MODULE.run("printenv TEMP_FILE") == "/tmp/gh-test_subprocess_"
+        assert "GH_TEST_VAR" not in os.environ
+        assert os.environ.get("TEMP_FILE") != "/tmp/gh-test_subprocess_"
+
+    def test_get_direct_command_args(self):
+        """Ensure only commands without shell syntax are run directly"""
+        debug.trace(4, "test_get_direct_command_args()")
+        assert THE_MODULE.get_direct_command_args("ls -l '/tmp dir'") == ["ls", "-l", "/tmp dir"]
+        for command in ["ls | wc", "ls > out", "echo hey", "cd /", "X=1 ls", "ls *.py",
+                        "ls $HOME", "ls 'unbalanced", "no-such-command-xyz"]:
+            assert THE_MODULE.get_direct_command_args(command) is None
+        self.monkeypatch.setattr(THE_MODULE, "RUN_WITHOUT_SHELL", False)
+        assert THE_MODULE.get_direct_command_args("ls") is None
+        # note: errors are reported as with the shell
+        assert "no-such-command-xyz" in THE_MODULE.run("no-such-command-xyz")
+        assert "no-such-file-xyz" in THE_MODULE.run("ls no-such-file-xyz")
+
+    def test_run_command_shell_fallback(self):
+        """Ensure scripts without shebang line get run via shell (n.b., exec format error if direct)"""
+        debug.trace(4, "test_run_command_shell_fallback()")
+        script = gh.get_temp_file() + ".sh"
+        system.write_file(script, "echo no shebang\n")
+        os.chmod(script, 0o755)
+        assert THE_MODULE.get_direct_command_args(script) == [script]
+        assert THE_MODULE.run(script) == "no shebang"
+        assert THE_MODULE.run_command(script, wait=False) == "0"
+        # note: wait status is as with os.system (i.e., exit code in high byte)
+        for command in ["false", "exit 3"]:
+            assert THE_MODULE.run_command(command, wait=False) == str(os.system(command))
+
+    def test_get_subprocess_env(self):
+        """Ensure subprocess TEMP_BASE directory is recreated if removed"""
+        debug.trace(4, "test_get_subprocess_env()")
+        self.monkeypatch.setattr(THE_MODULE, "TEMP_BASE", gh.get_temp_file() + "_dir/")
+        for _i in range(2):
+            sub_temp_base = THE_MODULE.get_subprocess_env()["TEMP_BASE"]
+            assert system.is_directory(sub_temp_base)
+            THE_MODULE.delete_directory(sub_temp_base)
+
+    def test_run_many(self):
+        """Ensure run_many returns output in order of commands"""
+        debug.trace(4, "test_run_many()")
+        commands = [f"sleep 0.{9 - i}" if (i % 2) else f"printf {i}" for i in range(10)]
+        commands[1] = "printenv GH_TEST_VAR"
+        output = THE_MODULE.run_many(commands, max_workers=4, env_overrides={"GH_TEST_VAR": "x"})
+        assert output == ["0", "x", "2", "", "4", "", "6", "", "8", ""]
+        assert THE_MODULE.run_many([]) == []
+
     def test_issue(self):
         """Ensure issue works as expected"""
         debug.trace(4, "test_issue()")
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+#
+# Test(s) for ../google_word2vec.py
+#
+# Notes:
+# - This can be run as follows:
+#   $ PYTHONPATH=".:$PYTHONPATH" python ./mezcla/tests/test_google_word2vec.py
+#
+
+"""Tests for google_word2vec module"""
+
+# Standard packages
+## NOTE: this is empty for now
+
+# Installed packages
+import pytest
+
+# Local packages
+from mezcla import debug
+
+# Note: Two references are used for the module to be tested:
+#    THE_MODULE:	    global module object
+# note: The gensim module is not installed by default, so tests skipped if not found
+try:
+    import gensim
+    import mezcla.google_word2vec as THE_MODULE
+except:
+    debug.trace_exception(3, "importing google_word2vec")
+    gensim = None
+    THE_MODULE = None
+
+class TestGoogleWord2vec:
+    """Class for testcase definition"""
+
+    @pytest.mark.skipif(not gensim, reason="gensim module missing")
+    def test_sentence_cache(self, monkeypatch, tmp_path):
+        """Make sure cached sentences match MySentences over multiple epochs and the cache is reused"""
+        debug.trace(4, "test_sentence_cache()")
+        monkeypatch.setattr(THE_MODULE, "CACHE_BLOCK_SIZE", 2)
+        data_dir = tmp_path / "docs"
+        data_dir.mkdir()
+        (data_dir / "a.txt").write_text("My dog has fleas.\nMy cat has fleas too!\n\nThe end\n")
+        (data_dir / "b.txt").write_text("Dogs, cats and fleas.\nThe sky is blue\n")
+        expected = list(THE_MODULE.MySentences(str(data_dir)))
+        assert len(expected) == 6
+        basename = str(tmp_path / "docs-cache")
+        cache = THE_MODULE.SentenceCache(basename).load(str(data_dir))
+        assert len(cache) == len(expected)
+        for _epoch in range(2):
+            assert list(cache) == expected
+
+        # Make sure cache used if input unchanged
+        def no_build(*_args, **_kwargs):
+            """Fails if called"""
+            raise AssertionError("cache unexpectedly rebuilt")
+        monkeypatch.setattr(THE_MODULE.SentenceCache, "build", no_build)
+        cache = THE_MODULE.SentenceCache(basename).load(str(data_dir))
+        for _epoch in range(2):
+            assert list(cache) == expected
+
+#------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    debug.trace_current_context()
+    pytest.main([__file__])
@@ -13,14 +13,19 @@
 """Tests for html_utils module"""
 
 # Standard packages
+import hashlib
+import http.server
+import os
 import re
+import threading
+import time
 
 # Installed packages
 import pytest
 ## OLD: import bs4
 
 # Local packages
-from mezcla.unittest_wrapper import TestWrapper
+from mezcla.unittest_wrapper import TestWrapper, get_temp_dir
 from mezcla import debug
 from mezcla import system
 from mezcla import glue_helpers as gh
@@ -35,6 +40,80 @@ import mezcla.html_utils as THE_MODULE
 TEST_SELENIUM = system.getenv_bool("TEST_SELENIUM", False,
                                    "Include tests requiring selenium")
 
+#-------------------------------------------------------------------------------
+# Local HTTP server fixture
+
+class LocalRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves files from temp dir, with optional transient failures and delays
+    Notes:
+    - Paths starting with /flaky fail with 503 for the first request.
+    - Paths starting with /etag use ETag validation (i.e., If-None-Match).
+    """
+    protocol_version = "HTTP/1.1"       # allow keep-alive
+    disable_nagle_algorithm = True      # avoid delayed-ACK stalls with keep-alive
+    failed_paths = set()
+    active_requests = 0
+    max_active_requests = 0
+    counter_lock = threading.Lock()
+    delay = 0
+    status_codes = []
+
+    def send_response(self, code, message=None):
+        """Record status CODE and send it"""
+        LocalRequestHandler.status_codes.append(code)
+        super().send_response(code, message)
+
+    def send_etag_document(self):
+        """Send file with ETag header (or 304 if unchanged)"""
+        data = system.read_binary_file(self.translate_path(self.path))
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        """Handle GET request"""
+        cls = LocalRequestHandler
+        with cls.counter_lock:
+            cls.active_requests += 1
+            cls.max_active_requests = max(cls.max_active_requests, cls.active_requests)
+        try:
+            time.sleep(cls.delay)
+            if self.path.startswith("/flaky") and (self.path not in cls.failed_paths):
+                cls.failed_paths.add(self.path)
+                self.send_error(503)
+            elif self.path.startswith("/etag"):
+                self.send_etag_document()
+            else:
+                super().do_GET()
+        finally:
+            with cls.counter_lock:
+                cls.active_requests -= 1
+
+    def log_message(self, format, *args):       # pylint: disable=redefined-builtin
+        """Disable request logging"""
+        debug.trace(7, f"log_message({format}, {args})")
+
+
+def start_local_server(directory):
+    """Start HTTP server for DIRECTORY in background thread, returning server and base URL"""
+    handler = lambda *args, **kwargs: LocalRequestHandler(*args, directory=directory, **kwargs)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    debug.trace(5, f"start_local_server({directory}) => {base_url}")
+    return server, base_url
+
+#-------------------------------------------------------------------------------
+
 class TestHtmlUtils(TestWrapper):
     """Class for testcase definition"""
     script_module = TestWrapper.get_testing_module_name(__file__)
@@ -272,6 +351,159 @@ class TestHtmlUtils(TestWrapper):
         debug.trace(4, "test_retrieve_web_document()")
         assert re.search("Scrappy.*Cito", THE_MODULE.retrieve_web_document("www.tomasohara.trade")) 
 
+    def test_download_web_documents(self):
+        """Ensure download_web_documents fetches from local server in order"""
+        debug.trace(4, "test_download_web_documents()")
+        serve_dir = get_temp_dir(unique=True)
+        download_dir = get_temp_dir(unique=True)
+        for i in range(20):
+            system.write_file(gh.form_path(serve_dir, f"doc{i}.html"), f"<p>document {i}</p>")
+        system.write_file(gh.form_path(serve_dir, "flaky.html"), "<p>eventually</p>")
+        server, base_url = start_local_server(serve_dir)
+        try:
+            urls = [f"{base_url}/doc{i}.html" for i in range(20)]
+            urls += [f"{base_url}/missing.html", f"{base_url}/flaky.html"]
+            local_files = THE_MODULE.download_web_documents(
+                urls, max_workers=4, download_dir=download_dir, backoff=0.01, ignore=True)
+        finally:
+            server.shutdown()
+        assert len(local_files) == len(urls)
+        for i in range(20):
+            assert system.read_file(local_files[i]).strip() == f"<p>document {i}</p>"
+        assert local_files[20] is None
+        assert system.read_file(local_files[21]).strip() == "<p>eventually</p>"
+
+    def test_download_web_documents_shared_basename(self):
+        """Ensure download_web_documents keeps URLs with same basename apart"""
+        debug.trace(4, "test_download_web_documents_shared_basename()")
+        serve_dir = get_temp_dir(unique=True)
+        download_dir = get_temp_dir(unique=True)
+        for subdir in ["a", "b", "c"]:
+            gh.full_mkdir(gh.form_path(serve_dir, subdir))
+            system.write_file(gh.form_path(serve_dir, subdir, "index.html"), f"<p>{subdir}</p>")
+        server, base_url = start_local_server(serve_dir)
+        try:
+            urls = [f"{base_url}/{subdir}/index.html" for subdir in ["a", "b", "c", "a"]]
+            local_files = THE_MODULE.download_web_documents(urls, max_workers=4, download_dir=download_dir)
+        finally:
+            server.shutdown()
+        assert len(set(local_files)) == 3
+        assert local_files[0] == local_files[3]
+        for (subdir, local_file) in zip(["a", "b", "c"], local_files):
+            assert system.read_file(local_file).strip() == f"<p>{subdir}</p>"
+        assert sorted(os.listdir(download_dir)) == sorted(map(gh.basename, local_files[:3]))
+
+    def test_download_web_documents_host_limit(self):
+        """Ensure download_web_documents respects per-host limit"""
+        debug.trace(4, "test_download_web_documents_host_limit()")
+        serve_dir = get_temp_dir(unique=True)
+        for i in range(12):
+            system.write_file(gh.form_path(serve_dir, f"doc{i}.txt"), str(i))
+        server, base_url = start_local_server(serve_dir)
+        LocalRequestHandler.max_active_requests = 0
+        LocalRequestHandler.delay = 0.05
+        try:
+            local_files = THE_MODULE.download_web_documents(
+                [f"{base_url}/doc{i}.txt" for i in range(12)], max_workers=8, per_host_limit=2,
+                download_dir=get_temp_dir(unique=True))
+        finally:
+            LocalRequestHandler.delay = 0
+            server.shutdown()
+        assert all(local_files)
+        assert 1 <= LocalRequestHandler.max_active_requests <= 2
+
+    def test_download_cache(self):
+        """Ensure DownloadCache revalidates, separates same-named documents, and evicts"""
+        debug.trace(4, "test_download_cache()")
+        serve_dir = get_temp_dir(unique=True)
+        for subdir in ["a", "b"]:
+            gh.full_mkdir(gh.form_path(serve_dir, subdir))
+            system.write_file(gh.form_path(serve_dir, subdir, "doc.html"), f"<p>{subdir}</p>")
+        system.write_file(gh.form_path(serve_dir, "etag.html"), "<p>tagged</p>")
+        server, base_url = start_local_server(serve_dir)
+        status_codes = LocalRequestHandler.status_codes
+        try:
+            cache = THE_MODULE.DownloadCache(get_temp_dir(unique=True), max_size=1000, ttl=60)
+            url_a, url_b = f"{base_url}/a/doc.html", f"{base_url}/b/doc.html"
+            assert cache.fetch(url_a).strip() == b"<p>a</p>"
+            assert cache.fetch(url_b).strip() == b"<p>b</p>"
+            # Fresh entries don't involve requests
+            num_requests = len(status_codes)
+            assert cache.fetch(url_a).strip() == b"<p>a</p>"
+            assert len(status_codes) == num_requests
+            # Stale entries revalidated via Last-Modified
+            assert cache.fetch(url_a, ttl=0).strip() == b"<p>a</p>"
+            assert status_codes[-1] == 304
+            # Modified document gets refreshed
+            path_a = gh.form_path(serve_dir, "a", "doc.html")
+            system.write_file(path_a, "<p>new a</p>")
+            os.utime(path_a, (time.time() + 10, time.time() + 10))
+            assert cache.fetch(url_a, ttl=0).strip() == b"<p>new a</p>"
+            assert status_codes[-1] == 200
+            # ETag validation
+            url_tag = f"{base_url}/etag.html"
+            assert cache.fetch(url_tag).strip() == b"<p>tagged</p>"
+            assert cache.index[url_tag]["etag"]
+            assert cache.fetch(url_tag, ttl=0).strip() == b"<p>tagged</p>"
+            assert status_codes[-1] == 304
+            # Least recently used entry evicted
+            cache.max_size = 30
+            cache.fetch(url_a)
+            cache.evict()
+            cache.save_index()
+            assert url_a in cache.index
+            assert url_b not in cache.index
+            # Index persists
+            assert THE_MODULE.DownloadCache(cache.cache_dir).index.keys() == cache.index.keys()
+        finally:
+            server.shutdown()
+
+    def test_download_cache_index_updates(self):
+        """Ensure DownloadCache batches index writes for hits and evicts shared bodies once unreferenced"""
+        debug.trace(4, "test_download_cache_index_updates()")
+        self.monkeypatch.setattr(THE_MODULE, "HTTP_CACHE_SAVE_INTERVAL", 3)
+        cache = THE_MODULE.DownloadCache(get_temp_dir(unique=True), max_size=1000, ttl=60)
+        for (i, url) in enumerate(["u1", "u2", "u3", "u4"]):
+            cache.store(url, (b"same" if (i < 2) else f"doc{i}".encode()), {})
+            cache.index[url]["last_access"] = [0, 3, 1, 2][i]
+        num_saves = []
+        save_index = cache.save_index
+        self.monkeypatch.setattr(cache, "save_index", lambda: (num_saves.append(1), save_index()))
+        for _i in range(5):
+            assert cache.fetch("u4") == b"doc3"
+        assert len(num_saves) == 1
+        cache.close()
+        assert len(num_saves) == 2
+        assert THE_MODULE.DownloadCache(cache.cache_dir).index["u4"]["last_access"] == cache.index["u4"]["last_access"]
+        # note: "same" body shared by u1 and u2 is only counted once (i.e., 12 bytes total)
+        same_path = cache.object_path(cache.index["u1"]["hash"])
+        doc2_path = cache.object_path(cache.index["u3"]["hash"])
+        cache.max_size = 11
+        cache.evict()
+        assert sorted(cache.index) == ["u2", "u4"]
+        assert system.file_exists(same_path)
+        assert not system.file_exists(doc2_path)
+
+    def test_download_web_document_http_cache(self):
+        """Ensure download_web_document keeps same-named documents apart via HTTP cache"""
+        debug.trace(4, "test_download_web_document_http_cache()")
+        serve_dir = get_temp_dir(unique=True)
+        for subdir in ["a", "b"]:
+            gh.full_mkdir(gh.form_path(serve_dir, subdir))
+            system.write_file(gh.form_path(serve_dir, subdir, "doc.html"), f"<p>{subdir}</p>")
+        server, base_url = start_local_server(serve_dir)
+        self.monkeypatch.setattr(THE_MODULE, "USE_HTTP_CACHE", True)
+        download_dir = get_temp_dir(unique=True)
+        try:
+            for subdir in ["a", "b", "a"]:
+                meta_hash = {}
+                doc = THE_MODULE.download_web_document(f"{base_url}/{subdir}/doc.html", download_dir=download_dir,
+                                                       meta_hash=meta_hash, use_cached=True)
+                assert doc.strip() == f"<p>{subdir}</p>"
+                assert system.read_file(meta_hash[THE_MODULE.FILENAME]) == doc
+        finally:
+            server.shutdown()
+
     def test_init_BeautifulSoup(self):
         """Ensure init_BeautifulSoup() works as expected"""
         debug.trace(4, "test_init_BeautifulSoup()")
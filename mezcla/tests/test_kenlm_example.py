@@ -39,6 +39,7 @@
 
 # Standard packages
 import ast
+import io
 
 # Installed packages
 ## OLD: import re
@@ -70,6 +71,28 @@ kenlm_example_path = gh.resolve_path("kenlm_example.py", heuristic=True)
 ## NOTE: lmplz might just be needed for train_language_model.py
 HAS_KENLM_UTILS = gh.run("which lmplz")
 
+# Tiny bigram model for batch-mode tests
+TINY_ARPA = """
+\\data\\
+ngram 1=5
+ngram 2=4
+
+\\1-grams:
+-1.0\t<unk>\t0
+-99\t<s>\t-0.30103
+-0.69897\t</s>\t0
+-0.5\tthe\t-0.30103
+-0.5\tdog\t-0.30103
+
+\\2-grams:
+-0.3\t<s> the
+-0.3\tthe dog
+-0.3\tdog </s>
+-0.4\tthe </s>
+
+\\end\\
+"""
+
 
 @pytest.mark.skipif(not THE_MODULE, reason="Problem loading kenlm_example.py: check requirements")
 class TestKenlmExample(TestWrapper):
@@ -260,6 +283,45 @@ class TestKenlmExample(TestWrapper):
         assert (count_precision(normalized_score) == PRECISION_VALUE)
         return
 
+    def test_batch_mode(self):
+        """Make sure batch mode scores sentences from files in input order"""
+        debug.trace(4, f"test_batch_mode(); self={self}")
+        lm_file = gh.form_path(self.temp_base, "tiny.arpa")
+        system.write_file(lm_file, TINY_ARPA)
+        data_file = gh.form_path(self.temp_base, "sentences.txt")
+        system.write_lines(data_file, ["the dog", "", "dog the cat", "the"])
+        output = self.run_script(env_options=f"BATCH_MODE=1 SCORE_WORKERS=2 SCORE_CHUNK_SIZE=1 LM={lm_file}",
+                                 data_file=data_file)
+        rows = [line.split("\t") for line in output.splitlines()]
+        self.do_assert(rows[0] == ["score", "normalized", "perplexity", "oov", "sentence"])
+        self.do_assert([row[3:] for row in rows[1:]] == [["0", "the dog"], ["1", "dog the cat"], ["0", "the"]])
+        # note: P(the|<s>) * P(dog|the) * P(</s>|dog)
+        self.do_assert(abs(float(rows[1][0]) - -0.9) < 1e-3)
+        self.do_assert(abs(float(rows[1][2]) - 10 ** 0.3) < 1e-3)
+
+    def test_batch_score(self):
+        """Make sure batch_score agrees with direct model scoring"""
+        debug.trace(4, f"test_batch_score(); self={self}")
+        lm_file = gh.form_path(self.temp_base, "tiny.arpa")
+        system.write_file(lm_file, TINY_ARPA)
+        self.monkeypatch.setattr(THE_MODULE, "LM", lm_file)
+        model = THE_MODULE.load_model(lm_file)
+        sentences = ["the dog", "the cat", "dog dog the", "cat"] * 3
+        for num_workers in [1, 2]:
+            results = list(THE_MODULE.batch_score(sentences, num_workers=num_workers, chunk_size=2))
+            self.do_assert([r[0] for r in results] == sentences)
+            for (sentence, score, num_words, num_oov) in results:
+                self.do_assert(abs(score - model.score(sentence)) < 1e-4)
+                self.do_assert(abs(THE_MODULE.perplexity(score, num_words) - model.perplexity(sentence)) < 1e-3)
+                self.do_assert(num_oov == sentence.split().count("cat"))
+
+    def test_read_sentences(self):
+        """Make sure sentences split across read blocks are intact"""
+        debug.trace(4, f"test_read_sentences(); self={self}")
+        stream = io.StringIO("a b||c||  ||d e f||")
+        self.monkeypatch.setattr(THE_MODULE, "READ_BLOCK_SIZE", 3)
+        self.do_assert(list(THE_MODULE.read_sentences(stream, delim="||")) == ["a b", "c", "d e f"])
+
     @pytest.mark.xfail
     @pytest.mark.skipif(not HAS_KENLM_UTILS, reason="KenLM utilities needed")
     def test_kenlm_utils(self):
@@ -30,6 +30,7 @@
 # Standard modules
 ## TODO: from collections import defaultdict
 import atexit
+import os
 ## OLD: from collections.abc import Iterable
 
 # Installed modules
@@ -215,6 +216,183 @@ class TestIt(TestWrapper):
         debug.trace_expr(5, num_found, num_total, pct_75)
         assert(num_found >= pct_75)
 
+    def test_06_index_manifest(self):
+        """Make sure manifest detects unchanged files and restricts paths by directory"""
+        debug.trace(4, f"test_06_index_manifest(): self={self}")
+        index_dir = gh.form_path(self.temp_base, "manifest-index")
+        gh.full_mkdir(index_dir)
+        doc_path = gh.form_path(self.temp_base, "doc.txt")
+        system.write_file(doc_path, "Some text to index")
+        manifest = THE_MODULE.IndexManifest(index_dir)
+        stat = os.stat(doc_path)
+        assert not manifest.is_unchanged(doc_path, stat)
+        manifest.entries[doc_path] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                                      "hash": THE_MODULE.get_file_hash(doc_path),
+                                      "chunk_ids": [f"{doc_path}#0"]}
+        sub_path = gh.form_path(self.temp_base, "subdir", "other.txt")
+        manifest.entries[sub_path] = {"size": 0, "mtime": 0, "hash": "", "chunk_ids": []}
+        manifest.save()
+        manifest = THE_MODULE.IndexManifest(index_dir)
+        assert manifest.is_unchanged(doc_path, stat)
+        assert manifest.paths_under(self.temp_base) == [doc_path]
+        assert sorted(manifest.paths_under(self.temp_base, recursive=True)) == sorted([doc_path, sub_path])
+        assert doc_path in THE_MODULE.get_indexable_files(self.temp_base)
+
+    @pytest.mark.skipif(not RUN_SLOW_TESTS, reason="Ignoring slow test")
+    def test_07_incremental_index(self):
+        """Make sure re-indexing only embeds changed files and drops deleted ones"""
+        debug.trace(4, f"test_07_incremental_index(): self={self}")
+        doc_dir = gh.form_path(self.temp_base, "incremental-docs")
+        gh.full_mkdir(doc_dir)
+        for name in ["apple", "banana", "cherry"]:
+            system.write_file(gh.form_path(doc_dir, f"{name}.txt"), f"This file is about {name}s.")
+        temp_index_dir = gh.form_path(self.temp_base, "incremental-index")
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        assert len(ds.db.index_to_docstore_id) == 3
+
+        # Change one file and delete another
+        banana_path = gh.form_path(system.real_path(doc_dir), "banana.txt")
+        system.write_file(banana_path, "This file is now about bananas and plantains.")
+        gh.delete_file(gh.form_path(doc_dir, "cherry.txt"))
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        sources = [ds.db.docstore.search(docid).metadata["source"]
+                   for docid in ds.db.index_to_docstore_id.values()]
+        assert sorted(map(gh.basename, sources)) == ["apple.txt", "banana.txt"]
+        manifest = THE_MODULE.IndexManifest(temp_index_dir)
+        assert "plantains" in ds.db.docstore.search(manifest.entries[banana_path]["chunk_ids"][0]).page_content
+
+    @pytest.mark.skipif(not RUN_SLOW_TESTS, reason="Ignoring slow test")
+    def test_08_embedding_cache(self):
+        """Make sure cached chunk embeddings match those from the model"""
+        debug.trace(4, f"test_08_embedding_cache(): self={self}")
+        temp_index_dir = gh.form_path(self.temp_base, "cache-index")
+        gh.full_mkdir(temp_index_dir)
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        texts = ["first chunk", "second chunk", "first chunk"]
+        vectors = ds.embed_chunks(texts)
+        assert len(vectors) == 3
+        assert vectors[0] == vectors[2]
+        keys = [ds.embedding_cache.get_key(text) for text in texts]
+        assert len(ds.embedding_cache.lookup(keys)) == 2
+        model_vectors = ds.get_embeddings().embed_documents(texts[:2])
+        for (vector, model_vector) in zip(vectors, model_vectors):
+            assert max(abs(v1 - v2) for (v1, v2) in zip(vector, model_vector)) < 1e-5
+        ds2 = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        assert ds2.embed_chunks(texts[:2]) == vectors[:2]
+
+    def test_09_adopt_legacy_index(self):
+        """Make sure index without manifest isn't duplicated and unchanged directory skips loading"""
+        debug.trace(4, f"test_09_adopt_legacy_index(): self={self}")
+        # note: uses random embeddings to avoid loading model
+        from langchain_community.embeddings import FakeEmbeddings    # pylint: disable=import-outside-toplevel
+        def get_fake_embeddings(ds):
+            """Sets DS embeddings to fake version"""
+            ds.embeddings = ds.embeddings or FakeEmbeddings(size=8)
+            return ds.embeddings
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "get_embeddings", get_fake_embeddings)
+        self.monkeypatch.setattr(THE_MODULE, "EXTRACTION_WORKERS", 1)
+        self.monkeypatch.setattr(THE_MODULE, "USE_EMBEDDING_CACHE", False)
+        self.monkeypatch.setattr(THE_MODULE, "ALLOW_UNSAFE_MODELS", True)
+        embedded = []
+        add_chunks = THE_MODULE.DesktopSearch.add_chunks
+        def add_tracked_chunks(ds, texts, *args):
+            """Records TEXTS before adding"""
+            embedded.extend(texts)
+            add_chunks(ds, texts, *args)
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "add_chunks", add_tracked_chunks)
+        doc_dir = gh.form_path(self.temp_base, "legacy-docs")
+        gh.full_mkdir(doc_dir)
+        for name in ["apple", "banana", "cherry"]:
+            system.write_file(gh.form_path(doc_dir, f"{name}.txt"), f"This file is about {name}s.")
+        temp_index_dir = gh.form_path(self.temp_base, "legacy-index")
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.index_dir_via_temp(doc_dir)
+        assert len(ds.db.index_to_docstore_id) == 3
+
+        # Update from index without manifest (n.b., all chunks re-added unless INDEX_ONLY_RECENT)
+        for (only_recent, num_embedded) in [(False, 3), (True, 0)]:
+            gh.delete_existing_file(gh.form_path(temp_index_dir, THE_MODULE.MANIFEST_FILENAME))
+            self.monkeypatch.setattr(THE_MODULE, "INDEX_ONLY_RECENT", only_recent)
+            embedded.clear()
+            ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+            ds.update_index(doc_dir)
+            assert len(embedded) == num_embedded
+            assert len(ds.db.index_to_docstore_id) == 3
+            assert len(THE_MODULE.IndexManifest(temp_index_dir).entries) == 3
+
+        # Make sure nothing gets loaded if no changes
+        def no_load(*_args, **_kwargs):
+            """Fails if called"""
+            raise AssertionError("index unexpectedly loaded")
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "load_index", no_load)
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "get_embeddings", no_load)
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        assert ds.db is None
+
+    def test_10_chunk_metadata(self):
+        """Make sure each chunk gets its own metadata and the embedding cache is closed"""
+        debug.trace(4, f"test_10_chunk_metadata(): self={self}")
+        from langchain_community.embeddings import FakeEmbeddings    # pylint: disable=import-outside-toplevel
+        def get_fake_embeddings(ds):
+            """Sets DS embeddings to fake version"""
+            ds.embeddings = ds.embeddings or FakeEmbeddings(size=8)
+            return ds.embeddings
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "get_embeddings", get_fake_embeddings)
+        self.monkeypatch.setattr(THE_MODULE, "EXTRACTION_WORKERS", 1)
+        self.monkeypatch.setattr(THE_MODULE, "USE_EMBEDDING_CACHE", True)
+        self.monkeypatch.setattr(THE_MODULE, "CHUNK_SIZE", 20)
+        self.monkeypatch.setattr(THE_MODULE, "CHUNK_OVERLAP", 0)
+        doc_dir = gh.form_path(self.temp_base, "chunk-docs")
+        gh.full_mkdir(doc_dir)
+        system.write_file(gh.form_path(doc_dir, "fruit.txt"),
+                          "Apples are red. Bananas are yellow. Cherries are dark red.")
+        temp_index_dir = gh.form_path(self.temp_base, "chunk-index")
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        metadatas = [ds.db.docstore.search(docid).metadata
+                     for docid in ds.db.index_to_docstore_id.values()]
+        assert len(metadatas) > 1
+        assert len({id(metadata) for metadata in metadatas}) == len(metadatas)
+        assert ds.embedding_cache is None
+        assert system.non_empty_file(gh.form_path(temp_index_dir, THE_MODULE.EMBEDDING_CACHE_FILENAME))
+
+    def test_11_extraction_retry(self):
+        """Make sure files with extraction errors are retried on next update"""
+        debug.trace(4, f"test_11_extraction_retry(): self={self}")
+        from langchain_community.embeddings import FakeEmbeddings    # pylint: disable=import-outside-toplevel
+        def get_fake_embeddings(ds):
+            """Sets DS embeddings to fake version"""
+            ds.embeddings = ds.embeddings or FakeEmbeddings(size=8)
+            return ds.embeddings
+        self.monkeypatch.setattr(THE_MODULE.DesktopSearch, "get_embeddings", get_fake_embeddings)
+        self.monkeypatch.setattr(THE_MODULE, "EXTRACTION_WORKERS", 1)
+        self.monkeypatch.setattr(THE_MODULE, "USE_EMBEDDING_CACHE", False)
+        self.monkeypatch.setattr(THE_MODULE, "ALLOW_UNSAFE_MODELS", True)
+        doc_dir = system.real_path(gh.form_path(self.temp_base, "retry-docs"))
+        gh.full_mkdir(doc_dir)
+        for name in ["apple", "banana"]:
+            system.write_file(gh.form_path(doc_dir, f"{name}.txt"), f"This file is about {name}s.")
+        banana_path = gh.form_path(doc_dir, "banana.txt")
+        extract_text = THE_MODULE.extract_text
+        def flaky_extract_text(path):
+            """Fails for banana file"""
+            if path == banana_path:
+                raise OSError("simulated extraction error")
+            return extract_text(path)
+        self.monkeypatch.setattr(THE_MODULE, "extract_text", flaky_extract_text)
+        temp_index_dir = gh.form_path(self.temp_base, "retry-index")
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        assert banana_path not in THE_MODULE.IndexManifest(temp_index_dir).entries
+        self.monkeypatch.setattr(THE_MODULE, "extract_text", extract_text)
+        ds = THE_MODULE.DesktopSearch(index_store_dir=temp_index_dir)
+        ds.update_index(doc_dir)
+        assert THE_MODULE.IndexManifest(temp_index_dir).entries[banana_path]["chunk_ids"]
+        assert len(ds.db.index_to_docstore_id) == 2
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
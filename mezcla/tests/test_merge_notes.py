@@ -35,6 +35,25 @@ class TestMergeNotes:
         assert THE_MODULE.resolve_date("0 Jan 00", datetime.datetime(2000, 1, 1, 0, 0)) == datetime.datetime(2000, 1, 1, 0, 0)
         assert THE_MODULE.resolve_date("Sun 18 Jul 2021") == datetime.datetime(2021, 7, 18, 0, 0)
 
+    def test_dated_notes(self, tmp_path):
+        """Ensure DatedNotes merges spilled runs in order of resolved date"""
+        debug.trace(4, "test_dated_notes()")
+        dates = ["3 Jan 20", "1 Jan 20", "Fri 3 Jan 20", "2 Jan 20"]
+        resolved_date = {d: THE_MODULE.resolve_date(d) for d in dates}
+        default_date = THE_MODULE.resolve_date("1 Jan 1900")
+        expected = None
+        for budget in [10, 1000]:
+            notes = THE_MODULE.DatedNotes(resolved_date, default_date, memory_budget=budget)
+            for i in range(3):
+                for date in dates + ["1 Jan 1900"]:
+                    notes.add(date, f"{date}: {i}\n")
+            actual = list(notes.iter_entries())
+            assert len(actual) == 5
+            expected = expected or actual
+            assert actual == expected
+        assert [d for (d, _text) in expected] == ["1 Jan 1900", "1 Jan 20", "2 Jan 20", "3 Jan 20", "Fri 3 Jan 20"]
+        assert expected[1][1] == "1 Jan 20: 0\n1 Jan 20: 1\n1 Jan 20: 2\n"
+
     ## TODO: test main script
 
 
@@ -14,6 +14,7 @@
 # Standard packages
 import math
 import datetime
+import random
 import time
 ## NOTE: this is empty for now
 
@@ -49,6 +50,31 @@ class TestMiscUtils(TestWrapper):
         expected = set([(1, 2), (1, 3), (1, 4), (2, 3), (3, 4), (2, 4)])
         assert actual == expected
 
+    def test_transitive_closure_random(self):
+        """Ensure transitive_closure agrees with naive version over random graphs"""
+        debug.trace(4, "test_transitive_closure_random()")
+        rng = random.Random(13)
+        for max_set_size in [0, 256]:
+            self.monkeypatch.setattr(THE_MODULE, "MAX_REACHABLE_SET_SIZE", max_set_size)
+            for _i in range(100):
+                num_nodes = rng.randint(1, 25)
+                edges = [(rng.randrange(num_nodes), rng.randrange(num_nodes))
+                         for _j in range(rng.randint(0, 50))]
+                expected = THE_MODULE.naive_transitive_closure(edges)
+                assert THE_MODULE.transitive_closure(edges) == expected
+                # note: streamed without duplicates
+                assert len(list(THE_MODULE.iter_transitive_closure(iter(edges)))) == len(expected)
+        assert THE_MODULE.transitive_closure([("a", "b"), ("b", "a"), ("c", "c")]) == {
+            ("a", "a"), ("a", "b"), ("b", "a"), ("b", "b"), ("c", "c")}
+
+    def test_get_strongly_connected_components(self):
+        """Ensure components returned in reverse topological order"""
+        debug.trace(4, "test_get_strongly_connected_components()")
+        successors = [[1], [2, 3], [1], [4], []]
+        assert THE_MODULE.get_strongly_connected_components(successors) == [[4], [3], [2, 1], [0]]
+        assert THE_MODULE.get_bit_positions((1 << 1000) | 0b101) == [0, 2, 1000]
+        assert THE_MODULE.get_bit_positions(0) == []
+
     def test_read_tabular_data(self):
         """Ensure read_tabular_data works as expected"""
         debug.trace(4, "test_read_tabular_data()")
@@ -90,6 +116,36 @@ class TestMiscUtils(TestWrapper):
         assert all(THE_MODULE.is_prime(n) for n in first_100_primes)
         assert all((not THE_MODULE.is_prime(n)) for n in range(first_100_primes[-1]) if n not in first_100_primes)
 
+    def test_primes_up_to(self):
+        """Ensure segmented sieve agrees with is_prime"""
+        debug.trace(4, "test_primes_up_to()")
+        self.monkeypatch.setattr(THE_MODULE, "SIEVE_SEGMENT_SIZE", 10)
+        for max_num in [0, 1, 2, 3, 20, 97, 1000]:
+            expected = [n for n in range(max_num + 1) if THE_MODULE.is_prime(n)]
+            assert THE_MODULE.primes_up_to(max_num).tolist() == expected
+
+    def test_is_prime_array(self):
+        """Ensure is_prime_array agrees with is_prime, including Miller-Rabin for large values"""
+        debug.trace(4, "test_is_prime_array()")
+        values = list(range(-3, 2000)) + [2 ** 61 - 1, 3215031751, 3825123056546413051]
+        self.monkeypatch.setattr(THE_MODULE, "MAX_SIEVE_VALUE", 1000)
+        expected = [THE_MODULE.is_prime(n) for n in values]
+        assert expected[-3:] == [True, False, False]
+        assert THE_MODULE.is_prime_array(values).tolist() == expected
+        # note: Carmichael number and strong pseudoprimes to early bases
+        for num in [561, 2047, 1373653, 25326001, 3215031751]:
+            assert not THE_MODULE.is_prime_miller_rabin(num)
+
+    def test_prime_factorizations(self):
+        """Ensure batch factorization agrees with prime_factorization"""
+        debug.trace(4, "test_prime_factorizations()")
+        values = list(range(-2, 3000)) + [2 * 3 * 3 * 997]
+        expected = [THE_MODULE.prime_factorization(n) for n in values]
+        assert THE_MODULE.prime_factorizations(values) == expected
+        assert THE_MODULE.smallest_prime_factors(10).tolist() == [0, 0, 2, 3, 2, 5, 2, 7, 2, 3, 2]
+        self.monkeypatch.setattr(THE_MODULE, "MAX_SIEVE_VALUE", 100)
+        assert THE_MODULE.prime_factorizations([12, 1001]) == [[2, 2, 3], [7, 11, 13]]
+
     def test_fibonacci(self):
         """Ensure fibonacci works as expected"""
         debug.trace(4, "test_fibonacci()")
@@ -227,6 +283,41 @@ class TestMiscUtils(TestWrapper):
         contents = system.read_file(file_out)
         assert contents == f"{timestamp} [0]\n"
 
+    def test_add_timestamp_diff_blocks(self):
+        """ensure add_timestamp_diff works over multiple blocks and with prefix"""
+        debug.trace(4, "test_add_timestamp_diff_blocks()")
+        self.monkeypatch.setattr(THE_MODULE, "TIMESTAMP_BLOCK_SIZE", 10)
+        lines = ["2023-10-06T04:02:36.5228822Z start", "no timestamp",
+                 "x 2023-10-06T04:02:37.0000001Z", "2023-10-06T24:00:00.000000Z bad hour",
+                 "2023-10-7T00:00:00.5000000Z short date"]
+        file_in = f"{self.temp_file}.in"
+        file_out = f"{self.temp_file}.out"
+        system.write_lines(file_in, lines)
+        THE_MODULE.add_timestamp_diff(file_in, file_out, prefix=True)
+        diffs = [line.split("\t")[0] for line in system.read_lines(file_out)]
+        # note: invalid timestamps use previous time (n.b., 7-digit fraction with short date not truncated properly)
+        assert diffs == ["0", "no timestamp", "+477118.0\u00B5s", "+0.0\u00B5s", "+0.0\u00B5s"]
+
+    def test_add_timestamp_diff_missing(self):
+        """ensure add_timestamp_diff reports missing input and produces empty output"""
+        debug.trace(4, "test_add_timestamp_diff_missing()")
+        file_out = f"{self.temp_file}.out"
+        THE_MODULE.add_timestamp_diff(f"{self.temp_file}.missing", file_out)
+        assert "Unable to read file" in self.get_stderr()
+        assert system.read_file(file_out) == ""
+
+    def test_timestamp_parser(self):
+        """ensure TimestampParser agrees with parse_timestamp"""
+        debug.trace(4, "test_timestamp_parser()")
+        parser = THE_MODULE.TimestampParser()
+        start = datetime.datetime(1, 1, 1)
+        for ts in ["2004-09-16T12:30:25.1231234Z", "2004-09-16T12:31:00.123123Z", "2004-9-16T12:30:25.123123Z"]:
+            expected = THE_MODULE.parse_timestamp(ts) - start
+            assert parser.parse(ts) == (expected.days * 86400 + expected.seconds) * 10**6 + expected.microseconds
+        for ts in ["2004-09-31T12:30:25.1231234Z", "2004-09-16T12:30:60.123123Z"]:
+            with pytest.raises(ValueError):
+                parser.parse(ts)
+
     def test_random_int(self):
         """ensure random_int works as expected"""
         debug.trace(4, "test_random_int()")
@@ -224,6 +224,19 @@ class TestMyRegex(TestWrapper):
         self.do_assert(self.my_re.pre_match() == "abc_")
         self.do_assert(self.my_re.post_match() == "_ghi")
 
+    def test_word_list_matcher(self):
+        """Make sure WordListMatcher agrees with per-term word-boundary search"""
+        debug.trace(4, f"test_word_list_matcher(); self={self}")
+        terms = ["cat", "cattle", "dog", "a.b", "c++", "hot dog", "x", ""]
+        matcher = THE_MODULE.WordListMatcher(terms)
+        self.do_assert(matcher.findall("cattle and dogs, or a dog") == ["cattle", "dog"])
+        for text in ["concatenate", "my cat", "axb", "a.b", "hot dogs", "X", "x-ray", "c+", ""]:
+            expected = any(re.search(rf"\b{re.escape(term)}\b", text) for term in terms if term)
+            self.do_assert(bool(matcher.search(text)) == expected, f"mismatch for {text!r}")
+        self.do_assert(THE_MODULE.WordListMatcher(terms, flags=re.IGNORECASE).search("X"))
+        self.do_assert(not THE_MODULE.WordListMatcher([]).search("anything"))
+        return
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -15,7 +15,11 @@
 import re
 
 # Installed packages
+import pandas as pd
 import pytest
+from sklearn import model_selection
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
 
 # Local packages
 from mezcla import debug
@@ -40,6 +44,28 @@ class TestPandasSklearnUtils:
         debug.trace(4, "test_create_feature_mapping()")
         assert THE_MODULE.create_feature_mapping(['c', 'b', 'b', 'a']) == {'c':0, 'b':1, 'a':2}
 
+    @pytest.mark.parametrize("num_workers", [1, 2])
+    def test_evaluate_models(self, num_workers, tmp_path):
+        """Ensure evaluate_models agrees with cross_val_score and reuses cached folds"""
+        debug.trace(4, f"test_evaluate_models({num_workers})")
+        dataset = pd.read_csv(IRIS_EXAMPLE)
+        X, y = dataset[dataset.columns[:-1]], dataset[dataset.columns[-1]]
+        models = [("LR", LogisticRegression()), ("GNB", GaussianNB())]
+        cache_dir = str(tmp_path / "cache")
+        results = THE_MODULE.evaluate_models(models, X, y, num_folds=5, num_workers=num_workers,
+                                             cache_dir=cache_dir)
+        for name, model in models:
+            kfold = model_selection.KFold(n_splits=5, shuffle=True, random_state=THE_MODULE.SEED)
+            expected = model_selection.cross_val_score(model, X, y, cv=kfold, scoring="accuracy")
+            assert [score for (score, _fit, _predict, _cached) in results[name]] == pytest.approx(list(expected))
+            assert all(((fit >= 0) and (predict >= 0) and (not cached))
+                       for (_score, fit, predict, cached) in results[name])
+        assert len(gh.get_directory_listing(cache_dir)) == 10
+        # note: cached results are returned as is, including times, but flagged as cached
+        cached_results = THE_MODULE.evaluate_models(models, X, y, num_folds=5, cache_dir=cache_dir)
+        assert cached_results == {name: [(result[:3] + (True,)) for result in folds]
+                                  for (name, folds) in results.items()}
+
     def test_show_ablation(self):
         """Ensure show_ablation works as expected"""
         debug.trace(4, "test_show_ablation()")
@@ -80,6 +106,8 @@ class TestPandasSklearn(TestWrapper):
         for expected_line, actual_line in zip(gh.read_lines(IRIS_OUTPUT), output.splitlines()):
             expected_line = re.sub(r' +', ' ', expected_line)
             actual_line = re.sub(r' +', ' ', actual_line)
+            # note: drops fit and predict times from cross validation results (e.g., "LR 0.958 0.056 0.141 0.012")
+            actual_line = re.sub(r'^(\S+\t[0-9.]+\t[0-9.]+)\t[0-9.]+\t[0-9.]+(\t.*cached\))?$', r'\1', actual_line)
             line_num += 1
             # note: ignores lines like following
             #   107          7.3         2.9          6.3         1.8   Iris-virginica
@@ -102,6 +130,17 @@ class TestPandasSklearn(TestWrapper):
         )
         assert expected_confusion_matrix in output
 
+    def test_cached_folds(self):
+        """Ensure cross validation results flag folds reused from cache"""
+        debug.trace(4, "test_cached_folds()")
+        env_options = f"EVAL_CACHE_DIR={gh.get_temp_file()}.cache"
+        output = self.run_script(env_options=env_options, data_file=IRIS_EXAMPLE)
+        assert "cached)" not in output
+        output = self.run_script(env_options=env_options, data_file=IRIS_EXAMPLE)
+        # note: times for cached folds are not included in totals
+        assert re.search(r"^LR\t[0-9.]+\t[0-9.]+\t0(\.0)?\t0(\.0)?\t\(10 of 10 folds cached\)$",
+                         output, flags=re.MULTILINE)
+
     def test_show_ablation(self):
         """Ensure show_ablation works as expected"""
         debug.trace(4, "test_normal_usage()")
@@ -16,13 +16,17 @@
 """Tests for rgb_color_name module"""
 
 # Standard packages
+import os
 import re
+import select
+import subprocess
+import sys
 
 # Installed packages
 import pytest
 
 # Local packages
-from mezcla.unittest_wrapper import TestWrapper
+from mezcla.unittest_wrapper import TestWrapper, get_temp_dir
 from mezcla import debug
 from mezcla import glue_helpers as gh
 from mezcla import system
@@ -203,7 +207,65 @@ class TestRgbColorName(TestWrapper):
         #     options=option
         # )
         # assert color in output
-        
+
+    def test_multiple_colors(self):
+        """Test multiple colors per line over blocks of lines"""
+        debug.trace(4, "test_multiple_colors()")
+        content = "(0, 255, 0) (145, 128, 43) x (270, 0, 0)\nnone\n(39, 39, 39)\n"
+        output = self.helper_rgb_color_name(cmd_option="", file_content=content)
+        self.do_assert(output.splitlines() == [
+            "<(0, 255, 0), lime> <(145, 128, 43), olivedrab> x <(270, 0, 0), red>",
+            "none",
+            "<(39, 39, 39), darkslategray>"])
+
+    def test_piped_input(self):
+        """Make sure piped input is not held back until end of input"""
+        debug.trace(4, "test_piped_input()")
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        env.pop("LINE_BLOCK_SIZE", None)
+        with subprocess.Popen([sys.executable, self.script_file, "-"], env=env, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE) as process:
+            try:
+                process.stdin.write("(0, 255, 0)\n")
+                process.stdin.flush()
+                # note: stdin kept open, so output only if resolved line by line
+                (ready, _, _) = select.select([process.stdout], [], [], 30)
+                self.do_assert(ready)
+                self.do_assert(process.stdout.readline() == "<(0, 255, 0), lime>\n")
+            finally:
+                process.stdin.close()
+                process.wait()
+
+
+class TestColorNameResolver(TestWrapper):
+    """Class for testcase definition for color name resolution proper"""
+    script_module = TestWrapper.get_testing_module_name(__file__, THE_MODULE)
+
+    def test_resolve(self):
+        """Make sure exact and nearest matches resolved"""
+        debug.trace(4, "test_resolve()")
+        resolver = THE_MODULE.ColorNameResolver()
+        colors = [(0, 255, 0), (145, 128, 43), (300, -5, 0)]
+        # note: exact match for components clipped to 0..255 as with webcolors
+        self.do_assert(resolver.resolve(colors) == ["lime", "olivedrab", "red"])
+        self.do_assert(resolver.resolve(colors, check_direct_match=False) == ["lime", "olivedrab", "red"])
+        self.do_assert(resolver.resolve([]) == [])
+
+    def test_lookup_table(self):
+        """Make sure memory-mapped table agrees with spatial database (at quantized points)"""
+        debug.trace(4, "test_lookup_table()")
+        table_file = gh.form_path(get_temp_dir(unique=True), "colors.npy")
+        resolver = THE_MODULE.ColorNameResolver(table_file=table_file, table_bits=4)
+        self.do_assert(system.file_exists(table_file))
+        colors = [(r, g, b) for r in range(8, 256, 48) for g in range(8, 256, 32) for b in (8, 136)]
+        expected = list(resolver.space_color_db.query(colors)[1])
+        self.do_assert(list(resolver.get_nearest_indices(colors)) == expected)
+        # note: out-of-range colors use the spatial database
+        self.do_assert(resolver.resolve([(999, 0, 0)], check_direct_match=False) == ["red"])
+        # note: table is reused if names unchanged
+        resolver = THE_MODULE.ColorNameResolver(table_file=table_file, table_bits=4)
+        self.do_assert(list(resolver.get_nearest_indices(colors)) == expected)
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
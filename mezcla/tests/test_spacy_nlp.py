@@ -127,6 +127,19 @@ class TestSpacy(TestWrapper):
         self.do_assert(sent_start_info[-5:] == ["False", "True", "True", "is_sent_start", "is_sent_start"])
         return
 
+    @pytest.mark.xfail
+    def test_batch_mode(self):
+        """Make sure nlp.pipe batching produces the same output as unit-at-a-time processing"""
+        debug.trace(4, f"TestIt.test_batch_mode(); self={self}")
+        data = ["It came, it saw, it conquered. The food", "was bland.", "",
+                "Elon Musk runs Tesla.", "", "I ate in Paris."]
+        system.write_lines(self.temp_file, data)
+        expected = self.run_script(options="--run-ner --verbose", data_file=self.temp_file)
+        actual = self.run_script(options="--run-ner --verbose --batch-size 2", data_file=self.temp_file)
+        self.do_assert(my_re.search(r"input: Elon Musk runs Tesla", actual))
+        self.do_assert(actual == expected)
+        return
+
     @pytest.mark.xfail
     def test_chunker(self):
         """Test NP chunking"""
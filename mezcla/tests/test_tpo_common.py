@@ -433,6 +433,21 @@ class TestTpoCommon(TestWrapper):
         ## TODO: assert "Hey Jos\xc3\xa9" == THE_MODULE.format("Hey {j}", j=JOSE)
         return
 
+    def test_format_from_frame(self):
+        """Ensure format without keywords resolves referenced names from caller's frame"""
+        debug.trace(4, "test_format_from_frame()")
+        fubar = [202]
+        width = 5
+        assert THE_MODULE.format("{FUBAR} vs. {fubar[0]:>{width}} {{x}}") == "101 vs.   202 {x}"
+        # pylint: disable=redefined-outer-name
+        FUBAR = 303
+        assert THE_MODULE.format("{FUBAR}") == "303"
+        assert THE_MODULE.format("{no_such_var}", ignore_exception=True) == ""
+        with pytest.raises(KeyError):
+            THE_MODULE.format("{no_such_var}")
+        assert THE_MODULE.get_template_field_names("{a.b} {c[1]!r:{d}} {a}") == ("a", "c", "d")
+        assert THE_MODULE.get_template_field_names("{unbalanced") is None
+
     @pytest.mark.xfail
     def test_init_logging(self):
         """Ensure init_logging works as expected"""
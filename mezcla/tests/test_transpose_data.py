@@ -91,6 +91,23 @@ class TestTransposeData(TestWrapper):
         self.do_assert(not my_re.search(r"v1.*v2", output.strip()))
         return
 
+    def test_out_of_core(self):
+        """Makes sure out-of-core transposition matches in-memory version"""
+        debug.trace(4, f"TestIt.test_out_of_core(); self={self}")
+        data = ["H1\tH2\tH3", "v1\tv2\tv3", "v1\t\"x\ny\"\tv4", "v5", "v5\tv2\tv3"]
+        system.write_lines(self.temp_file, data)
+        for options in ["--elide", "--encode-newlines"]:
+            expected = self.run_script(options=options, data_file=self.temp_file)
+            self.do_assert(expected.startswith("H1\tv1\t"))
+            for max_open in [1, 2, 10]:
+                output = self.run_script(options=f"{options} --out-of-core --max-open-files {max_open}",
+                                         data_file=self.temp_file)
+                self.do_assert(output == expected)
+        output = self.run_script(options="--elide --encode-newlines --out-of-core --max-open-files 2",
+                                 data_file=self.temp_file)
+        self.do_assert(output.splitlines()[:2] == ["H1\tv1\t.\tv5\t.", "H2\tv2\tx<EOL>y\tn/a\tv2"])
+        return
+
 if __name__ == '__main__':
     debug.trace_current_context()
     pytest.main([__file__])
@@ -29,6 +29,7 @@
 # Standard packages
 # note: checks for temp-file settings made by unittest_wrapper
 import os
+import sys
 PRESERVE_TEMP_FILE_LABEL = "PRESERVE_TEMP_FILE"
 PRESERVE_TEMP_FILE_INIT = os.environ.get(PRESERVE_TEMP_FILE_LABEL)
 TEMP_FILE_LABEL = "TEMP_FILE"
@@ -42,6 +43,7 @@ import pytest
 ## TEST: os.environ["PRESERVE_TEMP_FILE"] = "1"
 from mezcla.unittest_wrapper import TestWrapper, invoke_tests, trap_exception
 from mezcla import debug
+from mezcla import glue_helpers as gh
 from mezcla.my_regex import my_re
 from mezcla import system
 
@@ -217,6 +219,44 @@ class TestIt(TestWrapper):
             assert my_re.search(r"test-[1-7]", self.temp_file)
             
 
+    def test_08_run_module_in_process(self):
+        """Make sure in-process runs match 'python -m' subprocess ones"""
+        debug.trace(4, f"TestIt.test_08_run_module_in_process(); self={self!r}")
+        data_file = self.create_temp_file("fubar\nreally fubar\n")
+        module = "mezcla.simple_main_example"
+        expected = gh.run(f"python -m {module} --check-fubar {data_file} 2> /dev/null")
+        save_argv = list(sys.argv)
+        (out, _err, status) = THE_MODULE.run_module_in_process(module, ["--check-fubar", data_file])
+        self.do_assert(out.decode().rstrip("\n") == expected)
+        self.do_assert(status == 0)
+        # note: argparse errors lead to SystemExit with usage to stderr
+        (out, err, status) = THE_MODULE.run_module_in_process(module, ["--bad-option"])
+        self.do_assert((status == 2) and (not out) and (b"usage:" in err))
+        # note: arguments restored
+        self.do_assert(sys.argv == save_argv)
+
+    def test_09_get_in_process_args(self):
+        """Make sure arguments for in-process runs parsed unless shell needed"""
+        debug.trace(4, f"TestIt.test_09_get_in_process_args(); self={self!r}")
+        self.do_assert(TestWrapper.get_in_process_args("DEBUG_LEVEL=0", "--opt 'a b' -")
+                       == (["--opt", "a b", "-"], {"DEBUG_LEVEL": "0"}))
+        self.do_assert(TestWrapper.get_in_process_args("", "--opt < file") is None)
+        self.do_assert(TestWrapper.get_in_process_args("$HOME/x=1", "-") is None)
+        self.do_assert(TestWrapper.get_in_process_args("", "'unbalanced") is None)
+
+    def test_10_run_script_env_options(self):
+        """Make sure run_script honors module-level environment options when run in-process"""
+        debug.trace(4, f"TestIt.test_10_run_script_env_options(); self={self!r}")
+        data_file = self.create_temp_file("fubar\nreally fubar\n\nok\n")
+        self.monkeypatch.setattr(self, "script_module", "mezcla.simple_main_example")
+        self.monkeypatch.setattr(self, "run_in_process", True)
+        output = self.run_script(options="--check-fubar", data_file=data_file)
+        self.do_assert("ok" not in output)
+        # note: FILE_INPUT_MODE is read when mezcla.main imported, so whole file is checked
+        output = self.run_script(options="--check-fubar", data_file=data_file,
+                                 env_options="FILE_INPUT_MODE=1")
+        self.do_assert(output.endswith("ok"))
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -27,6 +27,7 @@
 """Tests for xml_utils module"""
 
 # Standard packages
+import io
 import re
 
 # Installed packages
@@ -69,6 +70,37 @@ class TestXmlUtils(TestWrapper):
         assert parsed_xml_text == "xml: \n\ta: \n\t\tb: 1\n\t\t\tc: 2\n\t\t\t\td: \n\t\t\t\t3\n\t\t4"
         return
 
+    def test_etree_to_dict(self):
+        """Ensure etree_to_dict works as expected"""
+        debug.trace(4, "test_etree_to_dict()")
+        d = THE_MODULE.etree_to_dict(THE_MODULE.parse_xml(NESTED_XML))
+        assert d["inner"] == "1234"
+        b_dict = d["xml"][0]["a"][0]
+        assert (b_dict["text"], b_dict["tail"], b_dict["inner"]) == ("1", "4", "123")
+        assert b_dict["b"][0]["c"][0] == {"d": [], "text": None, "tail": "3", "inner": ""}
+
+    def test_iter_xml_text(self):
+        """Ensure streaming text matches get_xml_text"""
+        debug.trace(4, "test_iter_xml_text()")
+        gh.write_file(self.temp_file, NESTED_XML)
+        expected = THE_MODULE.get_xml_text(THE_MODULE.parse_xml(NESTED_XML))
+        assert "\n".join(THE_MODULE.iter_xml_text(self.temp_file)) == expected
+        assert list(THE_MODULE.iter_xml_text(io.StringIO("<a>1<b/>2</a>"))) == ["a: 1", "\tb: ", "\t2"]
+
+    def test_iter_xml_dicts(self):
+        """Ensure streaming records match etree_to_dict and processed elements are removed"""
+        debug.trace(4, "test_iter_xml_dicts()")
+        xml_text = '<dump><info>x</info><page n="1"><t>A</t></page>\n<page n="2"><t>B</t>b</page></dump>'
+        root = THE_MODULE.parse_xml(xml_text)
+        expected = [THE_MODULE.etree_to_dict(page) for page in root.iter("page")]
+        assert list(THE_MODULE.iter_xml_dicts(io.StringIO(xml_text), tag="page")) == expected
+        assert [d.get("@n") for d in THE_MODULE.iter_xml_dicts(io.StringIO(xml_text))] == [None, "1", "2"]
+        num_children = []
+        for (event, elem, _depth) in THE_MODULE.iterparse_xml(io.StringIO(xml_text)):
+            if (event == "tail") and (elem.tag == "dump"):
+                num_children.append(len(elem))
+        assert num_children == [0]
+
 #------------------------------------------------------------------------
 
 if __name__ == '__main__':
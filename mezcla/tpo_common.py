@@ -53,9 +53,11 @@ import sys
 import os
 import re
 # - Others
+import functools
 import inspect
 import logging
 import pickle
+import string
 from six import string_types
 ## OLD: import time
 ## OLD: import types
@@ -909,12 +911,35 @@ def simple_format(text, namespace):
     return result
 
 
+@functools.lru_cache(maxsize=1024)
+def get_template_field_names(text):
+    """Returns tuple of variable names referenced by format-style TEXT, or None if not parsable
+    Note: Only the base name is included for attribute or index references (e.g., "x" for "{x.y[0]}"); the result is cached."""
+    # EX: get_template_field_names("{x.y[0]:>{w}} {{z}} {x}") => ("x", "w")
+    names = []
+    def add_names(template):
+        """Adds names from TEMPLATE, including nested format specifications"""
+        for (_literal, field_name, format_spec, _conversion) in string.Formatter().parse(template):
+            if field_name:
+                name = re.split(r"[.\[]", field_name, maxsplit=1)[0]
+                if name not in names:
+                    names.append(name)
+            if format_spec:
+                add_names(format_spec)
+    try:
+        add_names(text)
+    except ValueError:
+        return None
+    return tuple(names)
+
+
 warned_about_namespace = {}
 #
 def format(text, indirect_caller=False, ignore_exception=False, **namespace):    # pylint: disable=redefined-builtin
     """Formats TEXT using local namespace, optionally using additional level or
     indirection. If no keywords NAMESPACE specified, they are taken from local
     environment (which is convenient but un-pythonic and a bit inefficient).
+    Only the names referenced in TEXT are looked up (see get_template_field_names).
     Exceptions can be ignored (to support debug_format)."""
     # Notes:
     # - Argments need to be in UTF-8 if the template text is an ascii string.
@@ -950,8 +975,22 @@ def format(text, indirect_caller=False, ignore_exception=False, **namespace):
                                 source_line_key, level=WARNING)
                     warned_about_namespace[source_line_key] = True
             trace_object(frame, 9, "frame")
-            namespace = frame.f_globals.copy()
-            namespace.update(frame.f_locals)
+            field_names = None
+            if isinstance(text, str) and not USE_SIMPLE_FORMAT:
+                field_names = get_template_field_names(text)
+            if field_names is None:
+                namespace = frame.f_globals.copy()
+                namespace.update(frame.f_locals)
+            else:
+                # note: only fetches referenced names, with locals taking precedence
+                frame_locals = frame.f_locals
+                frame_globals = frame.f_globals
+                namespace = {}
+                for name in field_names:
+                    if name in frame_locals:
+                        namespace[name] = frame_locals[name]
+                    elif name in frame_globals:
+                        namespace[name] = frame_globals[name]
         else:
             namespace = namespace.copy()
         if USE_SIMPLE_FORMAT:
@@ -982,9 +1021,10 @@ def format(text, indirect_caller=False, ignore_exception=False, **namespace):
         if frame:
             del frame
     ## OLD: result = _normalize_unicode(result)
-    debug_trace("txt: " + text, level=91)
-    debug_trace("res: " + result, level=91)
-    debug_trace("format(%s,...) => %s", text, result, level=91)
+    if (debugging_level() >= 91):
+        debug_trace("txt: " + text, level=91)
+        debug_trace("res: " + result, level=91)
+        debug_trace("format(%s,...) => %s", text, result, level=91)
     return result
 
 
@@ -35,19 +35,103 @@
 
 # Standard packages
 import csv
+import shutil
 import sys
+import tempfile
 import argparse
 
 # Local packages
 from mezcla import debug
 from mezcla.system import print_stderr
 from mezcla import system
-from mezcla.glue_helpers import read_lines
+from mezcla.glue_helpers import delete_file, read_lines
 
 # Constants
 CSV_FORMAT = system.getenv_bool(
     "CSV_FORMAT", False,
     desc="Use CSV instead of TSV")
+OUT_OF_CORE = system.getenv_bool(
+    "OUT_OF_CORE", False,
+    desc="Transpose via temporary per-column files rather than in memory")
+MAX_OPEN_FILES = system.getenv_int(
+    "MAX_OPEN_FILES", 256,
+    desc="Maximum number of column files open at once for out-of-core transpose")
+
+
+def get_rows(csv_reader, field_names, check_header=False, warn=True):
+    """Yields data rows from CSV_READER padded to the number of FIELD_NAMES
+    Note: If CHECK_HEADER, the first row is skipped if the same as FIELD_NAMES; if WARN, rows with wrong number of fields are noted."""
+    for (num_lines, line_data) in enumerate(csv_reader, start=1):
+        ## OLD:
+        ## line = line.strip("\n")
+        ## debug.trace(6, "L%d: %s" % (num_lines, line))
+        ## line_data = [field.strip() for field in line.split(delim)]
+        debug.trace(6, "R%d: %s" % (num_lines, line_data))
+        debug.trace_values(5, line_data, "line_data")
+        ## OLD: elif ((num_lines == 1) and (field_names == line_data)):
+        if (check_header and (num_lines == 1) and (field_names == line_data)):
+            debug.trace(5, "Ignoring duplicate header")
+            continue
+        if (len(line_data) != len(field_names)):
+            if warn:
+                print_stderr("Warning: Found %d fields but expected %d" % (len(line_data), len(field_names)))
+            line_data += (['n/a'] * max(0, len(field_names) - len(line_data)))
+        yield line_data
+
+
+def format_value(value, previous_value, encode_newlines=False, elide_fields=False, elided_value="."):
+    """Returns VALUE formatted for output (e.g., ELIDED_VALUE if same as PREVIOUS_VALUE and ELIDE_FIELDS)"""
+    new_value = value
+    if encode_newlines:
+        new_value = new_value.replace("\n", "<EOL>")
+    if "\n" in new_value:
+        new_value = '"' + new_value + '"'
+    if (elide_fields and (previous_value == value)):
+        new_value = elided_value
+    return new_value
+
+
+def transpose_out_of_core(filename, field_names, delim="\t", csv_dialect=None, skip_header_row=False,
+                          check_header=False, max_open_files=None, **format_args):
+    """Prints transpose of table in FILENAME using temporary per-column files, which are filled in a pass over the input for each block of MAX_OPEN_FILES columns
+    Notes:
+    - Only the current row is kept in memory.
+    - SKIP_HEADER_ROW indicates that FIELD_NAMES are from the first row of FILENAME; CHECK_HEADER is as with get_rows.
+    - FORMAT_ARGS are passed along to format_value (e.g., elide_fields)."""
+    if max_open_files is None:
+        max_open_files = MAX_OPEN_FILES
+    block_size = max(1, max_open_files)
+    debug.trace(4, f"transpose_out_of_core({filename}, {len(field_names)} fields); block_size={block_size}")
+    with tempfile.TemporaryDirectory(prefix="transpose-") as spill_dir:
+        for block_start in range(0, len(field_names), block_size):
+            block = range(block_start, min(block_start + block_size, len(field_names)))
+            spill_files = [system.form_path(spill_dir, f"column-{i}.data") for i in block]
+            previous_value = [None] * len(block)
+
+            # Append cells for the block's columns to respective files, each preceded by delimiter
+            spill_streams = [open(spill_file, "w", encoding="UTF-8") for spill_file in spill_files]
+            try:
+                with system.open_file(filename) as input_stream:
+                    csv_reader = csv.reader(input_stream, delimiter=delim, quotechar='"', dialect=csv_dialect)
+                    if skip_header_row:
+                        next(csv_reader, None)
+                    for line_data in get_rows(csv_reader, field_names, check_header, warn=(block_start == 0)):
+                        for (j, i) in enumerate(block):
+                            spill_streams[j].write(delim)
+                            spill_streams[j].write(format_value(line_data[i], previous_value[j], **format_args))
+                            previous_value[j] = line_data[i]
+            finally:
+                for spill_stream in spill_streams:
+                    spill_stream.close()
+
+            # Output transposed lines for block
+            for (i, spill_file) in zip(block, spill_files):
+                sys.stdout.write(field_names[i])
+                with open(spill_file, encoding="UTF-8") as spill_stream:
+                    shutil.copyfileobj(spill_stream, sys.stdout)
+                sys.stdout.write("\n")
+                delete_file(spill_file)
+    return
 
 
 def main():
@@ -62,6 +146,8 @@ def main():
     parser.add_argument("--elide", dest='elide_fields', action='store_true', default=False, help="Replace repeated values by .'s")
     parser.add_argument("--elided-value", help="Value for repeated field")
     parser.add_argument("--single-field", dest='single_field', action='store_true', default=False, help="Only show a single field per output line")
+    parser.add_argument("--out-of-core", action='store_true', default=OUT_OF_CORE, help="Use temporary files per column rather than memory (for large tables)")
+    parser.add_argument("--max-open-files", type=int, default=MAX_OPEN_FILES, help="Maximum number of column files open at once (out-of-core mode)")
     parser.add_argument("filename", nargs='?', default='-')
     args = vars(parser.parse_args())
     debug.trace(5, "args = %s" % args)
@@ -83,55 +169,55 @@ def main():
         lines = read_lines(args['header'])
         ## OLD: field_names = [label.strip() for label in lines[0].split(delim)]
         header_reader = csv.reader(iter(lines), delimiter=delim, quotechar='"', dialect=csv_dialect)
-        field_names = header_reader[0]
+        ## OLD: field_names = header_reader[0]
+        field_names = next(header_reader, [])
         debug.trace_values(5, field_names, "field_names")
-        if not single_field:
-            field_data = [[] for i in range(len(field_names))]
-            debug.trace_values(5, field_data, "field_data")
-        previous_value = [None] * len(field_names)
+    check_header = bool(field_names)
+    format_args = {"encode_newlines": encode_newlines, "elide_fields": elide_fields,
+                   "elided_value": elided_value}
+
+    # Transpose via temporary files, making copy of standard input so that it can be re-read
+    if (args['out_of_core'] and not single_field):
+        filename = args['filename']
+        input_copy = None
+        if ((not filename) or (filename == "-")):
+            with tempfile.NamedTemporaryFile("w", encoding="UTF-8", prefix="transpose-", suffix=".data",
+                                             delete=False) as input_copy:
+                shutil.copyfileobj(sys.stdin, input_copy)
+            filename = input_copy.name
+        try:
+            if (len(field_names) == 0):
+                with system.open_file(filename) as input_stream:
+                    field_names = next(csv.reader(input_stream, delimiter=delim, quotechar='"', dialect=csv_dialect), [])
+            transpose_out_of_core(filename, field_names, delim, csv_dialect,
+                                  skip_header_row=(not check_header), check_header=check_header,
+                                  max_open_files=args['max_open_files'], **format_args)
+        finally:
+            if input_copy:
+                delete_file(input_copy.name)
+        return
+
     input_stream = sys.stdin
     if (args['filename'] and (args['filename'] != "-")):
         input_stream = system.open_file(args['filename'])
 
-    # Transpose each line of the table
-    num_lines = 0
-    csv_reader = csv.reader(iter(input_stream.readlines()), delimiter=delim, quotechar='"', dialect=csv_dialect)
-    ## OLD: for line in input_stream:
-    for line_data in csv_reader:
-        num_lines += 1
-        ## OLD:
-        ## line = line.strip("\n")
-        ## debug.trace(6, "L%d: %s" % (num_lines, line))
-        ## line_data = [field.strip() for field in line.split(delim)]
-        debug.trace(6, "R%d: %s" % (num_lines, line_data))
-        debug.trace_values(5, line_data, "line_data")
-
-        # Use first line as field names if not yet defined
-        if (len(field_names) == 0):
-            field_names = line_data
-            if not single_field:
-                field_data = [[] for i in range(len(field_names))]
-                debug.trace_values(5, field_data, "field_data")
-            previous_value = [None] * len(field_names)
-            continue
-        ## OLD: elif ((num_lines == 1) and (field_names == line_data)):
-        if ((num_lines == 1) and (field_names == line_data)):
-            debug.trace(5, "Ignoring duplicate header")
-            continue
+    # Use first line as field names if not yet defined
+    # note: input is read incrementally (e.g., not via readlines)
+    csv_reader = csv.reader(input_stream, delimiter=delim, quotechar='"', dialect=csv_dialect)
+    if (len(field_names) == 0):
+        field_names = next(csv_reader, [])
+    debug.trace_values(5, field_names, "field_names")
 
+    # Transpose each line of the table
+    if not single_field:
+        field_data = [[] for i in range(len(field_names))]
+        debug.trace_values(5, field_data, "field_data")
+    previous_value = [None] * len(field_names)
+    for line_data in get_rows(csv_reader, field_names, check_header):
         # Append each field to respective list (of seen values)
-        if (len(line_data) != len(field_names)):
-            print_stderr("Warning: Found %d fields but expected %d" % (len(line_data), len(field_names)))
-            line_data += (['n/a'] * max(0, len(field_names) - len(line_data)))
         for i in range(len(field_names)):
             debug.trace(7, "d[%d]: %s" % (i, line_data[i]))
-            new_value = line_data[i]
-            if encode_newlines:
-                new_value = new_value.replace("\n", "<EOL>")
-            if "\n" in new_value:
-                new_value = '"' + new_value + '"'
-            if (elide_fields and (previous_value[i] == line_data[i])):
-                new_value = elided_value
+            new_value = format_value(line_data[i], previous_value[i], **format_args)
             ## OLD: if (single_field):
             if single_field:
                 print("%s" % (delim.join([field_names[i], new_value])))
@@ -15,6 +15,11 @@
 #   is raised by default. To disable this, set the SUB_DEBUG_LEVEL as follows:
 #      l=5; DEBUG_LEVEL=$l SUB_DEBUG_LEVEL=$l pytest -s tests/test_spell.py
 #   See glue_helper.py for implementation along with related ALLOW_SUBCOMMAND_TRACING.
+# - With RUN_IN_PROCESS, run_script invokes the module via runpy rather than a
+#   'python -m' subprocess, which avoids interpreter startup and package imports.
+#   A subprocess is still used for background runs, coverage checks, environment
+#   options (i.e., as module-level settings are fixed at import), and options
+#   requiring the shell (e.g., redirection).
 # TODO:
 # - * Clarify TEMP_BASE vs. TEMP_FILE usage.
 # - Add TEMP_DIR for more direct specification.
@@ -49,13 +54,19 @@
 """Unit test support class"""
 
 # Standard packages
+import importlib.util
 import inspect
+import io
 import os
+import runpy
+import shlex
 import sys
 import tempfile
+import traceback
 import unittest
+import warnings
 from typing import (
-    Optional, Callable, Any, Tuple,
+    Optional, Callable, Any, Tuple, Dict, List,
 )
 ## DEBUG: sys.stderr.write(f"{__file__=}\n")
 
@@ -108,6 +119,9 @@ VIA_UNITTEST = system.getenv_bool(
 PROFILE_CODE = system.getenv_boolean(
     "PROFILE_CODE", False,
     description="Profile each test invocation")
+RUN_IN_PROCESS = system.getenv_bool(
+    "RUN_IN_PROCESS", False,
+    description="Have run_script invoke modules via runpy rather than 'python -m' subprocess")
 #
 # For use in tests
 RUN_SLOW_TESTS = system.getenv_bool(
@@ -192,6 +206,110 @@ def pytest_fixture_wrapper(function: Callable) -> Callable:
     return wrapper
 
 
+def can_run_in_process(module: str) -> bool:
+    """Whether MODULE can be run via runpy (see run_module_in_process)
+    Note: modules loaded via pytest assertion rewriting (e.g., xyz_test.py) cannot"""
+    ok = False
+    try:
+        spec = importlib.util.find_spec(module)
+        ok = bool(spec and hasattr(spec.loader, "get_code"))
+    except:
+        debug.trace_exception(5, "can_run_in_process")
+    debug.trace(6, f"can_run_in_process({module}) => {ok}")
+    return ok
+
+
+def run_module_in_process(
+        module: str,
+        args: List[str],
+        env: Optional[Dict[str, str]] = None,
+        stdin_data: bytes = b"",
+        subtrace_level: Optional[IntOrTraceLevel] = None,
+    ) -> Tuple[bytes, bytes, int]:
+    """Runs MODULE as __main__ via runpy with command-line ARGS and ENV overrides,
+    returning tuple with stdout, stderr, and exit status.
+    Notes:
+    - This emulates 'python -m MODULE ARGS' without interpreter startup and package imports.
+    - STDIN_DATA is used for standard input, and tracing is at SUBTRACE_LEVEL as with gh.run (unless DEBUG_LEVEL in ENV).
+    - Modules already loaded are not reloaded, so their environment options are unaffected by ENV.
+    - Only output via sys.stdout and sys.stderr is captured (e.g., not os.system output).
+    """
+    debug.trace(6, f"run_module_in_process({module}, {args}, env={env}, ...)")
+    if subtrace_level is None:
+        subtrace_level = gh.default_subtrace_level
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="UTF-8", write_through=True)
+    stderr = io.TextIOWrapper(io.BytesIO(), encoding="UTF-8", write_through=True)
+    stdin = io.TextIOWrapper(io.BytesIO(stdin_data), encoding="UTF-8")
+    #
+    def show_warning(message, category, filename, lineno, file=None, line=None):
+        """Replacement for warnings.showwarning using captured stderr"""
+        debug.reference_var(file)
+        stderr.write(warnings.formatwarning(message, category, filename, lineno, line))
+    #
+    save_streams = (sys.stdin, sys.stdout, sys.stderr)
+    save_argv = sys.argv
+    save_environ = dict(os.environ)
+    save_cwd = os.getcwd()
+    save_level = debug.get_level()
+    # note: Main.clean_up removes temp-base files, so these are made unique as with gh.run
+    main_module = sys.modules.get("mezcla.main")
+    save_main_temp = (main_module.TEMP_BASE, main_module.TEMP_FILE) if main_module else None
+    status = 0
+    try:
+        if gh.TEMP_BASE:
+            os.environ["TEMP_BASE"] = gh.TEMP_BASE + "_subprocess_"
+        os.environ["DEBUG_LEVEL"] = str(subtrace_level)
+        os.environ.update(env or {})
+        if main_module:
+            main_module.TEMP_BASE = os.environ.get("TEMP_BASE") or None
+            main_module.TEMP_FILE = os.environ.get("TEMP_FILE") or None
+        if hasattr(debug, "set_level"):
+            debug.set_level(system.to_int(os.environ["DEBUG_LEVEL"], subtrace_level))
+        sys.argv = [module] + args
+        sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        with warnings.catch_warnings():
+            # note: warnings go to stderr using interpreter defaults (e.g., not to pytest summary),
+            # and avoids one about module found in sys.modules prior to execution
+            warnings.showwarning = show_warning
+            warnings.resetwarnings()
+            warnings.simplefilter("default")
+            for category in [DeprecationWarning, PendingDeprecationWarning, ImportWarning, ResourceWarning]:
+                warnings.filterwarnings("ignore", category=category)
+            warnings.filterwarnings("default", category=DeprecationWarning, module="__main__")
+            warnings.filterwarnings("ignore", message=".*found in sys.modules", category=RuntimeWarning)
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as exc:
+        # note: as with interpreter, non-integer codes get printed
+        if isinstance(exc.code, int):
+            status = exc.code
+        elif exc.code is not None:
+            stderr.write(f"{exc.code}\n")
+            status = 1
+    except KeyboardInterrupt:
+        raise
+    except:
+        traceback.print_exc(file=stderr)
+        status = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except:
+                pass
+        sys.stdin, sys.stdout, sys.stderr = save_streams
+        sys.argv = save_argv
+        os.environ.clear()
+        os.environ.update(save_environ)
+        os.chdir(save_cwd)
+        if hasattr(debug, "set_level"):
+            debug.set_level(save_level)
+        if main_module:
+            main_module.TEMP_BASE, main_module.TEMP_FILE = save_main_temp
+    result = (stdout.buffer.getvalue(), stderr.buffer.getvalue(), status)
+    debug.trace(7, f"run_module_in_process() => {result!r}")
+    return result
+
+
 def invoke_tests(filename: str, via_unittest: bool = VIA_UNITTEST):
     """Invoke TESTS defined in FILENAME, optionally VIA_UNITTEST"""
     if via_unittest:
@@ -231,6 +349,7 @@ class TestWrapper(unittest.TestCase):
     check_coverage = system.getenv_bool(
         "CHECK_COVERAGE", False,
         desc="Check coverage during unit testing")
+    run_in_process = RUN_IN_PROCESS     # run_script via runpy (n.b., override to False for subprocess-specific tests)
     ## TODO: temp_file = None
     ## TEMP: initialize to unique value independent of temp_base
     temp_file = None
@@ -264,7 +383,11 @@ class TestWrapper(unittest.TestCase):
         debug.assertion(cls.script_module != TODO_MODULE)
         if (cls.script_module is not None):
             # Try to pull up usage via python -m mezcla.xyz --help
-            help_usage = gh.run("python -m '{mod}' --help", mod=cls.script_module)
+            if (cls.run_in_process and can_run_in_process(cls.script_module)):
+                (help_out, help_err, _status) = run_module_in_process(cls.script_module, ["--help"])
+                help_usage = (help_out + help_err).decode("UTF-8", errors="replace")
+            else:
+                help_usage = gh.run("python -m '{mod}' --help", mod=cls.script_module)
             debug.assertion("No module named" not in help_usage,
                             f"problem running via 'python -m {cls.script_module}'")
             # Warn about lack of usage statement unless "not intended for command-line" type warning issued
@@ -461,14 +584,24 @@ class TestWrapper(unittest.TestCase):
         debug.assertion(not script_module.endswith(".py"))
         amp_spec = "&" if background else ""
 
-        # Run the command
+        # Run the command, optionally in-process unless background, environment options, or shell features used
+        # note: environment options require subprocess, as modules already imported are not reloaded
         ## TODO3: allow for stdin_command (e.g., "echo hey" | ...)
         ## TODO2: add sanity check for special shell characters
         ##   shell_tokens = ['<', '>', '|']
         ##   debug.assertion(not system.intersection(options.split(), shell_tokens))
-        gh.issue("{env} python -m {cov_spec} {module}  {opts}  {path}  {post} 1> {out} 2> {log} {amp_spec}",
-                 env=env_options, cov_spec=coverage_spec, module=script_module,
-                 opts=options, path=data_path, out=out_file, log=log_file, post=post_options, amp_spec=amp_spec)
+        in_process_args = None
+        if (self.run_in_process and not (background or self.check_coverage or env_options.strip())
+                and can_run_in_process(script_module)):
+            in_process_args = self.get_in_process_args(env_options, f"{options} {data_path} {post_options}")
+        if in_process_args:
+            (out_data, log_data, _status) = run_module_in_process(script_module, *in_process_args)
+            system.write_binary_file(out_file, out_data)
+            system.write_binary_file(log_file, log_data)
+        else:
+            gh.issue("{env} python -m {cov_spec} {module}  {opts}  {path}  {post} 1> {out} 2> {log} {amp_spec}",
+                     env=env_options, cov_spec=coverage_spec, module=script_module,
+                     opts=options, path=data_path, out=out_file, log=log_file, post=post_options, amp_spec=amp_spec)
         output = system.read_file(out_file)
         # note: trailing newline removed as with shell output
         if output.endswith("\n"):
@@ -490,6 +623,28 @@ class TestWrapper(unittest.TestCase):
 
         return output
 
+    @staticmethod
+    def get_in_process_args(env_options: str, command_args: str) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Returns tuple with argument list and environment overrides for run_module_in_process,
+        based on ENV_OPTIONS (e.g., "VAR1=val1 VAR2=val2") and COMMAND_ARGS; or None if shell required
+        (e.g., for redirection or variable expansion)"""
+        # EX: TestWrapper.get_in_process_args("DEBUG_LEVEL=0", "--opt 'a b' -") => (["--opt", "a b", "-"], {"DEBUG_LEVEL": "0"})
+        # EX: TestWrapper.get_in_process_args("", "--opt < file") => None
+        result = None
+        if not my_re.search(r"[<>|;&`$*?~(){}\\]|\[", f"{env_options} {command_args}"):
+            try:
+                env = {}
+                for spec in shlex.split(env_options):
+                    name, value = spec.split("=", 1)
+                    if not my_re.search(r"^[A-Za-z_]\w*$", name):
+                        raise ValueError(f"Invalid environment variable name: {name!r}")
+                    env[name] = value
+                result = (shlex.split(command_args), env)
+            except ValueError:
+                debug.trace_exception(5, "get_in_process_args")
+        debug.trace(6, f"get_in_process_args({env_options!r}, {command_args!r}) => {result!r}")
+        return result
+
     def resolve_assertion(
             self,
             function_label: str,
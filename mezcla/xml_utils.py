@@ -25,6 +25,7 @@
 """XML utility functions"""
 
 # Standard packages
+import io
 import sys
 import xml.etree.ElementTree as ET
 
@@ -51,32 +52,127 @@ def etree_to_dict(node):
     """Convert XML parse at NODE to dict"""
     debug.trace(5, f"etree_to_dict({node})")
     debug.assertion(node is not None)
-    d = {node.tag : list(map(etree_to_dict, list(node)))}
+    return etree_to_dict_helper(node)[0]
+
+
+def etree_to_dict_helper(node):
+    """Returns dict for NODE (see etree_to_dict) along with inner text
+    Note: The inner text is derived from that of the children rather than via itertext, which rescans each subtree."""
+    children = []
+    inner_text = []
+    if (isinstance(node.tag, str) or (node.tag is None)) and node.text:
+        inner_text.append(node.text)
+    for child in node:
+        child_dict, child_inner_text = etree_to_dict_helper(child)
+        children.append(child_dict)
+        inner_text.append(child_inner_text)
+        if child.tail:
+            inner_text.append(child.tail)
+    d = {node.tag : children}
     d.update(('@' + k, v) for k, v in node.attrib.items())
     d['text'] = node.text
     d['tail'] = node.tail
-    d['inner'] = "".join(node.itertext())
-    return d
+    ## OLD: d['inner'] = "".join(node.itertext())
+    d['inner'] = "".join(inner_text) if (isinstance(node.tag, str) or (node.tag is None)) else ""
+    return d, d['inner']
 
 
 def get_xml_text(node, depth=0):
     """Get all text for XML node at ROOT"""
     # TODO: get_xml_text => get_xml_tree_text???
-    indent = "    " * depth if __debug__ else ""
-    debug.trace(5, f"{indent}get_xml_text({node}, {depth})")
+    debug.trace(5, f"get_xml_text({node}, {depth})")
     debug.assertion(node is not None)
-    debug.trace(4, f'[l] {node.tag + ": "}', no_eol=True)
-    text = ("\t" * depth) + node.tag + ": "
+    # note: text is written to buffer to avoid quadratic string building
+    buffer = io.StringIO()
+    write_xml_text(node, depth, buffer)
+    text = buffer.getvalue()
+    debug.trace(6, f"get_xml_text() => {text}")
+    return text
+
+
+def write_xml_text(node, depth, buffer):
+    """Writes text for NODE at DEPTH and its children to BUFFER (see get_xml_text)"""
+    if debug.debugging(4):
+        debug.trace(4, f'[l] {node.tag + ": "}', no_eol=True)
+        if node.text:
+            debug.trace(4, f"[n] {node.text}", no_eol=True)
+    buffer.write(("\t" * depth) + node.tag + ": ")
     if node.text:
-        debug.trace(4, f"[n] {node.text}", no_eol=True)
-        text += node.text
+        buffer.write(node.text)
     for child in node:
-        text += "\n" + get_xml_text(child, 1 + depth)
+        buffer.write("\n")
+        write_xml_text(child, 1 + depth, buffer)
     if node.tail:
         debug.trace(4, f"[t] {node.tail}", no_eol=True)
-        text += "\n" + ("\t" * depth) + node.tail
-    debug.trace(6, f"{indent}get_xml_text() => {text}")
-    return text
+        buffer.write("\n" + ("\t" * depth) + node.tail)
+
+#...............................................................................
+# Streaming support
+#
+# Note:
+# - ElementTree.iterparse is used to build the tree incrementally, with elements
+#   removed after being processed, so memory stays flat for large documents
+#   (e.g., dumps with many records under the root).
+# - The text of an element is only complete once its first child starts or the
+#   element ends, and the tail once the next sibling starts or the parent ends.
+#
+
+def iterparse_xml(source, keep_children=None):
+    """Yields (event, element, depth) for XML in SOURCE (filename or file object), where event is "text" or "tail"
+    Note: The "text" event occurs when the element text is complete (before any children), and "tail" after the element and its tail are complete. The element is then removed from its parent, unless KEEP_CHILDREN(ancestor, depth) holds for some ancestor."""
+    # note: stack entries are [element, is_text_done, keep_children, pending_child]
+    stack = []
+    for (event, elem) in ET.iterparse(source, events=("start", "end")):
+        depth = len(stack)
+        if (event == "start"):
+            keep = bool(keep_children and keep_children(elem, depth))
+            if stack:
+                parent = stack[-1]
+                keep = (keep or parent[2])
+                if not parent[1]:
+                    parent[1] = True
+                    yield ("text", parent[0], depth - 1)
+                if parent[3] is not None:
+                    yield ("tail", parent[3], depth)
+                    if not parent[2]:
+                        parent[0].remove(parent[3])
+                    parent[3] = None
+            stack.append([elem, False, keep, None])
+        else:
+            entry = stack.pop()
+            if not entry[1]:
+                yield ("text", elem, depth - 1)
+            if entry[3] is not None:
+                yield ("tail", entry[3], depth)
+                if not entry[2]:
+                    elem.remove(entry[3])
+            if stack:
+                stack[-1][3] = elem
+            else:
+                yield ("tail", elem, 0)
+
+
+def iter_xml_text(source):
+    """Yields text for each element in XML SOURCE, as with get_xml_text for the root
+    Note: The pieces should be joined by newlines (e.g., "\n".join(iter_xml_text(f)))."""
+    # EX: "|".join(iter_xml_text(io.StringIO("<a>1<b/>2</a>"))) => "a: 1|\tb: |\t2"
+    for (event, elem, depth) in iterparse_xml(source):
+        if (event == "text"):
+            yield ("\t" * depth) + elem.tag + ": " + (elem.text or "")
+        elif elem.tail:
+            yield ("\t" * depth) + elem.tail
+
+
+def iter_xml_dicts(source, tag=None):
+    """Yields dict (see etree_to_dict) for each element in XML SOURCE with TAG (or each child of the root if None)
+    Note: Records are yielded when complete (e.g., nested ones before enclosing ones), and elements are removed after being processed."""
+    # EX: [d["@n"] for d in iter_xml_dicts(io.StringIO('<a><b n="1"/><b n="2"/></a>'))] => ["1", "2"]
+    def is_record(elem, depth):
+        """Whether ELEM at DEPTH is to be converted to dict"""
+        return ((elem.tag == tag) if (tag is not None) else (depth == 1))
+    for (event, elem, depth) in iterparse_xml(source, keep_children=is_record):
+        if ((event == "tail") and is_record(elem, depth)):
+            yield etree_to_dict(elem)
 
 #...............................................................................
 